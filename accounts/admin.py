@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import User, Activation
+from .models import User, Activation, EmailOutbox
 
 admin.site.register(User)
 admin.site.register(Activation)
+admin.site.register(EmailOutbox)
@@ -1,4 +1,5 @@
 import re
+from zoneinfo import available_timezones
 
 from django.contrib.auth.password_validation import validate_password
 
@@ -10,6 +11,10 @@ class RegisterForm(forms.Form):
     email = forms.EmailField(required=True)
     password1 = forms.CharField(required=True, validators=[validate_password])
     password2 = forms.CharField(required=True)
+    # reminder mails are sent in the morning of this time zone, settings.USER_DEFAULT_TIMEZONE if not given
+    timezone = forms.ChoiceField(required=False, choices=lambda: [('', '')] + [
+        (name, name) for name in sorted(available_timezones())
+    ])
 
     def clean_email(self):
         email = self.data.get('email')
@@ -30,6 +35,7 @@ class RegisterForm(forms.Form):
         password = self.data.get('password1')
         user = User.objects.create_user(email=email, password=password)
         user.is_active = False
+        user.timezone = self.cleaned_data.get('timezone') or user.timezone
         user.save()
         return user
 
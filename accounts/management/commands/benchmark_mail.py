@@ -0,0 +1,58 @@
+import time
+
+from django.core import mail
+from django.core.mail import EmailMessage, get_connection
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+
+from accounts.tasks import deliver_mails, preload_email_templates
+from accounts.utils import make_mail
+
+
+class Command(BaseCommand):
+    help = (
+        'Renders and sends mails with a new connection and template compilation per mail, and over one connection '
+        'with preloaded templates, like drain_outbox_task does per batch, and prints throughput of both. '
+        'Uses locmem backend by default, or a local SMTP stand-in given by --port, '
+        'e.g. started with "python -m aiosmtpd -n -l localhost:8025".'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mails', type=int, default=200)
+        parser.add_argument('--host', default='localhost')
+        parser.add_argument('--port', type=int, default=None, help='port of SMTP server, locmem backend if not given')
+
+    def get_connection(self, options):
+        if options['port'] is None:
+            return get_connection('django.core.mail.backends.locmem.EmailBackend')
+        return get_connection(
+            'django.core.mail.backends.smtp.EmailBackend',
+            host=options['host'],
+            port=options['port'],
+            use_tls=False,
+            username='',
+            password='',
+        )
+
+    def report(self, name, count, seconds):
+        self.stdout.write(self.style.MIGRATE_HEADING(name))
+        self.stdout.write(f'{count} mails, {seconds * 1000:.2f} ms, {count / seconds:.1f} mails/s')
+
+    def handle(self, *args, **options):
+        mail.outbox = []
+        mails = [
+            make_mail(f'user{i}@example.com', 'activate_profile', {'subject': 'Benchmark', 'uri': f'mail {i}'})
+            for i in range(options['mails'])
+        ]
+
+        start = time.perf_counter()
+        for template, context, to in mails:
+            # new connection is opened and closed for each mail, and template is compiled each time.
+            html_content = render_to_string(f'accounts/emails/{template}.html', context)
+            EmailMessage(context['subject'], html_content, to=[to], connection=self.get_connection(options)).send()
+        self.report('one connection per mail', len(mails), time.perf_counter() - start)
+
+        preload_email_templates()
+        start = time.perf_counter()
+        failed = deliver_mails(mails, connection=self.get_connection(options))
+        self.report('one connection for all mails', len(mails) - len(failed), time.perf_counter() - start)
@@ -2,6 +2,8 @@ from django.shortcuts import redirect
 from social_django.middleware import SocialAuthExceptionMiddleware
 from social_core.exceptions import AuthAlreadyAssociated
 
+from .utils import buffered_mails
+
 
 class CustomSocialAuthExceptionMiddleware(SocialAuthExceptionMiddleware):
 
@@ -10,3 +12,15 @@ class CustomSocialAuthExceptionMiddleware(SocialAuthExceptionMiddleware):
             url = self.get_redirect_uri(request, exception)
             return redirect(url)
         return super(CustomSocialAuthExceptionMiddleware, self).process_exception(request, exception)
+
+
+class BufferedMailsMiddleware:
+    """
+    Coalesces celery messages of mails sent while handling request into one, enqueued after response is made.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with buffered_mails():
+            return self.get_response(request)
@@ -0,0 +1,19 @@
+# Generated by Django 4.0 on 2026-10-18 14:33
+
+import accounts.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_email_outbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='timezone',
+            field=models.CharField(db_index=True, default=accounts.models.get_default_timezone, max_length=63, validators=[accounts.models.validate_timezone], verbose_name='time zone'),
+        ),
+    ]
@@ -1,7 +1,10 @@
 import os
 import uuid
+from zoneinfo import available_timezones
 
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
@@ -9,9 +12,22 @@ from .managers import UserManager
 import datetime
 
 
+def get_default_timezone():
+    return settings.USER_DEFAULT_TIMEZONE
+
+
+def validate_timezone(value):
+    if value not in available_timezones():
+        raise ValidationError(_('%(value)s is not a valid time zone.'), params={'value': value})
+
+
 class User(AbstractUser):
     username = None
     email = models.EmailField(_('email address'), unique=True, null=False)
+    # IANA time zone name, reminder mails are sent in the morning of it
+    timezone = models.CharField(
+        _('time zone'), max_length=63, default=get_default_timezone, validators=[validate_timezone], db_index=True
+    )
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = []
@@ -62,3 +78,32 @@ class Activation(models.Model):
         user.save()
 
         Activation.objects.filter(user=self.user).delete()
+
+
+class EmailOutbox(models.Model):
+    """
+    Mail written in same transaction as change which triggers it, sent by accounts.outbox.drain_outbox().
+    Sent mails are deleted, mails which failed settings.MAIL_MAX_RETRIES times are kept for inspection.
+    """
+    template = models.CharField(max_length=100)
+    context = models.JSONField(default=dict)
+    to = models.EmailField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    # failed mails are claimed again after this time
+    available_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # mails claimed by sender, oldest first
+            models.Index(fields=['available_at', 'id'], name='email_outbox_available_idx'),
+        ]
+
+    def get_mail(self):
+        """
+        :return: list [template, context, to] to be sent by accounts.tasks.deliver_mails()
+        """
+        return [self.template, self.context, self.to]
+
+    def __str__(self):
+        return f'{self.template} to {self.to}'
@@ -0,0 +1,72 @@
+"""
+Transactional outbox of mails. Mails are written to EmailOutbox table in same transaction as change which
+triggers them, so mails of rolled back changes are never sent and mails are not lost while broker is down.
+Sender workers claim rows in batches with SELECT ... FOR UPDATE SKIP LOCKED, so many workers can drain
+outbox at once without sending same mail twice, and send each batch over one connection. Rows are deleted
+in same transaction after mails are sent, so a worker dying in between makes them sent again: delivery is
+at least once.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import EmailOutbox
+from .tasks import deliver_mails
+
+
+def claim_mails(batch_size):
+    """
+    Locks pending mails not locked by other workers, must be called inside transaction.
+    :param batch_size: number of mails
+    :return: list of EmailOutbox, oldest first
+    """
+    return list(
+        EmailOutbox.objects.select_for_update(skip_locked=True).filter(
+            available_at__lte=timezone.now(), attempts__lt=settings.MAIL_MAX_RETRIES + 1
+        ).order_by('available_at', 'id')[:batch_size]
+    )
+
+
+def send_claimed_mails(rows, connection=None):
+    """
+    Sends mails over one connection, deletes sent ones and postpones failed ones by
+    settings.MAIL_RETRY_DELAY seconds per attempt.
+    :param rows: list of claimed EmailOutbox
+    :param connection: mail backend connection, default backend by default
+    :return: number of failed mails
+    """
+    mails = [row.get_mail() for row in rows]
+    # failed mails are same list objects as given ones
+    failed = {id(mail) for mail in deliver_mails(mails, connection=connection)}
+    sent_ids = [row.id for row, mail in zip(rows, mails) if id(mail) not in failed]
+    EmailOutbox.objects.filter(id__in=sent_ids).delete()
+
+    now = timezone.now()
+    failed_rows = [row for row, mail in zip(rows, mails) if id(mail) in failed]
+    for row in failed_rows:
+        row.attempts += 1
+        row.available_at = now + timedelta(seconds=settings.MAIL_RETRY_DELAY * row.attempts)
+    EmailOutbox.objects.bulk_update(failed_rows, ['attempts', 'available_at'])
+    return len(failed_rows)
+
+
+def drain_outbox(batch_size=None, connection=None):
+    """
+    Sends pending mails batch by batch, each batch in its own transaction, till no mail is left to claim.
+    :param batch_size: mails claimed at once, settings.MAIL_BATCH_SIZE by default
+    :param connection: mail backend connection, default backend by default
+    :return: dict of number of 'sent' and 'failed' mails
+    """
+    batch_size = batch_size or settings.MAIL_BATCH_SIZE
+    stats = {'sent': 0, 'failed': 0}
+    while True:
+        with transaction.atomic():
+            rows = claim_mails(batch_size)
+            if rows:
+                failed = send_claimed_mails(rows, connection=connection)
+                stats['sent'] += len(rows) - failed
+                stats['failed'] += failed
+        if len(rows) < batch_size:
+            return stats
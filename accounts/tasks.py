@@ -1,11 +1,105 @@
 # todo/tasks.py
+import logging
+from pathlib import Path
 
 from celery import shared_task
-from django.core.mail import EmailMessage
+from celery.signals import worker_process_init
+from django.core.mail import EmailMessage, get_connection
+from django.template.loader import get_template
+
+logger = logging.getLogger(__name__)
+
+EMAIL_TEMPLATE_DIR = Path(__file__).resolve().parent / 'templates' / 'accounts' / 'emails'
+# compiled email templates of worker process by template name
+_email_templates = {}
+
+
+def get_email_template(name):
+    """
+    :param name: name of template in accounts/templates/accounts/emails without '.html'
+    :return: compiled template, loaded once per process
+    """
+    template = _email_templates.get(name)
+    if template is None:
+        template = _email_templates[name] = get_template(f'accounts/emails/{name}.html')
+    return template
+
+
+@worker_process_init.connect
+def preload_email_templates(**kwargs):
+    """
+    Compiles all email templates when worker process starts, so that first mails do not pay for it.
+    """
+    for path in sorted(EMAIL_TEMPLATE_DIR.glob('*.html')):
+        get_email_template(path.stem)
+
+
+def render_mail(mail):
+    """
+    :param mail: list [template, context, to] from accounts.utils.make_mail()
+    :return: tuple (subject, html_content, to)
+    """
+    template, context, to = mail
+    return context['subject'], get_email_template(template).render(context), to
+
+
+def deliver_mails(mails, connection=None):
+    """
+    Renders and sends mails over one connection, opened once for all of them.
+    :param mails: list of [template, context, to]
+    :param connection: mail backend connection, default backend by default
+    :return: list of mails which could not be sent
+    """
+    connection = connection or get_connection()
+    failed = []
+    try:
+        connection.open()
+    except Exception:
+        logger.exception('Could not open mail connection.')
+        return list(mails)
+    try:
+        for mail in mails:
+            try:
+                subject, html_content, to = render_mail(mail)
+                sent = EmailMessage(subject, html_content, to=[to], connection=connection).send()
+            except Exception:
+                logger.exception('Could not send mail to %s.', mail[2])
+                sent = 0
+            if not sent:
+                failed.append(mail)
+    finally:
+        connection.close()
+    return failed
 
 
 @shared_task()
 def send_mail_task(subject, html_content, to):
+    """
+    Kept for messages enqueued before mails went through outbox, they carry rendered mail, so it is sent directly.
+    """
     msg = EmailMessage(subject, html_content, to=[to])
     msg.send()
 
+
+@shared_task
+def send_mails_task(mails):
+    """
+    Kept for messages enqueued before mails went through outbox, their mails are written to outbox.
+    :param mails: list of [template, context, to]
+    :return: number of mails written to outbox
+    """
+    from .utils import send_mails
+
+    send_mails(mails)
+    return len(mails)
+
+
+@shared_task
+def drain_outbox_task():
+    """
+    Sends pending mails of outbox, routed to settings.MAIL_QUEUE so that a dedicated worker can send them.
+    :return: dict of number of 'sent' and 'failed' mails
+    """
+    from .outbox import drain_outbox
+
+    return drain_outbox()
@@ -1,3 +1,82 @@
+from unittest import mock
+
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
 from django.test import TestCase
+from django.utils import timezone
+
+from .models import EmailOutbox
+from .outbox import drain_outbox
+from .tasks import deliver_mails, send_mail_task, send_mails_task
+from .utils import buffered_mails, make_mail, send_mail, send_mails
+
+
+class FailingEmailBackend(EmailBackend):
+    opened = 0
+
+    def open(self):
+        FailingEmailBackend.opened += 1
+        return True
+
+    def send_messages(self, messages):
+        if any(message.to == ['fail@example.com'] for message in messages):
+            raise OSError('Recipient refused.')
+        return super(FailingEmailBackend, self).send_messages(messages)
+
+
+class MailBatchTestCase(TestCase):
+    def test_deliver_mails_over_one_connection_returns_failed(self):
+        mails = [
+            make_mail(to, 'activate_profile', {'subject': 'subject', 'uri': 'http://testserver/'})
+            for to in ('a@example.com', 'fail@example.com', 'b@example.com')
+        ]
+        FailingEmailBackend.opened = 0
+
+        failed = deliver_mails(mails, connection=FailingEmailBackend())
+
+        self.assertEqual(failed, [mails[1]])
+        self.assertEqual([message.to for message in mail.outbox], [['a@example.com'], ['b@example.com']])
+        self.assertIn('http://testserver/', mail.outbox[0].body)
+        self.assertEqual(FailingEmailBackend.opened, 1)
+
+    @mock.patch('accounts.utils.drain_outbox_task.delay')
+    def test_buffered_mails_are_written_to_outbox(self, delay):
+        with self.captureOnCommitCallbacks(execute=True):
+            with buffered_mails():
+                for to in ('a@example.com', 'b@example.com'):
+                    send_mail(to, 'activate_profile', {'subject': 'Profile activation', 'uri': 'http://testserver/'})
+                delay.assert_not_called()
+
+        # only template name and context are stored, mails are rendered by worker.
+        self.assertEqual(
+            [row.get_mail() for row in EmailOutbox.objects.order_by('id')],
+            [['activate_profile', {'subject': 'Profile activation', 'uri': 'http://testserver/'}, to]
+             for to in ('a@example.com', 'b@example.com')]
+        )
+        delay.assert_called_once()
+
+    def test_drain_outbox_deletes_sent_and_postpones_failed(self):
+        send_mails(
+            make_mail(to, 'activate_profile', {'subject': 'subject', 'uri': 'http://testserver/'})
+            for to in ('a@example.com', 'fail@example.com', 'b@example.com')
+        )
+
+        stats = drain_outbox(batch_size=2, connection=FailingEmailBackend())
+
+        self.assertEqual(stats, {'sent': 2, 'failed': 1})
+        failed = EmailOutbox.objects.get()
+        self.assertEqual((failed.to, failed.attempts), ('fail@example.com', 1))
+        self.assertGreater(failed.available_at, timezone.now())
+        self.assertEqual(drain_outbox(connection=FailingEmailBackend()), {'sent': 0, 'failed': 0})
+
+    @mock.patch('accounts.utils.drain_outbox_task.delay')
+    def test_mails_enqueued_before_outbox_are_still_sent(self, delay):
+        queued = make_mail('a@example.com', 'activate_profile', {'subject': 'subject', 'uri': 'http://testserver/'})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            send_mails_task([queued])
+            send_mail_task('subject', '<p>rendered</p>', 'b@example.com')
 
-# Create your tests here.
+        self.assertEqual([row.get_mail() for row in EmailOutbox.objects.all()], [queued])
+        delay.assert_called_once()
+        self.assertEqual([message.to for message in mail.outbox], [['b@example.com']])
@@ -1,14 +1,88 @@
-from django.template.loader import render_to_string
+import threading
+from contextlib import contextmanager
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
 from django.urls import reverse
 from django.utils.translation import gettext_lazy as _
 
-from .tasks import send_mail_task
+from .models import EmailOutbox
+from .tasks import drain_outbox_task
+
+# celery messages of current thread coalesced by buffered_mails()
+_buffer = threading.local()
+
+
+def make_mail(to, template, context):
+    """
+    Mail is rendered by worker, see accounts.tasks.render_mail(), so only template name and context are stored.
+    :param to: email address
+    :param template: name of template in accounts/templates/accounts/emails without '.html'
+    :param context: dict of JSON serializable values and 'subject', which may be lazy translation
+    :return: list [template, context, to] to be sent by send_mails()
+    """
+    return [template, dict(context, subject=str(context['subject'])), to]
+
+
+def notify_outbox():
+    """
+    Enqueues one celery message to drain outbox after current transaction commits, or when outermost
+    buffered_mails() block exits.
+    """
+    if getattr(_buffer, 'notify', None) is not None:
+        _buffer.notify = True
+        return
+    transaction.on_commit(lambda: drain_outbox_task.delay())
+
+
+@contextmanager
+def buffered_mails():
+    """
+    Coalesces celery messages of send_mail() calls inside the block into one, enqueued when it exits.
+    Mails are still written to outbox by each call, in its transaction. Nested blocks are part of outermost block.
+    """
+    if getattr(_buffer, 'notify', None) is not None:
+        yield
+        return
+
+    _buffer.notify = False
+    try:
+        yield
+        notify = _buffer.notify
+    finally:
+        _buffer.notify = None
+    if notify:
+        notify_outbox()
 
 
 def send_mail(to, template, context):
-    html_content = render_to_string(f'accounts/emails/{template}.html', context)
-    # send mail using celary
-    send_mail_task.delay(context['subject'], html_content, to)
+    # mail is sent by celery worker draining outbox
+    send_mails([make_mail(to, template, context)])
+
+
+def send_mails(mails, batch_size=None):
+    """
+    Writes mails to outbox in batches, in current transaction, and makes worker drain outbox after it commits.
+    :param mails: iterable of mails from make_mail()
+    :param batch_size: mails per insert query, settings.MAIL_BATCH_SIZE by default
+    :return: number of insert queries
+    """
+    batch_size = batch_size or settings.MAIL_BATCH_SIZE
+    mails = iter(mails)
+    queries = 0
+    while True:
+        batch = [
+            EmailOutbox(template=template, context=context, to=to)
+            for template, context, to in islice(mails, batch_size)
+        ]
+        if not batch:
+            break
+        EmailOutbox.objects.bulk_create(batch)
+        queries += 1
+    if queries:
+        notify_outbox()
+    return queries
 
 
 def send_activation_email(request, email, code):
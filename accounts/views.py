@@ -1,6 +1,7 @@
 from django.contrib import messages
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.tokens import default_token_generator
+from django.db import transaction
 from django.shortcuts import get_object_or_404, render, redirect
 from django.utils.decorators import method_decorator
 from django.utils.encoding import force_bytes
@@ -27,12 +28,14 @@ class RegisterApi(View):
         [required] email -> string
         [required] password1 -> string
         [required] password2 -> string
+        [optional] timezone -> string, IANA time zone name of reminder mails
     }
     response:
     {
         email: string,
         password1: string,
         password2: string,
+        timezone: string,
         status: string
     }
     permission: Must Be Anonymous user
@@ -42,9 +45,11 @@ class RegisterApi(View):
         if not form.is_valid():
             return JsonResponse(dict(form.errors.items()))
 
-        user = form.save()
-        code = user.get_activation_code()
-        send_activation_email(request, user.email, code)
+        # activation mail is written to outbox in same transaction as user
+        with transaction.atomic():
+            user = form.save()
+            code = user.get_activation_code()
+            send_activation_email(request, user.email, code)
 
         data = form.cleaned_data
         data['status'] = 'Successfully registered. To activate please verify email.'
@@ -144,8 +149,9 @@ class ResendActivationCodeApi(View):
             return JsonResponse(dict(form.errors.items()))
 
         user = User.objects.get(email=form.cleaned_data.get('email'))
-        code = user.get_activation_code()
-        send_activation_email(request, user.email, code)
+        with transaction.atomic():
+            code = user.get_activation_code()
+            send_activation_email(request, user.email, code)
 
         return JsonResponse({'message': 'Re-sent account activation code.'})
 
@@ -304,9 +310,11 @@ class RegisterView(View):
         if not form.is_valid():
             return render(request, template_name='accounts/register.html', context={'form': form})
 
-        user = form.save()
-        code = user.get_activation_code()
-        send_activation_email(request, user.email, code)
+        # activation mail is written to outbox in same transaction as user
+        with transaction.atomic():
+            user = form.save()
+            code = user.get_activation_code()
+            send_activation_email(request, user.email, code)
 
         return redirect('home')
 
@@ -2,6 +2,7 @@
 
 import os
 from celery import Celery
+from celery.schedules import crontab
 import dotenv
 
 dotenv.load_dotenv()
@@ -17,9 +18,19 @@ app.conf.beat_schedule = {
     # Schedulers
     'check_and_send_pending_mails': {
         'task': 'todo.tasks.send_reminder_mail',
-        'schedule': int(os.environ.get('REMINDER_SCHEDULE_DURATION', '86400')),  # every 86400 seconds it will be called
+        # every hour, for users whose local morning starts in that hour
+        'schedule': crontab(minute=0),
         # 'args': (2,) you can pass arguments also if required
-    }
+    },
+    'purge_trash': {
+        'task': 'todo.tasks.purge_trash_task',
+        'schedule': int(os.environ.get('TRASH_PURGE_SCHEDULE_DURATION', '3600')),
+    },
+    # mails left in outbox while broker was down, and retries of failed mails
+    'drain_mail_outbox': {
+        'task': 'accounts.tasks.drain_outbox_task',
+        'schedule': int(os.environ.get('MAIL_OUTBOX_SCHEDULE_DURATION', '60')),
+    },
 }
 
 app.autodiscover_tasks()
@@ -67,6 +67,9 @@ MIDDLEWARE = [
 
     # SOCIAL AUTHENTICATION
     'accounts.middleware.CustomSocialAuthExceptionMiddleware',
+
+    # MAILS OF REQUEST ENQUEUED TOGETHER
+    'accounts.middleware.BufferedMailsMiddleware',
 ]
 
 ROOT_URLCONF = 'core.urls'
@@ -109,6 +112,24 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.0/topics/cache/
+
+if os.environ.get('REDIS_CACHE_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ.get('REDIS_CACHE_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
 
@@ -227,6 +248,13 @@ EMAIL_HOST = 'smtp.gmail.com'
 EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD')
 EMAIL_PORT = 587
+# mails written to outbox per query, and claimed per batch by sender worker
+MAIL_BATCH_SIZE = int(os.environ.get('MAIL_BATCH_SIZE', '100'))
+# failed mails are retried this many times, after this many seconds times number of attempts
+MAIL_MAX_RETRIES = int(os.environ.get('MAIL_MAX_RETRIES', '3'))
+MAIL_RETRY_DELAY = int(os.environ.get('MAIL_RETRY_DELAY', '60'))
+# celery queue of outbox sender, e.g. "mail" for a dedicated worker started with "celery -A core worker -Q mail"
+MAIL_QUEUE = os.environ.get('MAIL_QUEUE', 'celery')
 
 
 CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap5"
@@ -242,6 +270,9 @@ CELERY_TIMEZONE = 'Asia/Kolkata'
 CELERY_RESULT_BACKEND = 'django-db'
 
 CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
+CELERY_TASK_ROUTES = {
+    'accounts.tasks.drain_outbox_task': {'queue': MAIL_QUEUE},
+}
 # CELERY_RESULT_BACKEND = "redis://localhost:6379"
 
 REST_FRAMEWORK = {
@@ -253,3 +284,47 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ]
 }
+
+# TODO LIST PAGINATION
+TODO_PAGE_SIZE = int(os.environ.get('TODO_PAGE_SIZE', '50'))
+TODO_MAX_PAGE_SIZE = int(os.environ.get('TODO_MAX_PAGE_SIZE', '200'))
+
+# TODO EXPORT
+TODO_EXPORT_CHUNK_SIZE = int(os.environ.get('TODO_EXPORT_CHUNK_SIZE', '2000'))
+
+# TODO TREE CACHE
+TODO_TREE_CACHE_ALIAS = 'default'
+TODO_TREE_CACHE_TIMEOUT = int(os.environ.get('TODO_TREE_CACHE_TIMEOUT', '300'))
+
+# BULK TASK APIS
+TODO_BULK_MAX_ITEMS = int(os.environ.get('TODO_BULK_MAX_ITEMS', '1000'))
+
+# TODO DELETION
+TODO_DELETE_CHUNK_SIZE = int(os.environ.get('TODO_DELETE_CHUNK_SIZE', '1000'))
+# todos with more tasks than this are deleted by celery task
+TODO_ASYNC_DELETE_THRESHOLD = int(os.environ.get('TODO_ASYNC_DELETE_THRESHOLD', '5000'))
+
+# TRASH
+# todos and tasks in trash for more days than this are purged
+TODO_TRASH_RETENTION_DAYS = int(os.environ.get('TODO_TRASH_RETENTION_DAYS', '30'))
+
+# REMINDER MAILS
+# due tasks fetched at once while sending reminder mails
+REMINDER_CHUNK_SIZE = int(os.environ.get('REMINDER_CHUNK_SIZE', '2000'))
+# reminder mails are sent hourly to users whose local time is in this hour
+REMINDER_HOUR = int(os.environ.get('REMINDER_HOUR', '8'))
+# time zone of users who did not choose one
+USER_DEFAULT_TIMEZONE = os.environ.get('USER_DEFAULT_TIMEZONE', 'Asia/Kolkata')
+
+# MANUAL TASK ORDERING
+# todo is rebalanced by celery task when a task is moved to a position longer than this
+TODO_POSITION_REBALANCE_LENGTH = int(os.environ.get('TODO_POSITION_REBALANCE_LENGTH', '32'))
+
+# IDEMPOTENCY-KEY OF WRITE APIS
+IDEMPOTENCY_CACHE_ALIAS = 'default'
+# seconds a response is replayed for repeated Idempotency-Key
+IDEMPOTENCY_KEY_TIMEOUT = int(os.environ.get('IDEMPOTENCY_KEY_TIMEOUT', '86400'))
+# seconds a request waits for another request with same key
+IDEMPOTENCY_LOCK_TIMEOUT = int(os.environ.get('IDEMPOTENCY_LOCK_TIMEOUT', '10'))
+# seconds a lock of key lives if request holding it dies, longer than slowest write request
+IDEMPOTENCY_LOCK_TTL = int(os.environ.get('IDEMPOTENCY_LOCK_TTL', '300'))
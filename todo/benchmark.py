@@ -0,0 +1,176 @@
+"""
+Helpers for benchmark management commands, seeding large datasets and timing queries.
+"""
+import random
+import time
+from datetime import date, timedelta
+
+from django.db import connection, transaction
+
+from accounts.models import User
+from .models import Todo, Task, SubTask, TaskClosure
+from .positions import set_new_positions
+
+BENCHMARK_EMAIL = 'benchmark-{}@example.com'
+# words of seeded task content and details, for search benchmarks
+WORDS = (
+    'buy', 'milk', 'bread', 'call', 'plumber', 'invoice', 'report', 'meeting', 'review', 'deploy',
+    'release', 'garden', 'water', 'plants', 'book', 'flight', 'hotel', 'taxes', 'dentist', 'birthday',
+    'gift', 'clean', 'kitchen', 'laundry', 'email', 'client', 'budget', 'draft', 'slides', 'backup',
+)
+
+
+def get_words(count):
+    return ' '.join(random.choices(WORDS, k=count))
+
+
+def seed_benchmark_data(users=10, todos=20, tasks=50, sub_task_ratio=0.3, batch_size=5000, stdout=None):
+    """
+    Creates users with todos and tasks, where part of tasks are sub-tasks of other tasks of same todo.
+    Users already seeded are reused and skipped.
+    :param users: number of users
+    :param todos: number of todos per user
+    :param tasks: number of tasks per todo
+    :param sub_task_ratio: part of tasks of todo which are sub-tasks
+    :param batch_size: rows inserted per query
+    :param stdout: optional output stream for progress
+    :return: list of users
+    """
+    seeded = []
+    today = date.today()
+    for i in range(users):
+        user, created = User.objects.get_or_create(email=BENCHMARK_EMAIL.format(i))
+        seeded.append(user)
+        if not created:
+            continue
+
+        with transaction.atomic():
+            todo_objs = Todo.objects.bulk_create(
+                [Todo(title=f'todo {j}', owner=user) for j in range(todos)],
+                batch_size=batch_size
+            )
+            task_objs = [
+                Task(
+                    content=f'task {k} of todo {todo.id} {get_words(3)}',
+                    details=f'details of task {k} {get_words(8)}',
+                    is_completed=random.random() < 0.5,
+                    completion_date=today + timedelta(days=random.randint(-30, 30)),
+                    todo=todo,
+                )
+                for todo in todo_objs for k in range(tasks)
+            ]
+            set_new_positions(task_objs)
+            task_objs = Task.objects.bulk_create(task_objs, batch_size=batch_size)
+
+            links = []
+            sub_task_ids = []
+            for start in range(0, len(task_objs), tasks):
+                todo_tasks = task_objs[start:start + tasks]
+                main_count = max(1, int(len(todo_tasks) * (1 - sub_task_ratio)))
+                for sub_task in todo_tasks[main_count:]:
+                    links.append(SubTask(task=random.choice(todo_tasks[:main_count]), sub_task=sub_task))
+                    sub_task_ids.append(sub_task.id)
+            SubTask.objects.bulk_create(links, batch_size=batch_size)
+            for start in range(0, len(links), batch_size):
+                TaskClosure.attach([(link.task.id, link.sub_task.id) for link in links[start:start + batch_size]])
+            for start in range(0, len(sub_task_ids), batch_size):
+                Task.objects.filter(id__in=sub_task_ids[start:start + batch_size]).update(is_subtask=True)
+            Todo.recount(todo_ids=[todo.id for todo in todo_objs])
+
+        if stdout:
+            stdout.write(f'Seeded {user.email}: {len(todo_objs)} todos, {len(task_objs)} tasks.')
+    return seeded
+
+
+def seed_task_tree(user, nodes=100000, fanout=10, batch_size=5000, stdout=None):
+    """
+    Creates todo with one main task and its descendants, each task having fanout sub-tasks,
+    level by level so that closure rows of each level are inserted from rows of level above.
+    :param user: owner of todo
+    :param nodes: number of tasks in tree
+    :param fanout: number of sub-tasks per task
+    :param batch_size: rows inserted per query
+    :param stdout: optional output stream for progress
+    :return: tuple (todo, list of lists of task ids per level, main task first)
+    """
+    with transaction.atomic():
+        todo = Todo.objects.create(title=f'tree of {nodes} tasks', owner=user)
+        root = Task.objects.create(content='task 0', todo=todo)
+        levels = [[root.id]]
+        created = 1
+        while created < nodes:
+            parent_ids = []
+            for parent_id in levels[-1]:
+                parent_ids.extend([parent_id] * min(fanout, nodes - created - len(parent_ids)))
+            tasks = [Task(content=f'task {created + k}', todo=todo, is_subtask=True) for k in range(len(parent_ids))]
+            set_new_positions(tasks)
+            tasks = Task.objects.bulk_create(tasks, batch_size=batch_size)
+            pairs = [(parent_id, task.id) for parent_id, task in zip(parent_ids, tasks)]
+            SubTask.objects.bulk_create(
+                [SubTask(task_id=parent_id, sub_task_id=task_id) for parent_id, task_id in pairs],
+                batch_size=batch_size
+            )
+            for start in range(0, len(pairs), batch_size):
+                TaskClosure.attach(pairs[start:start + batch_size])
+            levels.append([task.id for task in tasks])
+            created += len(tasks)
+            if stdout:
+                stdout.write(f'Seeded level {len(levels) - 1}: {len(tasks)} tasks.')
+        Todo.recount(todo_ids=[todo.id])
+    return todo, levels
+
+
+def time_call(func, runs=5):
+    """
+    :param func: function without arguments
+    :param runs: number of times to call
+    :return: tuple (average milliseconds, number of queries per call, result of last call)
+    """
+    from django.test.utils import CaptureQueriesContext
+
+    result = None
+    with CaptureQueriesContext(connection) as queries:
+        start = time.perf_counter()
+        for _ in range(runs):
+            result = func()
+        milliseconds = (time.perf_counter() - start) * 1000 / runs
+    return milliseconds, len(queries) // runs, result
+
+
+def delete_benchmark_data():
+    """
+    Deletes users created by seed_benchmark_data() along with their todos.
+    """
+    User.objects.filter(email__startswith='benchmark-', email__endswith='@example.com').delete()
+
+
+def time_queryset(queryset, runs=5):
+    """
+    :param queryset: queryset to be evaluated
+    :param runs: number of times to evaluate
+    :return: tuple (average milliseconds, number of rows)
+    """
+    rows = 0
+    start = time.perf_counter()
+    for _ in range(runs):
+        rows = len(list(queryset.all()))
+    return (time.perf_counter() - start) * 1000 / runs, rows
+
+
+def explain_queryset(queryset):
+    """
+    :param queryset: queryset to be explained
+    :return: query plan as string
+    """
+    if connection.vendor == 'postgresql':
+        return queryset.explain(analyze=True)
+    if connection.vendor == 'sqlite':
+        # cached EXPLAIN statements of SQLite are not prepared again when indexes change, so schema version
+        # is made part of SQL.
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA schema_version')
+            version = cursor.fetchone()[0]
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql} -- schema version {version}', params)
+            return '\n'.join(' '.join(str(column) for column in row) for row in cursor.fetchall())
+    return queryset.explain()
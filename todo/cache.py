@@ -0,0 +1,163 @@
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Q
+
+VERSION_KEY = 'todo-tree-version:{user_id}'
+TREE_KEY = 'todo-tree:{user_id}:{version}:{page_key}'
+HITS_KEY = 'todo-tree-stats:hits'
+MISSES_KEY = 'todo-tree-stats:misses'
+
+# TreeInvalidation of current transaction of thread
+_pending = threading.local()
+
+
+def get_cache():
+    return caches[settings.TODO_TREE_CACHE_ALIAS]
+
+
+def _new_version():
+    # time based, so that version evicted from cache never comes back with old value.
+    return time.time_ns()
+
+
+def _incr(key):
+    cache = get_cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+
+
+def get_tree_version(user_id):
+    """
+    Current version of todo tree of user, it changes on every change of user's Todo, Task or SubTask.
+    :param user_id: integer
+    :return: integer
+    """
+    cache = get_cache()
+    key = VERSION_KEY.format(user_id=user_id)
+    version = cache.get(key)
+    if version is None:
+        version = _new_version()
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_tree_version(user_id):
+    """
+    Makes all cached trees of user stale.
+    :param user_id: integer
+    """
+    cache = get_cache()
+    key = VERSION_KEY.format(user_id=user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _new_version(), timeout=None)
+
+
+class TreeInvalidation:
+    """
+    Owners of todo trees to be invalidated once when current transaction commits, along with todos and tasks
+    whose owner is not loaded, so that their owners are fetched in one query for the whole transaction.
+    """
+    def __init__(self):
+        self.user_ids, self.todo_ids, self.task_ids = set(), set(), set()
+        self.done = False
+
+    def is_queued(self):
+        # callback is dropped from run_on_commit when its transaction or savepoint is rolled back,
+        # items are (savepoint ids, callback) or (savepoint ids, callback, robust) by Django version.
+        return not self.done and any(item[1] is self for item in transaction.get_connection().run_on_commit)
+
+    def __call__(self):
+        self.done = True
+        user_ids = set(self.user_ids)
+        if self.todo_ids or self.task_ids:
+            from .models import Todo
+
+            user_ids.update(Todo.all_objects.filter(
+                Q(id__in=self.todo_ids) | Q(tasks__id__in=self.task_ids)
+            ).values_list('owner_id', flat=True).distinct())
+        for user_id in user_ids:
+            bump_tree_version(user_id)
+
+
+def invalidate_tree(user_id=None, todo_id=None, task_id=None):
+    """
+    Bumps tree version of owner after current transaction commits, so that tree can not be
+    cached again from data which is not committed yet. Owners of one transaction are bumped once,
+    by one callback.
+    :param user_id: integer 'id' of owner
+    :param todo_id: integer 'id' of todo of owner, if owner is not known
+    :param task_id: integer 'id' of task of owner, if neither owner nor todo is known
+    """
+    if user_id is None and todo_id is None and task_id is None:
+        return
+    invalidation = getattr(_pending, 'invalidation', None)
+    queued = invalidation is not None and invalidation.is_queued()
+    if not queued:
+        invalidation = _pending.invalidation = TreeInvalidation()
+    for ids, value in ((invalidation.user_ids, user_id), (invalidation.todo_ids, todo_id),
+                       (invalidation.task_ids, task_id)):
+        if value is not None:
+            ids.add(value)
+    if not queued:
+        transaction.on_commit(invalidation)
+
+
+def get_or_build_tree(user_id, page_key, build):
+    """
+    Returns cached tree of user for current version or builds and caches it.
+    :param user_id: integer
+    :param page_key: string to identify page of tree, like cursor and page size
+    :param build: function without arguments returning data to be cached
+    :return: data
+    """
+    cache = get_cache()
+    # page key has cursor given by client, so it is hashed to make a valid cache key of fixed length.
+    page_key = hashlib.sha256(page_key.encode()).hexdigest()
+    key = TREE_KEY.format(user_id=user_id, version=get_tree_version(user_id), page_key=page_key)
+    data = cache.get(key)
+    if data is not None:
+        _incr(HITS_KEY)
+        return data
+
+    _incr(MISSES_KEY)
+    data = build()
+    cache.set(key, data, timeout=settings.TODO_TREE_CACHE_TIMEOUT)
+    return data
+
+
+def get_tree_cache_stats():
+    """
+    :return: dict of hits and misses of todo tree cache
+    """
+    cache = get_cache()
+    return {
+        'hits': cache.get(HITS_KEY, 0),
+        'misses': cache.get(MISSES_KEY, 0),
+    }
+
+
+def get_tree_etag(request, *args, **kwargs):
+    """
+    Strong ETag of response for current user's todo tree version, requested url and media type negotiated
+    by DRF, to be used as 'etag_func' of django.views.decorators.http.condition. Views of DRF must vary on
+    'Accept' header, views of todo app always respond JSON.
+    :param request: request with logged-in user
+    :return: string or None for anonymous user
+    """
+    if not request.user.is_authenticated:
+        return None
+    version = get_tree_version(request.user.id)
+    media_type = getattr(request, 'accepted_media_type', None) or 'application/json'
+    key = f'{request.user.id}:{version}:{request.get_full_path()}:{media_type}'
+    return hashlib.md5(key.encode()).hexdigest()
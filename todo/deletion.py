@@ -0,0 +1,165 @@
+"""
+Deleting todos with chunked raw DELETE queries.
+Todo.delete() makes Django's deletion collector load every task and sub-task link of todo into memory
+before deleting them, so here rows are deleted in order TaskClosure, SubTask -> Task -> Todo by primary key ranges,
+each chunk in its own short transaction. Very large todos are deleted by a celery task.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from .cache import get_cache, invalidate_tree
+from .models import Todo, Task, SubTask, TaskClosure
+
+JOB_KEY = 'todo-delete-job:{job_id}'
+JOB_TIMEOUT = 60 * 60 * 24
+JOB_STATUS = {
+    'PENDING': 'pending',
+    'RECEIVED': 'pending',
+    'STARTED': 'running',
+    'RETRY': 'running',
+    'SUCCESS': 'done',
+    'FAILURE': 'failed',
+    'REVOKED': 'failed',
+}
+
+
+def raw_delete(queryset):
+    """
+    Deletes rows of queryset with one DELETE query, without loading them into memory.
+    It bypasses pre_delete and post_delete signals and Django's on_delete cascades, and database has no
+    cascades of its own, so callers must first delete rows referencing deleted ones:
+    - Todo: its tasks, with rows of Task
+    - Task: TaskClosure rows of task as ancestor or descendant, and SubTask links of task as task or sub-task
+    - SubTask and TaskClosure: nothing, but hierarchy of TaskClosure must be detached along with SubTask link
+    Task counters of todos and cached todo trees are not updated either.
+    :param queryset: queryset of model, without slicing
+    :return: number of deleted rows
+    """
+    return queryset._raw_delete(queryset.db)
+
+
+def _delete_tasks(tasks):
+    """
+    Deletes hierarchy and sub-task links of given tasks and then the tasks, without loading them.
+    :param tasks: Task queryset, including tasks in trash
+    :return: tuple (number of sub-task links deleted, number of tasks deleted)
+    """
+    task_ids = tasks.values('id')
+    raw_delete(TaskClosure.objects.filter(Q(ancestor_id__in=task_ids) | Q(descendant_id__in=task_ids)))
+    links = SubTask.objects.filter(Q(task_id__in=task_ids) | Q(sub_task_id__in=task_ids))
+    return raw_delete(links), raw_delete(tasks)
+
+
+def get_chunk_end(todo_id, after_id, chunk_size):
+    """
+    :param todo_id: integer 'id' of todo
+    :param after_id: task id after which chunk starts, 0 for first chunk
+    :param chunk_size: number of tasks in chunk
+    :return: id of last task of chunk or None if there are no tasks after after_id
+    """
+    ids = Task.all_objects.filter(todo_id=todo_id, id__gt=after_id).order_by('id').values_list('id', flat=True)
+    end = ids[chunk_size - 1:chunk_size].first()
+    return end if end is not None else ids.last()
+
+
+def delete_todo_rows(todo_id, chunk_size=None):
+    """
+    Deletes todo with its tasks and sub-task links by chunks of task ids, each chunk in one transaction,
+    so that memory and lock time does not depend on number of tasks.
+    :param todo_id: integer 'id' of todo
+    :param chunk_size: tasks deleted per transaction, settings.TODO_DELETE_CHUNK_SIZE by default
+    :return: dict of number of deleted 'todos', 'tasks' and 'sub_tasks' links
+    """
+    chunk_size = chunk_size or settings.TODO_DELETE_CHUNK_SIZE
+    deleted = {'todos': 0, 'tasks': 0, 'sub_tasks': 0}
+    owner_id = Todo.all_objects.filter(id=todo_id).values_list('owner_id', flat=True).first()
+    if owner_id is None:
+        return deleted
+
+    after_id = 0
+    while True:
+        end = get_chunk_end(todo_id, after_id, chunk_size)
+        if end is None:
+            break
+        with transaction.atomic():
+            links, tasks = _delete_tasks(Task.all_objects.filter(todo_id=todo_id, id__gt=after_id, id__lte=end))
+        deleted['sub_tasks'] += links
+        deleted['tasks'] += tasks
+        after_id = end
+
+    with transaction.atomic():
+        # locking todo blocks tasks being added to it, then deleting tasks added while deleting chunks.
+        list(Todo.all_objects.select_for_update().filter(id=todo_id).values_list('id', flat=True))
+        links, tasks = _delete_tasks(Task.all_objects.filter(todo_id=todo_id))
+        deleted['sub_tasks'] += links
+        deleted['tasks'] += tasks
+        deleted['todos'] = raw_delete(Todo.all_objects.filter(id=todo_id))
+        invalidate_tree(owner_id)
+    return deleted
+
+
+def purge_deleted_tasks(before, chunk_size=None):
+    """
+    Deletes tasks which are in trash since before given time, by chunks of task ids.
+    :param before: datetime
+    :param chunk_size: tasks deleted per transaction, settings.TODO_DELETE_CHUNK_SIZE by default
+    :return: dict of number of deleted 'tasks' and 'sub_tasks' links
+    """
+    chunk_size = chunk_size or settings.TODO_DELETE_CHUNK_SIZE
+    deleted = {'tasks': 0, 'sub_tasks': 0}
+    tasks = Task.all_objects.filter(deleted_at__lt=before).order_by('id').values_list('id', flat=True)
+    while True:
+        task_ids = list(tasks[:chunk_size])
+        if not task_ids:
+            break
+        with transaction.atomic():
+            links, count = _delete_tasks(Task.all_objects.filter(id__in=task_ids))
+        deleted['sub_tasks'] += links
+        deleted['tasks'] += count
+    return deleted
+
+
+def delete_todo(todo):
+    """
+    Deletes todo right away, or with celery task if it has more tasks than
+    settings.TODO_ASYNC_DELETE_THRESHOLD.
+    :param todo: Todo object
+    :return: job id of celery task or None if todo is already deleted
+    """
+    if todo.task_count <= settings.TODO_ASYNC_DELETE_THRESHOLD:
+        delete_todo_rows(todo.id)
+        return None
+
+    from .tasks import delete_todo_task
+
+    job = delete_todo_task.delay(todo.id)
+    get_cache().set(
+        JOB_KEY.format(job_id=job.id),
+        {'owner_id': todo.owner_id, 'todo_id': todo.id},
+        timeout=JOB_TIMEOUT
+    )
+    return job.id
+
+
+def get_delete_job_status(job_id, owner_id):
+    """
+    :param job_id: job id returned by delete_todo()
+    :param owner_id: integer 'id' of user asking for status
+    :return: dict of 'job_id', 'todo', 'status' and 'result' when done, or None if job is not of user
+    """
+    job = get_cache().get(JOB_KEY.format(job_id=job_id))
+    if job is None or job['owner_id'] != owner_id:
+        return None
+
+    from celery.result import AsyncResult
+
+    result = AsyncResult(job_id)
+    data = {
+        'job_id': job_id,
+        'todo': job['todo_id'],
+        'status': JOB_STATUS.get(result.state, 'pending'),
+    }
+    if result.successful():
+        data['result'] = result.result
+    return data
@@ -0,0 +1,87 @@
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Todo, Task
+
+NDJSON = 'ndjson'
+JSON = 'json'
+EXPORT_FORMATS = {
+    NDJSON: 'application/x-ndjson',
+    JSON: 'application/json',
+}
+
+
+def iter_export_records(user, chunk_size=None):
+    """
+    Yields all todos of user and then all their tasks as dict, one record at a time.
+    Rows are read with server-side cursors, so memory does not grow with number of tasks.
+    Sub-tasks have 'parent' as id of their main task, for main tasks it is None.
+    :param user: owner of todos
+    :param chunk_size: number of rows fetched from database at once
+    :return: generator of dict
+    """
+    chunk_size = chunk_size or settings.TODO_EXPORT_CHUNK_SIZE
+
+    todos = Todo.objects.filter(owner=user).order_by('id').values('id', 'title')
+    for todo in todos.iterator(chunk_size=chunk_size):
+        yield {
+            'type': 'todo',
+            'id': todo['id'],
+            'title': todo['title'],
+            'owner': user.email,
+        }
+
+    tasks = Task.objects.filter(todo__owner=user, todo__deleted_at__isnull=True).order_by(
+        'todo_id', 'position', 'id'
+    ).values(
+        'id', 'content', 'details', 'is_completed', 'is_subtask', 'completion_date', 'todo_id', 'parent_task__task_id'
+    )
+    for task in tasks.iterator(chunk_size=chunk_size):
+        yield {
+            'type': 'task',
+            'id': task['id'],
+            'content': task['content'],
+            'details': task['details'],
+            'is_completed': task['is_completed'],
+            'is_subtask': task['is_subtask'],
+            'completion_date': task['completion_date'],
+            'todo': task['todo_id'],
+            'parent': task['parent_task__task_id'],
+        }
+
+
+def iter_ndjson(records):
+    """
+    :param records: iterable of dict
+    :return: generator of lines, one JSON object per line
+    """
+    for record in records:
+        yield json.dumps(record, cls=DjangoJSONEncoder) + '\n'
+
+
+def iter_json(records):
+    """
+    :param records: iterable of dict
+    :return: generator of chunks making one JSON array
+    """
+    yield '['
+    separator = '\n'
+    for record in records:
+        yield separator + json.dumps(record, cls=DjangoJSONEncoder)
+        separator = ',\n'
+    yield '\n]\n'
+
+
+def iter_export(user, export_format=NDJSON, chunk_size=None):
+    """
+    :param user: owner of todos
+    :param export_format: 'ndjson' or 'json'
+    :param chunk_size: number of rows fetched from database at once
+    :return: generator of strings
+    """
+    records = iter_export_records(user, chunk_size=chunk_size)
+    if export_format == JSON:
+        return iter_json(records)
+    return iter_ndjson(records)
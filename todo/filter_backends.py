@@ -1,8 +1,84 @@
+from rest_framework import fields
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import OrderingFilter
+
+
 class CurrentUserForTodoFilterBackend:
     def filter_queryset(self, request, queryset, view_class):
-        return queryset.filter(owner=request.user)
+        return queryset.filter(owner=request.user, deleted_at__isnull=True)
 
 
 class CurrentUserForTaskFilterBackend:
     def filter_queryset(self, request, queryset, view_class):
-        return queryset.filter(todo__owner=request.user)
+        # tasks of todos in trash are hidden with their todo.
+        return queryset.filter(todo__owner=request.user, todo__deleted_at__isnull=True, deleted_at__isnull=True)
+
+
+class QueryParamFilterBackend:
+    """
+    Filters queryset by query parameters if they are given, each parsed by a DRF field.
+    'lookups' maps query parameter to tuple (queryset lookup, DRF field).
+    """
+    lookups = {}
+
+    def get_filters(self, request):
+        """
+        :param request: DRF request
+        :return: dict of queryset lookup -> parsed value of given query parameters
+        :raise ValidationError: if a query parameter is invalid
+        """
+        filters = {}
+        for query_param, (lookup, field) in self.lookups.items():
+            value = request.query_params.get(query_param)
+            if value in (None, ''):
+                continue
+            try:
+                filters[lookup] = field.run_validation(value)
+            except ValidationError as e:
+                raise ValidationError({query_param: e.detail})
+        return filters
+
+    def filter_queryset(self, request, queryset, view_class):
+        filters = self.get_filters(request)
+        return queryset.filter(**filters) if filters else queryset
+
+
+class TaskTodoFilterBackend(QueryParamFilterBackend):
+    # uses indexes starting with 'todo' of Task.
+    lookups = {'todo': ('todo_id', fields.IntegerField(min_value=1))}
+
+
+class TaskCompletedFilterBackend(QueryParamFilterBackend):
+    # uses 'task_todo_completed_date_idx' index.
+    lookups = {'is_completed': ('is_completed', fields.BooleanField())}
+
+
+class TaskSubtaskFilterBackend(QueryParamFilterBackend):
+    # uses 'task_todo_subtask_id_idx' index.
+    lookups = {'is_subtask': ('is_subtask', fields.BooleanField())}
+
+
+class TaskCompletionDateFilterBackend(QueryParamFilterBackend):
+    # uses 'task_todo_date_idx' index, or 'task_todo_completed_date_idx' along with 'is_completed'.
+    lookups = {
+        'completion_date_after': ('completion_date__gte', fields.DateField(input_formats=['%d-%m-%Y'])),
+        'completion_date_before': ('completion_date__lte', fields.DateField(input_formats=['%d-%m-%Y'])),
+    }
+
+
+class TaskOrderingFilterBackend(OrderingFilter):
+    """
+    Orders tasks by 'ordering' query parameter, comma separated fields with optional '-' prefix,
+    and then by id so that pages are stable. Tasks are in manual order of their todo by default.
+    """
+    ordering_fields = ['id', 'todo', 'position', 'completion_date']
+    ordering = ['todo', 'position']
+
+    def get_ordering(self, request, queryset, view):
+        ordering = list(super(TaskOrderingFilterBackend, self).get_ordering(request, queryset, view))
+        if not {'id', '-id'} & set(ordering):
+            ordering.append('id')
+        return ordering
+
+    def get_default_ordering(self, view):
+        return getattr(view, 'ordering', self.ordering)
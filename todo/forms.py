@@ -2,6 +2,7 @@ from django import forms
 from django.shortcuts import get_object_or_404
 
 from .models import Todo, Task, SubTask
+from .services import update_task, link_sub_tasks, SubTaskLinkError
 
 
 class CreateUpdateTodoForm(forms.ModelForm):
@@ -29,39 +30,26 @@ class CreateUpdateTaskForm(forms.ModelForm):
         error_messages={'invalid': 'Date is invalid or does not match format DD-MM-YYYY'}
     )
 
+    def __init__(self, *args, **kwargs):
+        super(CreateUpdateTaskForm, self).__init__(*args, **kwargs)
+        # state of task before form data is applied to instance, used by save() while updating
+        self.old_todo_id = self.instance.todo_id
+        self.was_completed = self.instance.is_completed
+
     def save(self, **kwargs):
-        todo = kwargs.pop('todo', None)
         # check is is_subtask parameter is False or not
         is_subtask = str(kwargs.pop('is_subtask', None)) != 'False'
 
-        # If task updated is main task and its is_complete status is changed to true
-        main_task_is_completed_status = False
-        if self.instance.id is not None and \
-                not self.instance.is_subtask and \
-                not self.instance.is_completed and \
-                self.cleaned_data['is_completed']:
-            main_task_is_completed_status = True
-
-        # while updating, if task is subtask and changed to main task
-        # or todo of task(is_subtask=True) is changed
-        if self.instance.id is not None and \
-                (self.instance.is_subtask and not is_subtask) or \
-                (self.instance.todo != todo and self.instance.is_subtask):
-            self.instance.is_subtask = False
-            self.instance.parent_task.delete()
-
-        obj = super(CreateUpdateTaskForm, self).save(**kwargs)
-
-        # while updating, if task is subtask and changed to main task then 0 times loop
-        # and when task is main task and its todo is changed then todos of all its sub-task is changed if any.
-        if self.instance.id is not None:
-            for sub_task_obj in self.instance.sub_tasks.all():
-                sub_task = sub_task_obj.sub_task
-                sub_task.todo = obj.todo
-                if main_task_is_completed_status:
-                    sub_task.is_completed = True
-                sub_task.save()
-        return obj
+        if self.instance.id is None:
+            return super(CreateUpdateTaskForm, self).save(**kwargs)
+
+        # while updating, sub-task can become main task, and changes of main task are applied to its sub-tasks.
+        return update_task(
+            self.instance,
+            old_todo_id=self.old_todo_id,
+            was_completed=self.was_completed,
+            make_main_task=not is_subtask,
+        )
 
     class Meta:
         model = Task
@@ -72,68 +60,23 @@ class CreateSubTaskUsingIdsForm(forms.Form):
     task = forms.IntegerField()
     sub_task = forms.IntegerField()
 
-    def clean_task(self):
-        task_id = self.data['task']
-        task = None
-
-        try:
-            task = Task.objects.get(id=task_id)
-        except Task.DoesNotExist:
-            self.add_error('task', 'This task id is not valid.')
-
-        if task and task.is_subtask:
-            self.add_error('task', 'This task already sub-task.')
-
-        return task_id
-
-    def clean_sub_task(self):
-        sub_task_id = self.data['sub_task']
-        task_id = self.data['task']
-        task, sub_task = None, None
-
-        try:
-            sub_task = Task.objects.get(id=sub_task_id)
-        except Task.DoesNotExist:
-            self.add_error('sub_task', 'This sub-task id is not valid.')
-
-        try:
-            task = Task.objects.get(id=task_id)
-        except Task.DoesNotExist:
-            pass
-
-        if sub_task and sub_task.sub_tasks and sub_task.sub_tasks.count() > 0:
-            self.add_error('sub_task', 'The sub-task is parent task, so cannot become sub-task.')
-        try:
-            if sub_task and sub_task.parent_task and sub_task.parent_task.task == task:
-                self.add_error('sub_task', 'The sub-task is already sub-task of the task.')
-            elif sub_task and sub_task.is_subtask:
-                self.add_error('sub_task', 'This sub-task is already sub-task of another task.')
-        except Task.parent_task.RelatedObjectDoesNotExist:
-            if sub_task and sub_task.is_subtask:
-                self.add_error('sub_task', 'This sub-task is already sub-task of another task.')
-
-        if sub_task and sub_task.todo != task.todo:
-            self.add_error('sub_task', 'The todo of task and sub-task is not matching.')
-
-        if task and sub_task and task == sub_task:
-            self.add_error('sub_task', 'The task and sub-task cannot be same.')
-
-        return sub_task_id
-
     def save(self):
+        """
+        Links sub-task to task, pair is validated by link_sub_tasks() while its tasks are locked.
+        :return: created SubTask or None if pair is not valid, then its errors are added to form
+        """
         if self.errors:
             raise ValueError(
                 "The SubTask could not be created because the data didn't validate."
             )
 
-        sub_task_id = self.data['sub_task']
-        task = self.data['task']
-
-        sub_task_obj = Task.objects.get(id=sub_task_id)
-        sub_task_obj.is_subtask = True
-        sub_task_obj.save()
-
-        return SubTask.objects.create(task_id=task, sub_task_id=sub_task_id)
+        try:
+            return link_sub_tasks([(self.cleaned_data['task'], self.cleaned_data['sub_task'])])[0]
+        except SubTaskLinkError as e:
+            for field, messages in e.errors[0].items():
+                for message in messages:
+                    self.add_error(field, message)
+            return None
 
 
 class CreateSubTaskUsingDataForm(forms.ModelForm):
@@ -154,9 +97,6 @@ class CreateSubTaskUsingDataForm(forms.ModelForm):
         except Task.DoesNotExist:
             self.add_error('task', 'This task id is not valid.')
 
-        if task and task.is_subtask:
-            self.add_error('task', 'This task is sub task of another task so it is invalid.')
-
         if task and task.todo.id != todo.id:
             self.add_error('task', 'Todo for task and sub task does not match.')
 
@@ -0,0 +1,222 @@
+"""
+Idempotency-Key support for write requests of todo and todo_in_drf views.
+First response of a request with 'Idempotency-Key' header is stored in cache per user, and requests
+repeating the key get the stored response without running the view again. Requests with same key
+are run one at a time by holding a lock in cache.
+"""
+import hashlib
+import secrets
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse, JsonResponse
+from django.http.request import RawPostDataException
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+IDEMPOTENCY_HEADER = 'HTTP_IDEMPOTENCY_KEY'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+RESPONSE_KEY = 'idempotency:{user_id}:{key}'
+LOCK_KEY = 'idempotency-lock:{user_id}:{key}'
+UNSAFE_METHODS = ('POST', 'PUT', 'PATCH', 'DELETE')
+# headers of stored response which are replayed with it
+STORED_HEADERS = ('ETag', 'Location')
+LOCK_POLL_INTERVAL = 0.05
+
+IN_PROGRESS_MESSAGE = 'A request with this Idempotency-Key is in progress.'
+KEY_REUSED_MESSAGE = 'This Idempotency-Key is already used for another request.'
+
+
+class IdempotencyKeyReused(ValueError):
+    pass
+
+
+class IdempotencyInProgress(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = IN_PROGRESS_MESSAGE
+    default_code = 'idempotency_in_progress'
+
+
+class IdempotencyKeyReusedError(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = KEY_REUSED_MESSAGE
+    default_code = 'idempotency_key_reused'
+
+
+class IdempotentReplay(Exception):
+    def __init__(self, response):
+        super(IdempotentReplay, self).__init__()
+        self.response = response
+
+
+def get_cache():
+    return caches[settings.IDEMPOTENCY_CACHE_ALIAS]
+
+
+def get_fingerprint(request):
+    """
+    :param request: Django or DRF request
+    :return: hash of method, url and body of request
+    """
+    try:
+        body = request.body
+    except RawPostDataException:
+        # multipart body is already read by parsers.
+        body = request.POST.urlencode().encode()
+    data = request.method.encode() + b'\n' + request.get_full_path().encode() + b'\n' + body
+    return hashlib.sha256(data).hexdigest()
+
+
+class IdempotentRequest:
+    """
+    Write request of logged-in user with 'Idempotency-Key' header.
+    """
+    def __init__(self, user_id, key, fingerprint):
+        # key is hashed so that any header value makes a valid cache key.
+        hashed_key = hashlib.sha256(key.encode()).hexdigest()
+        self.response_key = RESPONSE_KEY.format(user_id=user_id, key=hashed_key)
+        self.lock_key = LOCK_KEY.format(user_id=user_id, key=hashed_key)
+        self.fingerprint = fingerprint
+        # value of lock held by this request, so that it never releases lock taken by another request
+        self.lock_token = None
+
+    @classmethod
+    def from_request(cls, request, user):
+        """
+        :param request: Django or DRF request
+        :param user: authenticated user of request
+        :return: IdempotentRequest or None if request is not write request with 'Idempotency-Key' header
+        """
+        key = request.META.get(IDEMPOTENCY_HEADER)
+        if not key or request.method not in UNSAFE_METHODS or not user.is_authenticated:
+            return None
+        return cls(user.id, key, get_fingerprint(request))
+
+    def acquire(self):
+        """
+        Waits till other request with same key finishes, for settings.IDEMPOTENCY_LOCK_TIMEOUT seconds.
+        Lock expires after settings.IDEMPOTENCY_LOCK_TTL seconds in case request never releases it.
+        :return: True if lock is acquired
+        """
+        cache = get_cache()
+        token = secrets.token_hex(16)
+        deadline = time.monotonic() + settings.IDEMPOTENCY_LOCK_TIMEOUT
+        while not cache.add(self.lock_key, token, timeout=settings.IDEMPOTENCY_LOCK_TTL):
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(LOCK_POLL_INTERVAL)
+        self.lock_token = token
+        return True
+
+    def release(self):
+        """
+        Deletes lock only if it is still held by this request, not if it expired and was taken by another one.
+        """
+        if self.lock_token is None:
+            return
+        cache = get_cache()
+        if cache.get(self.lock_key) == self.lock_token:
+            cache.delete(self.lock_key)
+        self.lock_token = None
+
+    def get_stored_response(self):
+        """
+        :return: HttpResponse stored for key, or None if there is no response stored
+        :raise IdempotencyKeyReused: if stored response is of request with different method, url or body
+        """
+        stored = get_cache().get(self.response_key)
+        if stored is None:
+            return None
+        if stored['fingerprint'] != self.fingerprint:
+            raise IdempotencyKeyReused(KEY_REUSED_MESSAGE)
+
+        response = HttpResponse(stored['content'], status=stored['status'], content_type=stored['content_type'])
+        for name, value in stored.get('headers', {}).items():
+            response[name] = value
+        response[REPLAYED_HEADER] = 'true'
+        return response
+
+    def store(self, response):
+        """
+        Stores rendered response for key, except streaming and server error responses which can be retried.
+        :param response: HttpResponse
+        """
+        if response.streaming or response.status_code >= 500:
+            return
+        get_cache().set(self.response_key, {
+            'fingerprint': self.fingerprint,
+            'status': response.status_code,
+            'content': response.content,
+            'content_type': response.get('Content-Type'),
+            'headers': {name: response[name] for name in STORED_HEADERS if response.has_header(name)},
+        }, timeout=settings.IDEMPOTENCY_KEY_TIMEOUT)
+
+
+class IdempotencyMixin:
+    """
+    Makes write requests of Django view idempotent by 'Idempotency-Key' header,
+    to be used after LoginRequiredForApiMixin.
+    """
+    def dispatch(self, request, *args, **kwargs):
+        idempotent = IdempotentRequest.from_request(request, request.user)
+        if idempotent is None:
+            return super(IdempotencyMixin, self).dispatch(request, *args, **kwargs)
+
+        if not idempotent.acquire():
+            return JsonResponse({'error': IN_PROGRESS_MESSAGE}, status=409)
+        try:
+            response = idempotent.get_stored_response()
+            if response is None:
+                response = super(IdempotencyMixin, self).dispatch(request, *args, **kwargs)
+                idempotent.store(response)
+            return response
+        except IdempotencyKeyReused as e:
+            return JsonResponse({'error': str(e)}, status=422)
+        finally:
+            idempotent.release()
+
+
+class IdempotentAPIMixin:
+    """
+    Makes write requests of DRF view idempotent by 'Idempotency-Key' header.
+    Key is checked after authentication, so it is scoped to user authenticated by DRF.
+    """
+    idempotent_request = None
+    # response is stored for key only if view made it, not if key was rejected
+    store_idempotent_response = True
+
+    def initial(self, request, *args, **kwargs):
+        super(IdempotentAPIMixin, self).initial(request, *args, **kwargs)
+        idempotent = IdempotentRequest.from_request(request, request.user)
+        if idempotent is None:
+            return
+        if not idempotent.acquire():
+            raise IdempotencyInProgress()
+        self.idempotent_request = idempotent
+
+        try:
+            response = idempotent.get_stored_response()
+        except IdempotencyKeyReused:
+            self.store_idempotent_response = False
+            raise IdempotencyKeyReusedError()
+        if response is not None:
+            raise IdempotentReplay(response)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, IdempotentReplay):
+            return exc.response
+        return super(IdempotentAPIMixin, self).handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super(IdempotentAPIMixin, self).finalize_response(request, response, *args, **kwargs)
+        idempotent = self.idempotent_request
+        if idempotent is not None:
+            try:
+                if self.store_idempotent_response and not response.has_header(REPLAYED_HEADER):
+                    if hasattr(response, 'render'):
+                        response.render()
+                    idempotent.store(response)
+            finally:
+                idempotent.release()
+        return response
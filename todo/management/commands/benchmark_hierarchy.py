@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand
+
+from accounts.models import User
+from todo.benchmark import BENCHMARK_EMAIL, seed_task_tree, delete_benchmark_data, time_call
+from todo.models import Task, TaskClosure
+from todo.services import move_task, update_task
+
+
+class Command(BaseCommand):
+    help = (
+        'Seeds one deep task tree and prints timings and number of queries of subtree fetch, '
+        'ancestor fetch, move-subtree and cascade-complete, which should not depend on size of tree.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--nodes', type=int, default=100000, help='tasks in tree')
+        parser.add_argument('--fanout', type=int, default=10, help='sub-tasks per task')
+        parser.add_argument('--runs', type=int, default=5, help='times each operation is run for timing')
+        parser.add_argument('--cleanup', action='store_true', help='delete seeded data and exit')
+
+    def report(self, name, milliseconds, queries, rows=None):
+        self.stdout.write(self.style.MIGRATE_HEADING(name))
+        rows = '' if rows is None else f'{rows} rows, '
+        self.stdout.write(f'{rows}{queries} queries, {milliseconds:.2f} ms average\n')
+
+    def handle(self, *args, **options):
+        if options['cleanup']:
+            delete_benchmark_data()
+            self.stdout.write(self.style.SUCCESS('Deleted benchmark data.'))
+            return
+
+        user, _ = User.objects.get_or_create(email=BENCHMARK_EMAIL.format('tree'))
+        todo, levels = seed_task_tree(user, nodes=options['nodes'], fanout=options['fanout'], stdout=self.stdout)
+        root_id, leaf_id = levels[0][0], levels[-1][-1]
+        runs = options['runs']
+
+        milliseconds, queries, subtree = time_call(lambda: TaskClosure.get_subtree(root_id), runs=runs)
+        self.report(f'subtree of main task ({len(levels)} levels)', milliseconds, queries, len(subtree))
+
+        milliseconds, queries, ancestors = time_call(lambda: TaskClosure.get_ancestors(leaf_id), runs=runs)
+        self.report('ancestors of deepest task', milliseconds, queries, len(ancestors))
+
+        if len(levels) > 2:
+            # moves first sub-tree of level 1 back and forth between two tasks of level 1.
+            task = Task.objects.get(id=levels[1][0])
+            parents = [Task.objects.get(id=levels[1][-1]), Task.objects.get(id=root_id)]
+            moves = iter(parents * runs)
+            milliseconds, queries, _ = time_call(lambda: move_task(task, next(moves)), runs=runs * 2)
+            self.report('move sub-tree of level 1 task', milliseconds, queries)
+
+        def complete():
+            root = Task.objects.get(id=root_id)
+            root.is_completed = True
+            update_task(root, old_todo_id=root.todo_id, was_completed=False)
+            Task.objects.filter(todo=todo).update(is_completed=False)
+
+        milliseconds, queries, _ = time_call(complete, runs=runs)
+        self.report('complete main task with all descendants (includes reset)', milliseconds, queries)
@@ -0,0 +1,81 @@
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from todo.benchmark import seed_benchmark_data, delete_benchmark_data, time_queryset, explain_queryset
+from todo.models import Todo, Task
+
+
+class Command(BaseCommand):
+    help = (
+        'Seeds a large dataset and prints query plans and timings of the hot todo/task queries, with indexes '
+        'of Todo and Task models and without them. Indexes are dropped in a transaction which is rolled back, '
+        'so the schema is not changed.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--todos', type=int, default=20, help='todos per user')
+        parser.add_argument('--tasks', type=int, default=500, help='tasks per todo')
+        parser.add_argument('--runs', type=int, default=5, help='times each query is run for timing')
+        parser.add_argument('--cleanup', action='store_true', help='delete seeded data and exit')
+
+    def get_queries(self, user):
+        todo_ids = list(Todo.objects.filter(owner=user).values_list('id', flat=True)[:50])
+        return {
+            'todo page (owner_id, id)': Todo.objects.filter(owner=user).order_by('owner_id', 'id')[:51],
+            'main tasks of todos (todo_id, is_subtask, id)': Task.objects.filter(
+                todo_id__in=todo_ids, is_subtask=False
+            ).order_by('id'),
+            'tasks of owner (todo__owner)': Task.objects.filter(todo__owner=user),
+            'pending tasks due today (completion_date, is_completed)': Task.objects.filter(
+                completion_date=date.today(), is_completed=False
+            ),
+            'task list by completion and date range (todo, is_completed, completion_date)': Task.objects.filter(
+                todo__owner=user, todo__deleted_at__isnull=True, is_completed=False,
+                completion_date__gte=date.today(), completion_date__lte=date.today() + timedelta(days=7)
+            ).order_by('todo', 'position', 'id')[:51],
+            'task list by date (todo, completion_date, id)': Task.objects.filter(
+                todo__owner=user, todo__deleted_at__isnull=True
+            ).order_by('completion_date', 'id')[:51],
+        }
+
+    def handle(self, *args, **options):
+        if options['cleanup']:
+            delete_benchmark_data()
+            self.stdout.write(self.style.SUCCESS('Deleted benchmark data.'))
+            return
+
+        users = seed_benchmark_data(
+            users=options['users'],
+            todos=options['todos'],
+            tasks=options['tasks'],
+            stdout=self.stdout,
+        )
+
+        self.measure('with indexes', users[-1], options)
+        with self.without_indexes(Todo, Task):
+            self.measure('without indexes', users[-1], options)
+
+    @contextmanager
+    def without_indexes(self, *models):
+        # schema editor is only used to make SQL, as SQLite does not allow it inside transaction.
+        editor = connection.SchemaEditorClass(connection)
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                for model in models:
+                    for index in model._meta.indexes:
+                        cursor.execute(str(index.remove_sql(model, editor)))
+            try:
+                yield
+            finally:
+                transaction.set_rollback(True)
+
+    def measure(self, label, user, options):
+        for name, queryset in self.get_queries(user).items():
+            milliseconds, rows = time_queryset(queryset, runs=options['runs'])
+            self.stdout.write(self.style.MIGRATE_HEADING(f'{name}, {label}'))
+            self.stdout.write(explain_queryset(queryset))
+            self.stdout.write(f'{rows} rows, {milliseconds:.2f} ms average of {options["runs"]} runs\n')
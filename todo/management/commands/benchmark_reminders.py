@@ -0,0 +1,91 @@
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from zoneinfo import available_timezones
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from accounts.models import User
+from todo.benchmark import seed_benchmark_data, delete_benchmark_data, time_call
+from todo.reminders import send_hourly_reminder_digests, send_reminder_digests
+
+
+class Command(BaseCommand):
+    help = (
+        'Seeds a large dataset and runs reminder scan of today without enqueueing mails, printing number of '
+        'users, due tasks, queries and mail batches. Queries grow with chunks and batches with users, '
+        'not with due tasks.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--todos', type=int, default=20, help='todos per user')
+        parser.add_argument('--tasks', type=int, default=500, help='tasks per todo')
+        parser.add_argument('--chunk-size', type=int, default=None, help='due tasks fetched at once')
+        parser.add_argument('--batch-size', type=int, default=None, help='mails per outbox insert')
+        parser.add_argument(
+            '--hourly', action='store_true',
+            help='spread seeded users over time zones and run 24 hourly shards of today instead of one scan'
+        )
+        parser.add_argument('--cleanup', action='store_true', help='delete seeded data and exit')
+
+    def handle(self, *args, **options):
+        if options['cleanup']:
+            delete_benchmark_data()
+            self.stdout.write(self.style.SUCCESS('Deleted benchmark data.'))
+            return
+
+        users = seed_benchmark_data(
+            users=options['users'],
+            todos=options['todos'],
+            tasks=options['tasks'],
+            stdout=self.stdout,
+        )
+
+        def count_batches(mails, batch_size=None):
+            # batches mails like accounts.utils.send_mails(), counting batches instead of writing them.
+            batch_size = batch_size or settings.MAIL_BATCH_SIZE
+            count = sum(1 for _ in mails)
+            return -(-count // batch_size)
+
+        if options['hourly']:
+            self.run_hourly(users, count_batches, options)
+            return
+
+        milliseconds, queries, stats = time_call(lambda: send_reminder_digests(
+            day=date.today(),
+            chunk_size=options['chunk_size'],
+            batch_size=options['batch_size'],
+            send=count_batches,
+        ), runs=1)
+        self.stdout.write(self.style.MIGRATE_HEADING('reminder scan'))
+        self.stdout.write(
+            f'{stats["users"]} users, {stats["tasks"]} due tasks, {queries} queries, '
+            f'{stats["batches"]} mail batches, {milliseconds:.2f} ms'
+        )
+        self.stdout.write(
+            f'one mail per task without select_related would take {stats["tasks"] * 2 + 1} queries '
+            f'and {stats["tasks"]} mails written one by one'
+        )
+
+    def run_hourly(self, users, send, options):
+        zones = sorted(available_timezones())
+        for i, user in enumerate(users):
+            User.objects.filter(id=user.id).update(timezone=zones[i * len(zones) // len(users)])
+
+        midnight = datetime.combine(date.today(), datetime.min.time(), tzinfo=dt_timezone.utc)
+        self.stdout.write(self.style.MIGRATE_HEADING('hourly reminder shards'))
+        tasks = []
+        for hour in range(24):
+            milliseconds, queries, stats = time_call(lambda: send_hourly_reminder_digests(
+                now=midnight + timedelta(hours=hour),
+                chunk_size=options['chunk_size'],
+                batch_size=options['batch_size'],
+                send=send,
+            ), runs=1)
+            tasks.append(stats['tasks'])
+            self.stdout.write(
+                f'{hour:02d}:00 UTC: {stats["timezones"]} time zones, {stats["users"]} users, '
+                f'{stats["tasks"]} due tasks, {queries} queries, {stats["batches"]} mail batches, '
+                f'{milliseconds:.2f} ms'
+            )
+        self.stdout.write(f'largest shard {max(tasks)} of {sum(tasks)} due tasks, {sum(tasks) / 24:.1f} per hour')
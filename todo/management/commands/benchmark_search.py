@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from todo.benchmark import seed_benchmark_data, delete_benchmark_data, time_queryset, explain_queryset
+from todo.search import search_tasks
+
+
+class Command(BaseCommand):
+    help = (
+        'Seeds a large dataset, 1M tasks by default, and prints query plans and timings of first page '
+        'of task search of one user for a few queries.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--todos', type=int, default=50, help='todos per user')
+        parser.add_argument('--tasks', type=int, default=1000, help='tasks per todo')
+        parser.add_argument('--runs', type=int, default=5, help='times each query is run for timing')
+        parser.add_argument(
+            '--query', action='append', dest='queries',
+            help='search query, can be given many times, a few common and rare words by default'
+        )
+        parser.add_argument('--cleanup', action='store_true', help='delete seeded data and exit')
+
+    def handle(self, *args, **options):
+        if options['cleanup']:
+            delete_benchmark_data()
+            self.stdout.write(self.style.SUCCESS('Deleted benchmark data.'))
+            return
+
+        users = seed_benchmark_data(
+            users=options['users'],
+            todos=options['todos'],
+            tasks=options['tasks'],
+            stdout=self.stdout,
+        )
+
+        for query in options['queries'] or ['milk', 'plumber invoice', 'deploy release backup', 'todo 1']:
+            queryset = search_tasks(users[-1], query)[:settings.TODO_PAGE_SIZE + 1]
+            milliseconds, rows = time_queryset(queryset, runs=options['runs'])
+            self.stdout.write(self.style.MIGRATE_HEADING(f'search "{query}"'))
+            self.stdout.write(explain_queryset(queryset))
+            self.stdout.write(f'{rows} rows, {milliseconds:.2f} ms average of {options["runs"]} runs\n')
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import User
+from todo.export import iter_export, EXPORT_FORMATS, NDJSON
+
+
+class Command(BaseCommand):
+    help = 'Exports all todos, tasks and sub-tasks of a user as NDJSON or JSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('email', help='email of the user to export')
+        parser.add_argument('--format', choices=list(EXPORT_FORMATS), default=NDJSON)
+        parser.add_argument('--output', help='file path to write, default is stdout')
+        parser.add_argument('--chunk-size', type=int, help='number of rows fetched from database at once')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(email=options['email'])
+        except User.DoesNotExist:
+            raise CommandError(f'User with email "{options["email"]}" does not exist.')
+
+        chunks = iter_export(user, export_format=options['format'], chunk_size=options['chunk_size'])
+        if not options['output']:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+
+        with open(options['output'], 'w') as f:
+            for chunk in chunks:
+                f.write(chunk)
+        self.stderr.write(self.style.SUCCESS(f'Exported todos of {user.email} to {options["output"]}.'))
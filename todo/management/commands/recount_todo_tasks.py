@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from todo.models import Todo
+
+
+class Command(BaseCommand):
+    help = 'Recomputes task_count, completed_count and subtask_count of todos from their tasks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('todo_ids', nargs='*', type=int, help='ids of todos, all todos if not given')
+
+    def handle(self, *args, **options):
+        updated = Todo.recount(todo_ids=options['todo_ids'] or None)
+        self.stdout.write(self.style.SUCCESS(f'Recounted tasks of {updated} todos.'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from todo.cache import get_tree_cache_stats
+
+
+class Command(BaseCommand):
+    help = 'Prints hit and miss counters of the todo tree cache.'
+
+    def handle(self, *args, **options):
+        stats = get_tree_cache_stats()
+        total = stats['hits'] + stats['misses']
+        hit_ratio = stats['hits'] / total if total else 0
+        self.stdout.write(f'hits: {stats["hits"]}')
+        self.stdout.write(f'misses: {stats["misses"]}')
+        self.stdout.write(f'hit ratio: {hit_ratio:.2%}')
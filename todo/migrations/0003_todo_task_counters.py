@@ -0,0 +1,46 @@
+# Generated by Django 4.0 on 2026-10-18 13:53
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_tasks(apps, schema_editor):
+    Todo = apps.get_model('todo', 'Todo')
+    Task = apps.get_model('todo', 'Task')
+    tasks = Task.objects.filter(todo=OuterRef('pk')).order_by().values('todo')
+
+    def count(**filters):
+        return Coalesce(Subquery(tasks.filter(**filters).annotate(count=Count('id')).values('count')), 0)
+
+    Todo.objects.update(
+        task_count=count(),
+        completed_count=count(is_completed=True),
+        subtask_count=count(is_subtask=True),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todo', '0002_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='todo',
+            name='completed_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='todo',
+            name='subtask_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='todo',
+            name='task_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_tasks, migrations.RunPython.noop),
+    ]
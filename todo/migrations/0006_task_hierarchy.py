@@ -0,0 +1,48 @@
+# Generated by Django 4.0 on 2026-10-18 14:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+BATCH_SIZE = 5000
+
+
+def link_sub_tasks(apps, schema_editor):
+    # sub-tasks could not have sub-tasks before, so each link is a row of depth 1.
+    SubTask = apps.get_model('todo', 'SubTask')
+    TaskClosure = apps.get_model('todo', 'TaskClosure')
+    links = SubTask.objects.order_by('id').values_list('task_id', 'sub_task_id')
+    batch = []
+    for task_id, sub_task_id in links.iterator(chunk_size=BATCH_SIZE):
+        batch.append(TaskClosure(ancestor_id=task_id, descendant_id=sub_task_id, depth=1))
+        if len(batch) == BATCH_SIZE:
+            TaskClosure.objects.bulk_create(batch)
+            batch = []
+    TaskClosure.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todo', '0005_versions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField()),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_links', to='todo.task')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_links', to='todo.task')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='taskclosure',
+            index=models.Index(fields=['descendant', 'depth'], name='task_closure_ancestors_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='taskclosure',
+            constraint=models.UniqueConstraint(fields=('ancestor', 'descendant'), name='task_closure_unique'),
+        ),
+        migrations.RunPython(link_sub_tasks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 4.0 on 2026-10-18 14:20
+
+from django.db import migrations, models
+
+BATCH_SIZE = 5000
+DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+
+
+def get_position(number, width):
+    digits = ''
+    for _ in range(width):
+        number, digit = divmod(number, len(DIGITS))
+        digits = DIGITS[digit] + digits
+    return digits.rstrip('0')
+
+
+def set_positions(apps, schema_editor):
+    # tasks keep their order by id, with positions evenly spread in each todo, see todo.positions.
+    Task = apps.get_model('todo', 'Task')
+    counts = dict(Task.objects.values('todo_id').annotate(count=models.Count('id')).values_list('todo_id', 'count'))
+    tasks = Task.objects.order_by('todo_id', 'id').only('id', 'todo_id')
+    batch, todo_id, index = [], None, 0
+    for task in tasks.iterator(chunk_size=BATCH_SIZE):
+        if task.todo_id != todo_id:
+            todo_id, index = task.todo_id, 0
+            width = 1
+            while len(DIGITS) ** width <= counts[todo_id]:
+                width += 1
+            step = len(DIGITS) ** width // (counts[todo_id] + 1)
+        index += 1
+        task.position = get_position(step * index, width)
+        batch.append(task)
+        if len(batch) == BATCH_SIZE:
+            Task.objects.bulk_update(batch, ['position'])
+            batch = []
+    Task.objects.bulk_update(batch, ['position'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todo', '0006_task_hierarchy'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='position',
+            field=models.CharField(default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(set_positions, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['todo', 'position'], name='task_todo_position_idx'),
+        ),
+    ]
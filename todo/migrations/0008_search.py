@@ -0,0 +1,90 @@
+from django.db import migrations
+
+# generated tsvector columns with GIN indexes, see todo.search
+POSTGRESQL_FORWARD = [
+    """
+    ALTER TABLE "todo_task" ADD COLUMN "search_vector" tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce("content", '')), 'A') ||
+        setweight(to_tsvector('english', coalesce("details", '')), 'B')
+    ) STORED
+    """,
+    'CREATE INDEX "task_search_idx" ON "todo_task" USING GIN ("search_vector")',
+    """
+    ALTER TABLE "todo_todo" ADD COLUMN "search_vector" tsvector GENERATED ALWAYS AS (
+        to_tsvector('english', coalesce("title", ''))
+    ) STORED
+    """,
+    'CREATE INDEX "todo_search_idx" ON "todo_todo" USING GIN ("search_vector")',
+]
+POSTGRESQL_BACKWARD = [
+    'ALTER TABLE "todo_task" DROP COLUMN "search_vector"',
+    'ALTER TABLE "todo_todo" DROP COLUMN "search_vector"',
+]
+
+# FTS5 table of tasks with title of their todo, kept in sync by triggers, rowid being id of task.
+# migrations which remake 'todo_task' or 'todo_todo' table on SQLite drop these triggers, so they must create them again.
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE "todo_task_fts" USING fts5(content, details, title, tokenize = 'porter unicode61')
+    """,
+    """
+    INSERT INTO "todo_task_fts" (rowid, content, details, title)
+    SELECT "todo_task"."id", "todo_task"."content", coalesce("todo_task"."details", ''), "todo_todo"."title"
+    FROM "todo_task" INNER JOIN "todo_todo" ON "todo_todo"."id" = "todo_task"."todo_id"
+    """,
+    """
+    CREATE TRIGGER "todo_task_fts_insert" AFTER INSERT ON "todo_task" BEGIN
+        INSERT INTO "todo_task_fts" (rowid, content, details, title)
+        SELECT new."id", new."content", coalesce(new."details", ''), "title" FROM "todo_todo" WHERE "id" = new."todo_id";
+    END
+    """,
+    """
+    CREATE TRIGGER "todo_task_fts_update" AFTER UPDATE OF "content", "details", "todo_id" ON "todo_task" BEGIN
+        DELETE FROM "todo_task_fts" WHERE rowid = old."id";
+        INSERT INTO "todo_task_fts" (rowid, content, details, title)
+        SELECT new."id", new."content", coalesce(new."details", ''), "title" FROM "todo_todo" WHERE "id" = new."todo_id";
+    END
+    """,
+    """
+    CREATE TRIGGER "todo_task_fts_delete" AFTER DELETE ON "todo_task" BEGIN
+        DELETE FROM "todo_task_fts" WHERE rowid = old."id";
+    END
+    """,
+    """
+    CREATE TRIGGER "todo_todo_fts_update" AFTER UPDATE OF "title" ON "todo_todo" BEGIN
+        UPDATE "todo_task_fts" SET title = new."title"
+        WHERE rowid IN (SELECT "id" FROM "todo_task" WHERE "todo_id" = new."id");
+    END
+    """,
+]
+SQLITE_BACKWARD = [
+    'DROP TRIGGER "todo_todo_fts_update"',
+    'DROP TRIGGER "todo_task_fts_delete"',
+    'DROP TRIGGER "todo_task_fts_update"',
+    'DROP TRIGGER "todo_task_fts_insert"',
+    'DROP TABLE "todo_task_fts"',
+]
+
+SQL = {
+    'postgresql': (POSTGRESQL_FORWARD, POSTGRESQL_BACKWARD),
+    'sqlite': (SQLITE_FORWARD, SQLITE_BACKWARD),
+}
+
+
+def run_sql(statements):
+    def run(apps, schema_editor):
+        # other databases are searched without index.
+        for statement in SQL.get(schema_editor.connection.vendor, ([], []))[statements]:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todo', '0007_task_position'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_sql(0), run_sql(1)),
+    ]
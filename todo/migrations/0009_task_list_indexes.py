@@ -0,0 +1,21 @@
+# Generated by Django 4.0 on 2026-10-18 14:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todo', '0008_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['todo', 'is_completed', 'completion_date'], name='task_todo_completed_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['todo', 'completion_date', 'id'], name='task_todo_date_idx'),
+        ),
+    ]
@@ -1,12 +1,103 @@
-from django.db import models
+from django.db import DatabaseError, connection, models, router, transaction
+from django.db.models import Count, F, OuterRef, Subquery, signals
+from django.db.models.functions import Coalesce
 from django.shortcuts import get_object_or_404
 
 from accounts.models import User
 
 
-class Todo(models.Model):
+class AliveManager(models.Manager):
+    """
+    Default manager excluding soft deleted rows, which stay in trash till they are purged.
+    """
+    def get_queryset(self):
+        return super(AliveManager, self).get_queryset().filter(deleted_at__isnull=True)
+
+
+class VersionConflict(DatabaseError):
+    """
+    Raised when row is changed by another request since instance was loaded.
+    """
+    pass
+
+
+class VersionedModel(models.Model):
+    """
+    Optimistic concurrency control. save() of existing row updates it only if its 'version' is still
+    same as of instance, with one conditional UPDATE query, and increments the version.
+    """
+    version = models.PositiveIntegerField(default=1, editable=False)
+
+    class Meta:
+        abstract = True
+
+    def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
+        """
+        Updates existing row with one UPDATE query filtered by version of instance, and sends same
+        pre_save and post_save signals as Model.save(). New rows are inserted by Model.save().
+        :raise VersionConflict: if row is changed since instance was loaded
+        """
+        using = using or router.db_for_write(type(self), instance=self)
+        if self._state.adding or force_insert:
+            return super(VersionedModel, self).save(
+                force_insert=force_insert, force_update=force_update, using=using, update_fields=update_fields
+            )
+
+        deferred = self.get_deferred_fields()
+        fields = [field for field in self._meta.local_concrete_fields if not field.primary_key]
+        if update_fields is not None:
+            update_fields = frozenset(update_fields) | {'version'}
+            fields = [field for field in fields if field.name in update_fields or field.attname in update_fields]
+        elif deferred:
+            # as Model.save(), only loaded fields of instance with deferred fields are saved.
+            fields = [field for field in fields if field.attname not in deferred]
+            update_fields = frozenset(field.name for field in fields)
+
+        expected = self.version
+        rows = type(self)._base_manager.using(using).filter(pk=self.pk)
+        signals.pre_save.send(sender=type(self), instance=self, raw=False, using=using, update_fields=update_fields)
+        values = {field.attname: field.pre_save(self, False) for field in fields}
+        values['version'] = expected + 1
+        if not rows.filter(version=expected).update(**values):
+            if force_update or rows.exists():
+                raise VersionConflict(f'{self._meta.object_name} {self.pk} is changed since version {expected}.')
+            # row is deleted for good, so it is inserted again as Model.save() does.
+            return super(VersionedModel, self).save(using=using, update_fields=update_fields)
+        self.version = expected + 1
+        self._state.db = using
+        signals.post_save.send(
+            sender=type(self), instance=self, created=False, update_fields=update_fields, raw=False, using=using
+        )
+
+
+class Todo(VersionedModel):
     title = models.CharField(max_length=100)
     owner = models.ForeignKey(User, on_delete=models.CASCADE)
+    # set when todo is moved to trash, see todo.trash
+    deleted_at = models.DateTimeField(null=True, editable=False)
+    # denormalized counts of tasks, maintained by Task.save() and Task.delete()
+    task_count = models.IntegerField(default=0, editable=False)
+    completed_count = models.IntegerField(default=0, editable=False)
+    subtask_count = models.IntegerField(default=0, editable=False)
+
+    objects = AliveManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        indexes = [
+            # keyset pagination of user's todos
+            models.Index(
+                fields=['owner', 'id'],
+                condition=models.Q(deleted_at__isnull=True),
+                name='todo_owner_id_idx'
+            ),
+            # trash of user and purging of expired todos
+            models.Index(
+                fields=['owner', 'deleted_at'],
+                condition=models.Q(deleted_at__isnull=False),
+                name='todo_trash_idx'
+            ),
+        ]
 
     def __str__(self):
         data = {
@@ -22,35 +113,157 @@ class Todo(models.Model):
             'id': self.id,
             'title': self.title,
             'owner': self.owner.email,
+            'task_count': self.task_count,
+            'completed_count': self.completed_count,
+            'subtask_count': self.subtask_count,
+            'version': self.version,
         }
 
     def get_tasks_as_list(self):
-        return list(self.tasks.order_by('id').values(
+        return list(self.tasks.order_by('position', 'id').values(
                 'id', 'content', 'details', 'is_completed', 'is_subtask', 'completion_date'
             ))
 
     @classmethod
     def queryset_to_list_of_dict(cls, queryset):
-        todos = []
-        for todo in queryset:
-            data = todo.to_dict()
-            data['tasks'] = Task.queryset_to_list_of_dict(queryset=todo.tasks.order_by('id'))
-            todos.append(data)
-        return todos
+        """
+        Builds todo -> tasks tree in fixed number of queries (todos, tasks, sub-task links),
+        independent of how many todos or tasks are there.
+        :param queryset: Todo queryset or already fetched list of todos
+        :return: list of todo dict with 'tasks'
+        """
+        if isinstance(queryset, models.QuerySet):
+            queryset = queryset.select_related('owner')
+        todos = list(queryset)
+        tasks = Task.queryset_to_list_of_dict(
+            queryset=Task.objects.filter(todo_id__in=[todo.id for todo in todos]).order_by('todo_id', 'position', 'id')
+        )
+
+        tasks_by_todo = {}
+        for task in tasks:
+            tasks_by_todo.setdefault(task['todo'], []).append(task)
+
+        data = []
+        for todo in todos:
+            todo_dict = todo.to_dict()
+            todo_dict['tasks'] = tasks_by_todo.get(todo.id, [])
+            data.append(todo_dict)
+        return data
+
+    @classmethod
+    def update_counters(cls, todo_id, tasks=0, completed=0, sub_tasks=0):
+        """
+        Adds given numbers to task counters of todo with one UPDATE using F() expressions.
+        :param todo_id: integer 'id' of todo
+        :param tasks: change in task_count
+        :param completed: change in completed_count
+        :param sub_tasks: change in subtask_count
+        """
+        deltas = {'task_count': tasks, 'completed_count': completed, 'subtask_count': sub_tasks}
+        changes = {field: F(field) + delta for field, delta in deltas.items() if delta}
+        if changes:
+            cls.objects.filter(id=todo_id).update(**changes)
+
+    @classmethod
+    def apply_task_state_change(cls, old_state, new_state):
+        """
+        Updates counters of todos for task changed from old_state to new_state.
+        :param old_state: tuple (todo_id, is_completed, is_subtask) or None for created task
+        :param new_state: tuple (todo_id, is_completed, is_subtask) or None for deleted task
+        """
+        deltas = {}
+        for state, sign in ((old_state, -1), (new_state, 1)):
+            if state is None:
+                continue
+            todo_id, is_completed, is_subtask = state
+            delta = deltas.setdefault(todo_id, [0, 0, 0])
+            delta[0] += sign
+            delta[1] += sign * int(is_completed)
+            delta[2] += sign * int(is_subtask)
+        for todo_id, (tasks, completed, sub_tasks) in deltas.items():
+            cls.update_counters(todo_id, tasks=tasks, completed=completed, sub_tasks=sub_tasks)
+
+    @classmethod
+    def recount(cls, todo_ids=None):
+        """
+        Recomputes task counters from tasks with a single UPDATE query.
+        :param todo_ids: list of todo ids, all todos if None
+        :return: number of todos updated
+        """
+        tasks = Task.objects.filter(todo=OuterRef('pk')).order_by().values('todo')
+
+        def count(**filters):
+            return Coalesce(Subquery(tasks.filter(**filters).annotate(count=Count('id')).values('count')), 0)
+
+        queryset = cls.objects.all() if todo_ids is None else cls.objects.filter(id__in=todo_ids)
+        return queryset.update(
+            task_count=count(),
+            completed_count=count(is_completed=True),
+            subtask_count=count(is_subtask=True),
+        )
 
     @classmethod
     def delete_todo(cls, todo_id=None):
+        """
+        Moves todo to trash, see todo.trash.
+        :param todo_id: integer 'id' of todo
+        """
+        from .trash import trash_todo
+
         todo = get_object_or_404(cls, id=int(todo_id))
-        todo.delete()
+        trash_todo(todo)
 
 
-class Task(models.Model):
+class Task(VersionedModel):
     content = models.CharField(max_length=500)
     details = models.TextField(null=True)
     is_completed = models.BooleanField(default=False)
     is_subtask = models.BooleanField(default=False)
     completion_date = models.DateField(null=True)
     todo = models.ForeignKey(Todo, related_name='tasks', on_delete=models.CASCADE)
+    # order of task in its todo, compared as string, see todo.positions
+    position = models.CharField(max_length=255, default='', editable=False)
+    # set when task is moved to trash, see todo.trash
+    deleted_at = models.DateTimeField(null=True, editable=False)
+
+    objects = AliveManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        indexes = [
+            # main tasks of todos, ordered by id
+            models.Index(
+                fields=['todo', 'is_subtask', 'id'],
+                condition=models.Q(deleted_at__isnull=True),
+                name='task_todo_subtask_id_idx'
+            ),
+            # pending tasks due on a date, for reminder mails
+            models.Index(
+                fields=['completion_date'],
+                condition=models.Q(is_completed=False, deleted_at__isnull=True),
+                name='task_due_pending_idx'
+            ),
+            # trash of todos and purging of expired tasks
+            models.Index(
+                fields=['todo', 'deleted_at'],
+                condition=models.Q(deleted_at__isnull=False),
+                name='task_trash_idx'
+            ),
+            # tasks of todo in manual order, and neighbours of task while reordering
+            models.Index(fields=['todo', 'position'], name='task_todo_position_idx'),
+            # task list filtered by completion and completion date range
+            models.Index(
+                fields=['todo', 'is_completed', 'completion_date'],
+                condition=models.Q(deleted_at__isnull=True),
+                name='task_todo_completed_date_idx'
+            ),
+            # task list filtered or ordered by completion date
+            models.Index(
+                fields=['todo', 'completion_date', 'id'],
+                condition=models.Q(deleted_at__isnull=True),
+                name='task_todo_date_idx'
+            ),
+        ]
 
     def __str__(self):
         data = {
@@ -59,7 +272,61 @@ class Task(models.Model):
         }
         return " | ".join([k + ": " + str(v) for k, v in data.items()])
 
-    def to_dict(self):
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(Task, cls).from_db(db, field_names, values)
+        instance._counted_state = instance.get_counted_state()
+        return instance
+
+    def get_counted_state(self):
+        """
+        :return: tuple (todo_id, is_completed, is_subtask) used for counters of todo,
+        or None if any of them is not loaded.
+        """
+        state = tuple(self.__dict__.get(field) for field in ('todo_id', 'is_completed', 'is_subtask'))
+        return None if None in state else state
+
+    def save(self, *args, **kwargs):
+        """
+        Saves task and updates task counters of its todo in same transaction.
+        New task is placed after last task of its todo.
+        """
+        with transaction.atomic():
+            is_adding = self._state.adding
+            if is_adding and not self.position:
+                from .positions import set_new_positions
+
+                set_new_positions([self])
+            old_state = getattr(self, '_counted_state', None)
+            super(Task, self).save(*args, **kwargs)
+            new_state = self.get_counted_state()
+
+            if new_state is not None and (is_adding or old_state is not None):
+                Todo.apply_task_state_change(None if is_adding else old_state, new_state)
+            else:
+                # state before or after save is not known, so counting todos again.
+                todo_ids = {self.todo_id} | ({old_state[0]} if old_state else set())
+                Todo.recount(todo_ids=list(todo_ids))
+            self._counted_state = new_state
+
+    def delete(self, *args, **kwargs):
+        """
+        Deletes task and updates task counters of its todo in same transaction.
+        Its sub-tasks are detached from ancestors of task in hierarchy.
+        """
+        with transaction.atomic():
+            state = getattr(self, '_counted_state', None) or self.get_counted_state()
+            TaskClosure.detach([self.id])
+            result = super(Task, self).delete(*args, **kwargs)
+            Todo.apply_task_state_change(state, None)
+            return result
+
+    def to_dict(self, parent_id=None, sub_task_ids=None):
+        """
+        :param parent_id: already fetched parent task id, to skip query for sub-task
+        :param sub_task_ids: already fetched sub-task ids, to skip query for sub-tasks of task
+        Sub-task has 'sub-tasks' only if it has sub-tasks of its own, main task always has it.
+        """
         data = {
             'id': self.id,
             'content': self.content,
@@ -67,21 +334,38 @@ class Task(models.Model):
             'is_completed': self.is_completed,
             'is_subtask': self.is_subtask,
             'completion_date': self.completion_date,
-            'todo': self.todo.id,
+            'todo': self.todo_id,
+            'version': self.version,
         }
+        if sub_task_ids is None:
+            sub_task_ids = list(
+                self.sub_tasks.filter(sub_task__deleted_at__isnull=True).order_by('id').values_list(
+                    'sub_task_id', flat=True)
+            )
         if self.is_subtask:
-            data['parent'] = self.parent_task.task.id
-        else:
-            data['sub-tasks'] = list(self.sub_tasks.values_list('sub_task_id', flat=True))
+            data['parent'] = parent_id if parent_id is not None else self.parent_task.task_id
+        if not self.is_subtask or sub_task_ids:
+            data['sub-tasks'] = sub_task_ids
         return data
 
     @classmethod
     def queryset_to_list_of_dict(cls, queryset):
-        return [task.to_dict() for task in queryset]
+        """
+        Converts tasks to list of dict, fetching all sub-task links in one query.
+        :param queryset: Task queryset
+        :return: list of task dict
+        """
+        tasks = list(queryset)
+        parents, sub_tasks = SubTask.get_links(task_ids=[task.id for task in tasks])
+        return [
+            task.to_dict(parent_id=parents.get(task.id), sub_task_ids=sub_tasks.get(task.id, []))
+            for task in tasks
+        ]
 
     @classmethod
     def fill_data_from_instance(cls, data, instance_id=None):
-        instance = get_object_or_404(Task, id=instance_id)
+        # tasks of trashed todo are in trash along with it.
+        instance = get_object_or_404(Task, id=instance_id, todo__deleted_at__isnull=True)
 
         data_dict = data.copy()
         data_dict['content'] = data.get('content', instance.content)
@@ -98,11 +382,21 @@ class Task(models.Model):
 
     @classmethod
     def delete_task(cls, task_id=None):
-        task = get_object_or_404(cls, id=int(task_id))
-        task.delete()
+        """
+        Moves task to trash along with its sub-tasks, see todo.trash.
+        :param task_id: integer 'id' of task
+        """
+        from .trash import trash_task
+
+        task = get_object_or_404(cls, id=int(task_id), todo__deleted_at__isnull=True)
+        trash_task(task)
 
 
 class SubTask(models.Model):
+    """
+    Link of task to its parent task. Sub-task can have sub-tasks of its own, at any depth,
+    and TaskClosure has links of each task to all of its ancestors.
+    """
     task = models.ForeignKey(Task, related_name='sub_tasks', on_delete=models.CASCADE)
     sub_task = models.OneToOneField(Task, related_name='parent_task', on_delete=models.CASCADE)
 
@@ -114,6 +408,44 @@ class SubTask(models.Model):
         }
         return " | ".join([k + ": " + str(v) for k, v in data.items()])
 
+    @classmethod
+    def get_links(cls, task_ids):
+        """
+        Fetches parent and sub-tasks of given tasks in one query.
+        :param task_ids: list of task ids
+        :return: tuple (dict of sub-task id -> parent id, dict of task id -> list of sub-task ids)
+        """
+        parents, sub_tasks = {}, {}
+        if not task_ids:
+            return parents, sub_tasks
+
+        links = cls.objects.filter(
+            models.Q(task_id__in=task_ids) | models.Q(sub_task_id__in=task_ids),
+            sub_task__deleted_at__isnull=True
+        ).order_by('id').values_list('task_id', 'sub_task_id')
+        for task_id, sub_task_id in links:
+            parents[sub_task_id] = task_id
+            sub_tasks.setdefault(task_id, []).append(sub_task_id)
+        return parents, sub_tasks
+
+    def save(self, *args, **kwargs):
+        """
+        Saves link and adds sub-task along with its sub-tasks under task and its ancestors in TaskClosure.
+        """
+        with transaction.atomic():
+            is_adding = self._state.adding
+            super(SubTask, self).save(*args, **kwargs)
+            if is_adding:
+                TaskClosure.attach([(self.task_id, self.sub_task_id)])
+
+    def delete(self, *args, **kwargs):
+        """
+        Deletes link and detaches sub-task along with its sub-tasks from ancestors in TaskClosure.
+        """
+        with transaction.atomic():
+            TaskClosure.detach([self.sub_task_id])
+            return super(SubTask, self).delete(*args, **kwargs)
+
     def to_dict(self):
         data = {
             'id': self.id,
@@ -121,3 +453,118 @@ class SubTask(models.Model):
             'sub task': list(self.task.sub_tasks.values_list('sub_task_id', flat=True)),
         }
         return data
+
+
+class TaskClosure(models.Model):
+    """
+    Closure table of task hierarchy, a row for each task and each of its ancestors at any depth,
+    where depth 1 is its parent task. Subtree and ancestors of task are fetched, and subtree is moved
+    with fixed number of queries, independent of depth and size of subtree.
+    """
+    ancestor = models.ForeignKey(Task, related_name='descendant_links', on_delete=models.CASCADE)
+    descendant = models.ForeignKey(Task, related_name='ancestor_links', on_delete=models.CASCADE)
+    depth = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            # also used for subtree of task
+            models.UniqueConstraint(fields=['ancestor', 'descendant'], name='task_closure_unique'),
+        ]
+        indexes = [
+            # ancestors of task, ordered by depth
+            models.Index(fields=['descendant', 'depth'], name='task_closure_ancestors_idx'),
+        ]
+
+    @classmethod
+    def attach(cls, pairs):
+        """
+        Adds sub_task along with its descendants under task and its ancestors, for each pair, with one
+        INSERT query. Sub-tasks must not have parent task, and no task can be both parent and sub-task in pairs.
+        :param pairs: list of tuple (task_id, sub_task_id)
+        """
+        if not pairs:
+            return
+        table = connection.ops.quote_name(cls._meta.db_table)
+        values = ', '.join(['(%s, %s)'] * len(pairs))
+        sql = f"""
+            WITH pairs (parent_id, child_id) AS (VALUES {values}),
+            up (child_id, ancestor_id, depth) AS (
+                SELECT child_id, parent_id, 1 FROM pairs
+                UNION ALL
+                SELECT pairs.child_id, closure.ancestor_id, closure.depth + 1
+                FROM pairs JOIN {table} closure ON closure.descendant_id = pairs.parent_id
+            ),
+            down (child_id, descendant_id, depth) AS (
+                SELECT child_id, child_id, 0 FROM pairs
+                UNION ALL
+                SELECT pairs.child_id, closure.descendant_id, closure.depth
+                FROM pairs JOIN {table} closure ON closure.ancestor_id = pairs.child_id
+            )
+            INSERT INTO {table} (ancestor_id, descendant_id, depth)
+            SELECT up.ancestor_id, down.descendant_id, up.depth + down.depth
+            FROM up JOIN down ON up.child_id = down.child_id
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [task_id for pair in pairs for task_id in pair])
+
+    @classmethod
+    def detach(cls, task_ids):
+        """
+        Removes links of given tasks and their descendants to ancestors of given tasks, with one DELETE query.
+        Links inside subtrees are kept, so subtrees of given tasks must not overlap.
+        :param task_ids: list of task ids
+        """
+        from .deletion import raw_delete
+
+        descendant_ids = cls.objects.filter(ancestor_id__in=task_ids).values('descendant_id')
+        links = cls.objects.filter(
+            models.Q(descendant_id__in=task_ids) | models.Q(descendant_id__in=descendant_ids)
+        ).exclude(ancestor_id__in=task_ids).exclude(ancestor_id__in=descendant_ids)
+        raw_delete(links)
+
+    @classmethod
+    def get_subtree(cls, task_id):
+        """
+        Fetches all descendants of task in one query.
+        :param task_id: integer 'id' of task
+        :return: list of dict with 'depth' and 'parent' id, ordered by depth
+        """
+        links = cls.objects.filter(ancestor_id=task_id, descendant__deleted_at__isnull=True).order_by(
+            'depth', 'descendant_id'
+        ).values(
+            'depth',
+            'descendant_id',
+            'descendant__content',
+            'descendant__is_completed',
+            'descendant__parent_task__task_id',
+        )
+        return [
+            {
+                'id': link['descendant_id'],
+                'content': link['descendant__content'],
+                'is_completed': link['descendant__is_completed'],
+                'parent': link['descendant__parent_task__task_id'],
+                'depth': link['depth'],
+            }
+            for link in links
+        ]
+
+    @classmethod
+    def get_ancestors(cls, task_id):
+        """
+        Fetches all ancestors of task in one query.
+        :param task_id: integer 'id' of task
+        :return: list of dict with 'depth', from main task to parent task
+        """
+        links = cls.objects.filter(descendant_id=task_id).order_by('-depth').values(
+            'depth', 'ancestor_id', 'ancestor__content', 'ancestor__is_completed'
+        )
+        return [
+            {
+                'id': link['ancestor_id'],
+                'content': link['ancestor__content'],
+                'is_completed': link['ancestor__is_completed'],
+                'depth': link['depth'],
+            }
+            for link in links
+        ]
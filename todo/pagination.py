@@ -0,0 +1,282 @@
+import base64
+
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+CURSOR_QUERY_PARAM = 'cursor'
+PAGE_QUERY_PARAM = 'page'
+PAGE_SIZE_QUERY_PARAM = 'page_size'
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class InvalidPage(ValueError):
+    pass
+
+
+def encode_cursor(owner_id, todo_id):
+    """
+    Makes opaque cursor from position of last todo of page.
+    :param owner_id: integer 'owner_id' of todo
+    :param todo_id: integer 'id' of todo
+    :return: url safe string
+    """
+    position = f'{owner_id}:{todo_id}'.encode()
+    return base64.urlsafe_b64encode(position).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Reads position from cursor made by encode_cursor().
+    :param cursor: string
+    :return: tuple (owner_id, todo_id)
+    :raise: InvalidCursor if cursor is tampered or malformed.
+    """
+    try:
+        position = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        owner_id, todo_id = position.split(':')
+        return int(owner_id), int(todo_id)
+    except (TypeError, ValueError, UnicodeDecodeError):
+        raise InvalidCursor('Invalid cursor.')
+
+
+def encode_task_cursor(todo_id, position, task_id):
+    """
+    Makes opaque cursor from position of last task of page in (todo_id, position, id) order.
+    :param todo_id: integer 'todo_id' of task
+    :param position: 'position' of task, base 36 string without ':'
+    :param task_id: integer 'id' of task
+    :return: url safe string
+    """
+    key = f'{todo_id}:{position}:{task_id}'.encode()
+    return base64.urlsafe_b64encode(key).decode().rstrip('=')
+
+
+def decode_task_cursor(cursor):
+    """
+    Reads position from cursor made by encode_task_cursor().
+    :param cursor: string
+    :return: tuple (todo_id, position, task_id)
+    :raise: InvalidCursor if cursor is tampered or malformed.
+    """
+    try:
+        key = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        todo_id, position, task_id = key.split(':')
+        return int(todo_id), position, int(task_id)
+    except (TypeError, ValueError, UnicodeDecodeError):
+        raise InvalidCursor('Invalid cursor.')
+
+
+def get_page_size(value):
+    """
+    Page size from query parameter, limited to TODO_MAX_PAGE_SIZE.
+    :param value: string from query parameter or None
+    :return: integer
+    """
+    try:
+        page_size = int(value)
+    except (TypeError, ValueError):
+        return settings.TODO_PAGE_SIZE
+    if page_size <= 0:
+        return settings.TODO_PAGE_SIZE
+    return min(page_size, settings.TODO_MAX_PAGE_SIZE)
+
+
+def paginate_todos(queryset, cursor=None, page_size=None):
+    """
+    Keyset pagination of todos on (owner_id, id). Only todos of the page are fetched,
+    so cost of a page does not depend on number of todos before it.
+    :param queryset: Todo queryset
+    :param cursor: cursor of previous page or None for first page
+    :param page_size: integer
+    :return: tuple (list of todos, cursor for next page or None)
+    :raise: InvalidCursor if cursor is not valid.
+    """
+    page_size = page_size or settings.TODO_PAGE_SIZE
+    if cursor:
+        owner_id, todo_id = decode_cursor(cursor)
+        queryset = queryset.filter(Q(owner_id__gt=owner_id) | Q(owner_id=owner_id, id__gt=todo_id))
+
+    todos = list(queryset.order_by('owner_id', 'id')[:page_size + 1])
+    if len(todos) <= page_size:
+        return todos, None
+
+    todos = todos[:page_size]
+    return todos, encode_cursor(todos[-1].owner_id, todos[-1].id)
+
+
+def paginate_tasks(queryset, cursor=None, page_size=None):
+    """
+    Keyset pagination of tasks on (todo_id, position, id), the manual order of tasks of todos.
+    Only tasks of the page are fetched, so cost of a page does not depend on number of tasks before it.
+    :param queryset: Task queryset
+    :param cursor: cursor of previous page or None for first page
+    :param page_size: integer
+    :return: tuple (list of tasks, cursor for next page or None)
+    :raise: InvalidCursor if cursor is not valid.
+    """
+    page_size = page_size or settings.TODO_PAGE_SIZE
+    if cursor:
+        todo_id, position, task_id = decode_task_cursor(cursor)
+        queryset = queryset.filter(
+            Q(todo_id__gt=todo_id) | Q(todo_id=todo_id, position__gt=position) |
+            Q(todo_id=todo_id, position=position, id__gt=task_id)
+        )
+
+    tasks = list(queryset.order_by('todo_id', 'position', 'id')[:page_size + 1])
+    if len(tasks) <= page_size:
+        return tasks, None
+
+    tasks = tasks[:page_size]
+    return tasks, encode_task_cursor(tasks[-1].todo_id, tasks[-1].position, tasks[-1].id)
+
+
+def get_page_number(value):
+    """
+    :param value: string from query parameter or None
+    :return: integer, 1 for first page
+    :raise: InvalidPage if value is not a positive integer
+    """
+    if value is None:
+        return 1
+    try:
+        page = int(value)
+    except (TypeError, ValueError):
+        raise InvalidPage('Invalid page.')
+    if page <= 0:
+        raise InvalidPage('Invalid page.')
+    return page
+
+
+def paginate_by_offset(queryset, page=1, page_size=None):
+    """
+    Page of ordered queryset which cannot be paginated by keyset, like search results ordered by rank.
+    One more row than page size is fetched to know if there is next page, without counting all rows.
+    :param queryset: ordered queryset
+    :param page: integer, 1 for first page
+    :param page_size: integer
+    :return: tuple (list of rows, number of next page or None)
+    """
+    page_size = page_size or settings.TODO_PAGE_SIZE
+    offset = (page - 1) * page_size
+    rows = list(queryset[offset:offset + page_size + 1])
+    if len(rows) <= page_size:
+        return rows, None
+    return rows[:page_size], page + 1
+
+
+def get_next_page_link(request, next_page):
+    """
+    :param request: current request
+    :param next_page: page number returned by paginate_by_offset()
+    :return: absolute url of next page or None
+    """
+    if next_page is None:
+        return None
+    return replace_query_param(request.build_absolute_uri(), PAGE_QUERY_PARAM, next_page)
+
+
+def get_next_link(request, next_cursor):
+    """
+    :param request: current request
+    :param next_cursor: cursor returned by paginate_todos()
+    :return: absolute url of next page or None
+    """
+    if next_cursor is None:
+        return None
+    url = request.build_absolute_uri()
+    return replace_query_param(url, CURSOR_QUERY_PARAM, next_cursor)
+
+
+class TodoKeysetPagination(BasePagination):
+    """
+    DRF pagination class for todos using paginate_todos().
+    """
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        try:
+            todos, self.next_cursor = paginate_todos(
+                queryset,
+                cursor=request.query_params.get(CURSOR_QUERY_PARAM),
+                page_size=get_page_size(request.query_params.get(PAGE_SIZE_QUERY_PARAM)),
+            )
+        except InvalidCursor as e:
+            raise NotFound(str(e))
+        return todos
+
+    def get_next_link(self):
+        return get_next_link(self.request, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {
+                    'type': 'string',
+                    'nullable': True,
+                },
+                'results': schema,
+            },
+        }
+
+
+class OffsetPagination(TodoKeysetPagination):
+    """
+    DRF pagination class using paginate_by_offset(), with same response as TodoKeysetPagination.
+    """
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        try:
+            rows, self.next_page = paginate_by_offset(
+                queryset,
+                page=get_page_number(request.query_params.get(PAGE_QUERY_PARAM)),
+                page_size=get_page_size(request.query_params.get(PAGE_SIZE_QUERY_PARAM)),
+            )
+        except InvalidPage as e:
+            raise NotFound(str(e))
+        return rows
+
+    def get_next_link(self):
+        return get_next_page_link(self.request, self.next_page)
+
+
+class TaskPagination(OffsetPagination):
+    """
+    DRF pagination class for tasks using paginate_tasks() when tasks are in default (todo, position, id)
+    order, and paginate_by_offset() for other orderings, with same response as TodoKeysetPagination.
+    """
+    keyset_ordering = ('todo', 'position', 'id')
+    next_cursor = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if tuple(queryset.query.order_by) != self.keyset_ordering:
+            return super(TaskPagination, self).paginate_queryset(queryset, request, view=view)
+
+        self.request = request
+        try:
+            tasks, self.next_cursor = paginate_tasks(
+                queryset,
+                cursor=request.query_params.get(CURSOR_QUERY_PARAM),
+                page_size=get_page_size(request.query_params.get(PAGE_SIZE_QUERY_PARAM)),
+            )
+        except InvalidCursor as e:
+            raise NotFound(str(e))
+        self.next_page = None
+        return tasks
+
+    def get_next_link(self):
+        if self.next_cursor is not None:
+            return get_next_link(self.request, self.next_cursor)
+        return super(TaskPagination, self).get_next_link()
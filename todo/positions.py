@@ -0,0 +1,204 @@
+"""
+Manual ordering of tasks of todo with fractional indexing.
+'position' of task is a base 36 string compared lexicographically, and a new position can always be
+made between any two positions, so moving task updates only that task. New tasks are appended by
+incrementing last position of todo. Positions get longer as tasks are moved between the same neighbours
+or appended many times, so long positions of todo are made short again by rebalance_positions()
+in a celery task.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Max
+
+from .cache import invalidate_tree
+from .models import Todo, Task
+
+DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+# first position of empty todo, rebalanced positions are spread below it to leave room for appending.
+FIRST_POSITION = 'i'
+MAX_POSITION_LENGTH = Task._meta.get_field('position').max_length
+
+
+class ReorderError(ValueError):
+    pass
+
+
+def rank_between(before, after):
+    """
+    Position between two positions. Positions never end with '0', so that there is always
+    a position between any two of them.
+    :param before: position or None for first position
+    :param after: position greater than before, or None for last position
+    :return: position string
+    :raise ValueError: if after is not greater than before, as empty position of task which has never
+    been positioned
+    """
+    before = before or ''
+    if after is not None:
+        if before >= after:
+            raise ValueError(f'{before!r} is not less than {after!r}.')
+        # skip common prefix, 'before' being padded with '0'.
+        n = 0
+        while (before[n] if n < len(before) else '0') == after[n]:
+            n += 1
+        if n:
+            return after[:n] + rank_between(before[n:], after[n:])
+
+    digit_before = DIGITS.index(before[0]) if before else 0
+    digit_after = DIGITS.index(after[0]) if after else len(DIGITS)
+    if digit_after - digit_before > 1:
+        return DIGITS[(digit_before + digit_after) // 2]
+    if after and len(after) > 1:
+        return after[0]
+    return DIGITS[digit_before] + rank_between(before[1:], None)
+
+
+def rank_after(before):
+    """
+    Next position for appending, incrementing first digit which is not 'z', so that positions get
+    longer only once every 35 appends.
+    :param before: last position or None
+    :return: position string greater than before
+    """
+    if not before:
+        return FIRST_POSITION
+    for n, digit in enumerate(before):
+        if digit != DIGITS[-1]:
+            return before[:n] + DIGITS[DIGITS.index(digit) + 1]
+    return before + DIGITS[1]
+
+
+def ranks_between(before, after, count):
+    """
+    Spreads count positions evenly between two positions, so their length grows
+    with log of count.
+    :param before: position or None
+    :param after: position or None
+    :param count: number of positions
+    :return: sorted list of positions
+    """
+    if count <= 0:
+        return []
+    middle = rank_between(before, after)
+    half = (count - 1) // 2
+    return ranks_between(before, middle, half) + [middle] + ranks_between(middle, after, count - 1 - half)
+
+
+def set_new_positions(tasks):
+    """
+    Sets 'position' of new tasks without position after last task of their todo, in given order,
+    with one query for all todos. Many tasks of todo are spread below next position to keep positions short.
+    :param tasks: list of unsaved Task objects
+    """
+    tasks = [task for task in tasks if not task.position]
+    todo_ids = {task.todo_id for task in tasks}
+    if not todo_ids:
+        return
+    last = dict(
+        Task.all_objects.filter(todo_id__in=todo_ids).values('todo_id').annotate(
+            last=Max('position')
+        ).values_list('todo_id', 'last')
+    )
+    by_todo = {}
+    for task in tasks:
+        by_todo.setdefault(task.todo_id, []).append(task)
+    for todo_id, todo_tasks in by_todo.items():
+        upper = rank_after(last.get(todo_id))
+        positions = ranks_between(last.get(todo_id), upper, len(todo_tasks) - 1) + [upper]
+        if max(len(position) for position in positions) > MAX_POSITION_LENGTH:
+            # last position of todo is too long to append after it, so todo is rebalanced first.
+            rebalance_positions(todo_id)
+            last[todo_id] = Task.all_objects.filter(todo_id=todo_id).aggregate(last=Max('position'))['last']
+            upper = rank_after(last[todo_id])
+            positions = ranks_between(last[todo_id], upper, len(todo_tasks) - 1) + [upper]
+        for task, position in zip(todo_tasks, positions):
+            task.position = position
+        ask_for_rebalance(todo_id, upper)
+
+
+def append_moved_tasks(task_ids, todo_id, batch_size=1000):
+    """
+    Gives tasks which are moved to another todo new positions after last task of that todo, keeping their
+    order, so that they do not land among its tasks. Must be called before tasks are moved.
+    :param task_ids: ids of tasks to be moved, along with their descendants
+    :param todo_id: integer 'id' of todo to which tasks are moved
+    :param batch_size: tasks updated per query
+    :return: dict of task id -> new position
+    """
+    tasks = list(Task.all_objects.filter(id__in=task_ids).order_by('position', 'id').only('id', 'position'))
+    for task in tasks:
+        task.todo_id, task.position = todo_id, ''
+    set_new_positions(tasks)
+    Task.all_objects.bulk_update(tasks, ['position'], batch_size=batch_size)
+    return {task.id: task.position for task in tasks}
+
+
+def ask_for_rebalance(todo_id, position):
+    """
+    Rebalances todo with celery task after current transaction, if given position of its task is
+    longer than settings.TODO_POSITION_REBALANCE_LENGTH.
+    :param todo_id: integer 'id' of todo
+    :param position: new position of task of todo
+    """
+    if len(position) <= settings.TODO_POSITION_REBALANCE_LENGTH:
+        return
+
+    from .tasks import rebalance_positions_task
+
+    transaction.on_commit(lambda: rebalance_positions_task.delay(todo_id))
+
+
+def reorder_task(task, after):
+    """
+    Moves task right after another task of same todo, or to top of todo, by updating 'position' of that
+    task only.
+    :param task: Task to be moved
+    :param after: Task of same todo, or None to move task to top
+    :return: moved task
+    :raise ReorderError: if after is task itself or it is of another todo
+    """
+    if after is not None and (after.id == task.id or after.todo_id != task.todo_id):
+        raise ReorderError('Task can be moved only after another task of same todo.')
+
+    with transaction.atomic():
+        # locking todo keeps positions of its tasks from changing till task is moved.
+        list(Todo.objects.select_for_update().filter(id=task.todo_id).values_list('id', flat=True))
+        siblings = Task.all_objects.filter(todo_id=task.todo_id).exclude(id=task.id)
+        before = after.position if after is not None else None
+        following = siblings.filter(position__gt=before) if before is not None else siblings
+        next_position = following.order_by('position').values_list('position', flat=True).first()
+        duplicate = before is not None and siblings.filter(position=before).exclude(id=after.id).exists()
+        position = None
+        if not duplicate and before != '' and next_position != '':
+            position = rank_between(before, next_position)
+        if position is None or len(position) > MAX_POSITION_LENGTH:
+            # tasks with same or empty position cannot be told apart, and too long position does not fit
+            # in column, so positions of todo are rebalanced first.
+            rebalance_positions(task.todo_id)
+            return reorder_task(
+                Task.objects.get(id=task.id), Task.objects.get(id=after.id) if after is not None else None
+            )
+
+        Task.all_objects.filter(id=task.id).update(position=position, version=F('version') + 1)
+        invalidate_tree(todo_id=task.todo_id)
+        ask_for_rebalance(task.todo_id, position)
+
+    task.refresh_from_db()
+    task._counted_state = task.get_counted_state()
+    return task
+
+
+def rebalance_positions(todo_id, batch_size=1000):
+    """
+    Gives tasks of todo short, evenly spread positions below FIRST_POSITION, keeping their order.
+    :param todo_id: integer 'id' of todo
+    :param batch_size: tasks updated per query
+    :return: number of tasks updated
+    """
+    with transaction.atomic():
+        list(Todo.all_objects.select_for_update().filter(id=todo_id).values_list('id', flat=True))
+        tasks = list(Task.all_objects.filter(todo_id=todo_id).order_by('position', 'id').only('id', 'position'))
+        for task, position in zip(tasks, ranks_between(None, FIRST_POSITION, len(tasks))):
+            task.position = position
+        Task.all_objects.bulk_update(tasks, ['position'], batch_size=batch_size)
+    return len(tasks)
@@ -0,0 +1,130 @@
+"""
+Reminder mails of pending tasks due today, one digest mail per user.
+Reminders are sent hourly, each hour to users whose local time is in settings.REMINDER_HOUR, so load is
+spread over the day by time zones of users. Due tasks are streamed in chunks along with their todo and owner,
+so number of queries depends on number of chunks, and digests are written to mail outbox in batches, so number
+of insert queries depends on number of users.
+"""
+import logging
+import time
+from datetime import date
+from itertools import groupby
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.formats import date_format
+from django.utils.translation import gettext_lazy as _
+
+from accounts.models import User
+from accounts.utils import make_mail, send_mails
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+DIGEST_TEMPLATE = 'task_reminder_digest'
+
+
+def get_reminder_shards(now=None, hour=None):
+    """
+    Time zones of users in which local time of now is in reminder hour, grouped by local date, as time zones
+    14 hours ahead and 10 hours behind UTC are in same hour of different days.
+    :param now: aware datetime, current time by default
+    :param hour: local hour of reminders, settings.REMINDER_HOUR by default
+    :return: dict of date to list of time zone names
+    """
+    now = now or timezone.now()
+    hour = settings.REMINDER_HOUR if hour is None else hour
+    shards = {}
+    for name in User.objects.order_by().values_list('timezone', flat=True).distinct():
+        local = now.astimezone(ZoneInfo(name))
+        if local.hour == hour:
+            shards.setdefault(local.date(), []).append(name)
+    return shards
+
+
+def get_due_tasks(day, timezones=None):
+    """
+    :param day: date
+    :param timezones: optional list of time zone names of owners
+    :return: queryset of pending tasks due on day, of todos not in trash, ordered by owner
+    """
+    tasks = Task.objects.filter(completion_date=day, is_completed=False, todo__deleted_at__isnull=True)
+    if timezones is not None:
+        tasks = tasks.filter(todo__owner__timezone__in=timezones)
+    return tasks.select_related('todo__owner').order_by('todo__owner_id', 'todo_id', 'position', 'id')
+
+
+def iter_digests(day, timezones=None, chunk_size=None):
+    """
+    Groups due tasks by owner, fetching them chunk by chunk.
+    :param day: date
+    :param timezones: optional list of time zone names of owners
+    :param chunk_size: tasks fetched at once, settings.REMINDER_CHUNK_SIZE by default
+    :return: generator of tuple (owner, list of tasks)
+    """
+    tasks = get_due_tasks(day, timezones=timezones).iterator(chunk_size=chunk_size or settings.REMINDER_CHUNK_SIZE)
+    for owner_id, owner_tasks in groupby(tasks, key=lambda task: task.todo.owner_id):
+        owner_tasks = list(owner_tasks)
+        yield owner_tasks[0].todo.owner, owner_tasks
+
+
+def make_digest(owner, tasks, day):
+    """
+    :return: mail to be sent by accounts.utils.send_mails()
+    """
+    context = {
+        'subject': _('Task reminder'),
+        'completion_date': date_format(day),
+        'tasks': [{'content': task.content, 'todo_title': task.todo.title} for task in tasks],
+    }
+    return make_mail(owner.email, DIGEST_TEMPLATE, context)
+
+
+def send_reminder_digests(day=None, timezones=None, chunk_size=None, batch_size=None, send=send_mails):
+    """
+    Sends one reminder mail per user for all pending tasks of the user due on day.
+    :param day: date, today by default
+    :param timezones: optional list of time zone names, to send mails only to users of those time zones
+    :param chunk_size: tasks fetched at once, settings.REMINDER_CHUNK_SIZE by default
+    :param batch_size: mails per insert query, settings.MAIL_BATCH_SIZE by default
+    :param send: function writing mails in batches, returning number of batches
+    :return: dict of number of 'users', 'tasks' and mail 'batches'
+    """
+    day = day or date.today()
+    stats = {'users': 0, 'tasks': 0, 'batches': 0}
+
+    def mails():
+        for owner, tasks in iter_digests(day, timezones=timezones, chunk_size=chunk_size):
+            stats['users'] += 1
+            stats['tasks'] += len(tasks)
+            yield make_digest(owner, tasks, day)
+
+    stats['batches'] = send(mails(), batch_size=batch_size)
+    return stats
+
+
+def send_hourly_reminder_digests(now=None, chunk_size=None, batch_size=None, send=send_mails):
+    """
+    Sends reminder mails of shard of current hour, to users whose local time is in reminder hour, for tasks
+    due on their local date. Stats of each shard are logged.
+    :param now: aware datetime, current time by default
+    :param chunk_size: tasks fetched at once, settings.REMINDER_CHUNK_SIZE by default
+    :param batch_size: mails per insert query, settings.MAIL_BATCH_SIZE by default
+    :param send: function writing mails in batches, returning number of batches
+    :return: dict of number of 'timezones', 'users', 'tasks' and mail 'batches'
+    """
+    stats = {'timezones': 0, 'users': 0, 'tasks': 0, 'batches': 0}
+    for day, timezones in sorted(get_reminder_shards(now).items()):
+        start = time.perf_counter()
+        shard = send_reminder_digests(
+            day=day, timezones=timezones, chunk_size=chunk_size, batch_size=batch_size, send=send
+        )
+        logger.info(
+            'Reminders of %s in %d time zones: %d users, %d tasks, %d mail batches, %.2f s.',
+            day, len(timezones), shard['users'], shard['tasks'], shard['batches'], time.perf_counter() - start
+        )
+        stats['timezones'] += len(timezones)
+        for key, value in shard.items():
+            stats[key] += value
+    return stats
@@ -0,0 +1,83 @@
+"""
+Full-text search over content and details of tasks and title of their todo.
+On PostgreSQL todos and tasks have generated 'search_vector' tsvector columns with GIN indexes, and on SQLite
+tasks are indexed by 'todo_task_fts' FTS5 table kept in sync by triggers, see migration 0008_search.
+Those columns and tables are not fields of models, so they are used here with raw SQL.
+On both databases a task matches if all words of query are in its content, details or title of its todo.
+"""
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+from .models import Todo, Task
+
+SEARCH_QUERY_PARAM = 'q'
+SEARCH_CONFIG = 'english'
+FTS_TABLE = 'todo_task_fts'
+# rank of match in title of todo compared to match in content of task
+TITLE_RANK_WEIGHT = 0.5
+
+
+def to_fts5_query(query):
+    """
+    Makes FTS5 query from user input, each word being quoted so that FTS5 syntax in input is matched
+    as text, and all words must match, like websearch_to_tsquery() of PostgreSQL.
+    :param query: search string
+    :return: FTS5 MATCH string
+    """
+    return ' '.join('"{}"'.format(word.replace('"', '""')) for word in query.split())
+
+
+def _postgresql_search(tasks, owner, query):
+    task_table = connection.ops.quote_name(Task._meta.db_table)
+    # todo table is joined by owner filter of search_tasks(), so vectors of task and its todo are matched as one
+    # document, and words of query can be split between title of todo and content of task.
+    todo_table = connection.ops.quote_name(Todo._meta.db_table)
+    vector = f'({task_table}."search_vector" || {todo_table}."search_vector")'
+    tsquery = f"websearch_to_tsquery('{SEARCH_CONFIG}', %s)"
+    match = RawSQL(f'{vector} @@ {tsquery}', [query], output_field=BooleanField())
+    # title of todo has default weight 'D', which ranks lower than content 'A' and details 'B' of task.
+    rank = RawSQL(f'ts_rank({vector}, {tsquery})', [query], output_field=FloatField())
+    return tasks.filter(match), rank
+
+
+def _sqlite_search(tasks, owner, query):
+    task_table = connection.ops.quote_name(Task._meta.db_table)
+    match = to_fts5_query(query)
+    # bm25() is lower for better match, weights are of 'content', 'details' and 'title' columns.
+    rank = RawSQL(
+        f"""(
+            SELECT -bm25({FTS_TABLE}, 1.0, 0.5, {TITLE_RANK_WEIGHT}) FROM {FTS_TABLE}
+            WHERE {FTS_TABLE} MATCH %s AND rowid = {task_table}."id"
+        )""",
+        [match],
+        output_field=FloatField()
+    )
+    ids = RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match])
+    return tasks.filter(id__in=ids), rank
+
+
+def _default_search(tasks, owner, query):
+    # database without full-text index, so matching every word without ranking.
+    for word in query.split():
+        tasks = tasks.filter(Q(content__icontains=word) | Q(details__icontains=word) | Q(todo__title__icontains=word))
+    return tasks, Value(0.0, output_field=FloatField())
+
+
+SEARCH_BACKENDS = {
+    'postgresql': _postgresql_search,
+    'sqlite': _sqlite_search,
+}
+
+
+def search_tasks(owner, query):
+    """
+    Tasks of owner matching all words of query, best match first.
+    :param owner: User
+    :param query: search string, not blank
+    :return: Task queryset with 'rank' and 'todo' selected
+    """
+    tasks = Task.objects.filter(todo__owner=owner, todo__deleted_at__isnull=True).select_related('todo')
+    search = SEARCH_BACKENDS.get(connection.vendor, _default_search)
+    tasks, rank = search(tasks, owner, query)
+    return tasks.annotate(rank=rank).order_by('-rank', 'id')
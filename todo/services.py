@@ -0,0 +1,354 @@
+"""
+Set based mutations of tasks, shared by views of todo and todo_in_drf apps.
+Querysets update() and bulk_create() does not call Task.save() or send signals, so
+functions here update task counters of todos, versions of tasks and invalidate cached todo trees by themselves.
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import F, Q
+
+from .cache import invalidate_tree
+from .deletion import raw_delete
+from .models import Todo, Task, SubTask, TaskClosure
+from .positions import append_moved_tasks, set_new_positions
+
+
+def count_created_tasks(tasks):
+    """
+    Adds created tasks to task counters of their todos, one UPDATE per todo.
+    :param tasks: list of Task objects
+    """
+    deltas = {}
+    for task in tasks:
+        delta = deltas.setdefault(task.todo_id, [0, 0, 0])
+        delta[0] += 1
+        delta[1] += int(task.is_completed)
+        delta[2] += int(task.is_subtask)
+    for todo_id, (count, completed, sub_tasks) in deltas.items():
+        Todo.update_counters(todo_id, tasks=count, completed=completed, sub_tasks=sub_tasks)
+
+
+def bulk_create_tasks(items, owner_id):
+    """
+    Creates tasks along with their sub-tasks using bulk_create(), in one transaction.
+    :param items: list of dict of Task fields with Todo object as 'todo',
+    and optionally 'sub_tasks' as list of dict of Task fields for its sub-tasks.
+    :param owner_id: integer 'id' of owner of todos
+    :return: list of tuple (task, list of its sub-tasks)
+    """
+    with transaction.atomic():
+        tasks = [Task(**{field: value for field, value in item.items() if field != 'sub_tasks'}) for item in items]
+        parents, sub_tasks = [], []
+        ordered = []
+        for task, item in zip(tasks, items):
+            ordered.append(task)
+            for sub_task_data in item.get('sub_tasks', []):
+                parents.append(task)
+                sub_tasks.append(Task(**sub_task_data, todo=task.todo, is_subtask=True))
+                ordered.append(sub_tasks[-1])
+        # tasks are placed after last task of their todo, each followed by its sub-tasks.
+        set_new_positions(ordered)
+
+        tasks = Task.objects.bulk_create(tasks)
+        Task.objects.bulk_create(sub_tasks)
+        SubTask.objects.bulk_create([
+            SubTask(task=task, sub_task=sub_task) for task, sub_task in zip(parents, sub_tasks)
+        ])
+        TaskClosure.attach([(task.id, sub_task.id) for task, sub_task in zip(parents, sub_tasks)])
+
+        count_created_tasks(tasks + sub_tasks)
+        invalidate_tree(owner_id)
+
+    created = {task.id: (task, []) for task in tasks}
+    for task, sub_task in zip(parents, sub_tasks):
+        created[task.id][1].append(sub_task)
+    return list(created.values())
+
+
+def detach_moved_sub_tasks(task_ids):
+    """
+    Makes main tasks of given sub-tasks whose todo is not same as todo of their parent task anymore,
+    their own sub-tasks stay with them.
+    :param task_ids: list of task ids which are moved to another todo along with their descendants
+    :return: number of sub-tasks detached from their parent
+    """
+    links = SubTask.objects.filter(sub_task_id__in=task_ids).exclude(task__todo_id=F('sub_task__todo_id'))
+    sub_task_ids = list(links.values_list('sub_task_id', flat=True))
+    if not sub_task_ids:
+        return 0
+    Task.objects.filter(id__in=sub_task_ids).update(is_subtask=False, version=F('version') + 1)
+    TaskClosure.detach(sub_task_ids)
+    raw_delete(SubTask.objects.filter(sub_task_id__in=sub_task_ids))
+    return len(sub_task_ids)
+
+
+def bulk_update_tasks(owner, patch, task_ids=None, filters=None):
+    """
+    Applies patch to tasks of owner with a few UPDATE queries, in one transaction.
+    1. If 'is_completed' is set to True then descendants of selected tasks are completed too.
+    2. If 'todo' is changed then descendants of selected tasks are moved too, and selected
+    sub-tasks whose parent task is not moved become main tasks.
+    :param owner: User, only tasks of his todos are updated
+    :param patch: dict of fields to update, any of 'is_completed', 'completion_date', 'todo'
+    :param task_ids: list of task ids to update
+    :param filters: dict of filters on Task to select tasks to update, used with task_ids if both given
+    :return: dict of number of tasks updated, sub-tasks updated by cascade and sub-tasks detached
+    """
+    with transaction.atomic():
+        tasks = Task.objects.filter(todo__owner=owner, todo__deleted_at__isnull=True)
+        if task_ids is not None:
+            tasks = tasks.filter(id__in=task_ids)
+        if filters:
+            tasks = tasks.filter(**filters)
+        selected = list(tasks.select_for_update(of=('self',)).values_list('id', 'todo_id'))
+        if not selected:
+            return {'updated': 0, 'sub_tasks_updated': 0, 'detached': 0}
+
+        ids = [task_id for task_id, todo_id in selected]
+        todo_ids = {todo_id for task_id, todo_id in selected}
+        if 'todo' in patch:
+            # moved tasks and their descendants are appended to todo, in their order.
+            moved_ids = [task_id for task_id, todo_id in selected if todo_id != patch['todo'].id]
+            descendant_ids = Task.objects.filter(ancestor_links__ancestor_id__in=moved_ids).values_list('id', flat=True)
+            append_moved_tasks(set(moved_ids) | set(descendant_ids), patch['todo'].id)
+        updated = Task.objects.filter(id__in=ids).update(**patch, version=F('version') + 1)
+
+        cascade = {}
+        if patch.get('is_completed'):
+            cascade['is_completed'] = True
+        if 'todo' in patch:
+            cascade['todo'] = patch['todo']
+        sub_tasks_updated = 0
+        if cascade:
+            # sub-tasks are always in todo of their parent task, so todo_ids already has their todos.
+            sub_tasks = Task.objects.filter(ancestor_links__ancestor_id__in=ids).exclude(id__in=ids)
+            sub_tasks_updated = sub_tasks.update(**cascade, version=F('version') + 1)
+
+        detached = 0
+        if 'todo' in patch:
+            todo_ids.add(patch['todo'].id)
+            detached = detach_moved_sub_tasks(ids)
+
+        Todo.recount(todo_ids=list(todo_ids))
+        invalidate_tree(owner.id)
+
+    return {'updated': updated, 'sub_tasks_updated': sub_tasks_updated, 'detached': detached}
+
+
+def lock_tasks(task_ids):
+    """
+    Locks rows of given tasks till end of current transaction.
+    :param task_ids: list of task ids
+    """
+    # locked in order of id, so that requests locking same tasks do not deadlock.
+    list(Task.objects.select_for_update().filter(id__in=task_ids).order_by('id').values_list('id', flat=True))
+
+
+def update_task(task, old_todo_id, was_completed, make_main_task=False):
+    """
+    Saves changed task and applies the change to its descendants with set-based UPDATEs, so number of
+    queries does not depend on number of descendants.
+    1. If task is sub-task and make_main_task is True or its todo is changed, then it becomes main task.
+    2. If todo of task is changed then its descendants are moved to that todo too.
+    3. If task is completed then its descendants are completed too.
+    :param task: Task with changed attributes, not saved yet
+    :param old_todo_id: integer 'todo_id' of task before change
+    :param was_completed: boolean 'is_completed' of task before change
+    :param make_main_task: boolean, True to make sub-task main task
+    :return: saved task
+    :raise VersionConflict: if task is changed by another request since it was loaded
+    """
+    with transaction.atomic():
+        lock_tasks([task.id])
+
+        todo_moved = task.todo_id != old_todo_id
+        descendants = Task.objects.filter(ancestor_links__ancestor_id=task.id)
+        if todo_moved:
+            # task and its descendants are appended to todo, in their order.
+            positions = append_moved_tasks([task.id, *descendants.values_list('id', flat=True)], task.todo_id)
+            task.position = positions[task.id]
+        if task.is_subtask and (make_main_task or todo_moved):
+            TaskClosure.detach([task.id])
+            raw_delete(SubTask.objects.filter(sub_task_id=task.id))
+            task.is_subtask = False
+        task.save()
+
+        cascade = {}
+        if todo_moved:
+            cascade['todo_id'] = task.todo_id
+        if task.is_completed and not was_completed:
+            cascade['is_completed'] = True
+        if cascade and descendants.update(**cascade, version=F('version') + 1):
+            todo_ids = [old_todo_id, task.todo_id]
+            Todo.recount(todo_ids=todo_ids)
+            for owner_id in set(Todo.objects.filter(id__in=todo_ids).values_list('owner_id', flat=True)):
+                invalidate_tree(owner_id)
+    return task
+
+
+def get_link_snapshot(task_ids, owner=None):
+    """
+    Fetches tasks with their todo owner and parent task in one query.
+    :param task_ids: iterable of task ids
+    :param owner: User, if given then tasks of other users are not fetched
+    :return: dict of task id -> Task with 'owner_id' and 'parent_id' attributes
+    """
+    tasks = Task.objects.filter(id__in=task_ids, todo__deleted_at__isnull=True).annotate(
+        owner_id=F('todo__owner_id'),
+        parent_id=F('parent_task__task_id'),
+    )
+    if owner is not None:
+        tasks = tasks.filter(todo__owner=owner)
+    return {task.id: task for task in tasks}
+
+
+def get_ancestor_links(pairs):
+    """
+    :param pairs: list of tuple (task_id, sub_task_id)
+    :return: set of tuple (task_id, sub_task_id) of pairs where sub_task is ancestor of task, in one query
+    """
+    links = TaskClosure.objects.filter(
+        descendant_id__in=[task_id for task_id, sub_task_id in pairs],
+        ancestor_id__in=[sub_task_id for task_id, sub_task_id in pairs],
+    ).values_list('descendant_id', 'ancestor_id')
+    return set(links)
+
+
+def validate_sub_task_links(pairs, owner=None):
+    """
+    Validates that sub_task along with its sub-tasks can become sub-task of task for each pair,
+    with two queries for all pairs. Tasks can be nested at any depth, but not in a cycle, and a task
+    can not be both parent and sub-task in pairs, so that pairs can be linked at once.
+    :param pairs: list of tuple (task_id, sub_task_id)
+    :param owner: User, if given then tasks of other users are not valid
+    :return: list of dict of field ('task' or 'sub_task') -> list of error messages, in same order as pairs,
+    empty dict for valid pair.
+    """
+    snapshot = get_link_snapshot({task_id for pair in pairs for task_id in pair}, owner=owner)
+    ancestor_links = get_ancestor_links(pairs)
+    parent_ids = Counter(task_id for task_id, sub_task_id in pairs)
+    sub_task_ids = Counter(sub_task_id for task_id, sub_task_id in pairs)
+
+    errors = []
+    for task_id, sub_task_id in pairs:
+        task, sub_task = snapshot.get(task_id), snapshot.get(sub_task_id)
+        task_errors, sub_task_errors = [], []
+        # other pairs where task is sub-task, or sub_task is parent task
+        is_same = task_id == sub_task_id
+        task_as_sub_task = sub_task_ids[task_id] - is_same
+        sub_task_as_parent = parent_ids[sub_task_id] - is_same
+
+        if task is None:
+            task_errors.append('This task id is not valid.')
+        elif task_as_sub_task:
+            task_errors.append('This task is also given as sub-task.')
+
+        if sub_task is None:
+            sub_task_errors.append('This sub-task id is not valid.')
+        else:
+            if sub_task_as_parent:
+                sub_task_errors.append('The sub-task is also given as parent task.')
+            if task is not None and sub_task.parent_id == task.id:
+                sub_task_errors.append('The sub-task is already sub-task of the task.')
+            elif sub_task.is_subtask or sub_task_ids[sub_task_id] > 1:
+                sub_task_errors.append('This sub-task is already sub-task of another task.')
+            if (task_id, sub_task_id) in ancestor_links:
+                sub_task_errors.append('The sub-task is ancestor of the task, so cannot become its sub-task.')
+            if task is not None and sub_task.todo_id != task.todo_id:
+                sub_task_errors.append('The todo of task and sub-task is not matching.')
+            if task_id == sub_task_id:
+                sub_task_errors.append('The task and sub-task cannot be same.')
+
+        errors.append({
+            field: messages
+            for field, messages in (('task', task_errors), ('sub_task', sub_task_errors)) if messages
+        })
+    return errors
+
+
+class SubTaskLinkError(ValueError):
+    def __init__(self, errors):
+        super(SubTaskLinkError, self).__init__('Sub-task links are not valid.')
+        self.errors = errors
+
+
+def link_sub_tasks(pairs, owner=None):
+    """
+    Makes sub_task sub-task of task for each pair. Tasks of pairs and ancestors of parent tasks are locked
+    and pairs are validated by validate_sub_task_links() in same transaction, so that concurrent
+    requests cannot make a cycle. Number of queries does not depend on number of pairs.
+    :param pairs: list of tuple (task_id, sub_task_id)
+    :param owner: User, if given then tasks of other users are not valid
+    :return: list of created SubTask
+    :raise SubTaskLinkError: with errors of validate_sub_task_links() if any pair is not valid
+    """
+    sub_task_ids = [sub_task_id for task_id, sub_task_id in pairs]
+    with transaction.atomic():
+        # a cycle made by links of two requests goes through ancestors of parent task of both of them.
+        ancestor_ids = TaskClosure.objects.filter(
+            descendant_id__in=[task_id for task_id, sub_task_id in pairs]
+        ).values_list('ancestor_id', flat=True)
+        lock_tasks({task_id for pair in pairs for task_id in pair} | set(ancestor_ids))
+        errors = validate_sub_task_links(pairs, owner=owner)
+        if any(errors):
+            raise SubTaskLinkError(errors)
+
+        Task.objects.filter(id__in=sub_task_ids).update(is_subtask=True, version=F('version') + 1)
+        links = SubTask.objects.bulk_create([
+            SubTask(task_id=task_id, sub_task_id=sub_task_id) for task_id, sub_task_id in pairs
+        ])
+        TaskClosure.attach(pairs)
+
+        todos = Todo.objects.filter(tasks__id__in=sub_task_ids)
+        Todo.recount(todo_ids=todos.values('id'))
+        for owner_id in set(todos.values_list('owner_id', flat=True)):
+            invalidate_tree(owner_id)
+    return links
+
+
+def get_move_error(task, parent):
+    """
+    :param task: Task to be moved
+    :param parent: Task under which task is to be moved
+    :return: error message or None if task along with its sub-tasks can be moved under parent
+    """
+    if parent.id == task.id:
+        return 'The task cannot be parent of itself.'
+    if TaskClosure.objects.filter(ancestor_id=task.id, descendant_id=parent.id).exists():
+        return 'The parent task is sub-task of the task.'
+    return None
+
+
+def move_task(task, parent):
+    """
+    Moves task along with its descendants under parent, or makes it main task if parent is None,
+    with fixed number of queries independent of size of subtree. If parent is in another todo then
+    subtree is moved to that todo too.
+    :param task: Task, validated by get_move_error()
+    :param parent: Task or None
+    :return: moved task
+    """
+    with transaction.atomic():
+        lock_tasks([task.id])
+        if task.is_subtask:
+            TaskClosure.detach([task.id])
+            raw_delete(SubTask.objects.filter(sub_task_id=task.id))
+
+        todo_ids = {task.todo_id}
+        if parent is not None and parent.todo_id != task.todo_id:
+            todo_ids.add(parent.todo_id)
+            subtree = Task.objects.filter(Q(id=task.id) | Q(ancestor_links__ancestor_id=task.id))
+            append_moved_tasks(list(subtree.values_list('id', flat=True)), parent.todo_id)
+            subtree.update(todo_id=parent.todo_id, version=F('version') + 1)
+        Task.objects.filter(id=task.id).update(is_subtask=parent is not None, version=F('version') + 1)
+        if parent is not None:
+            SubTask.objects.bulk_create([SubTask(task=parent, sub_task_id=task.id)])
+            TaskClosure.attach([(parent.id, task.id)])
+
+        Todo.recount(todo_ids=list(todo_ids))
+        for owner_id in set(Todo.objects.filter(id__in=todo_ids).values_list('owner_id', flat=True)):
+            invalidate_tree(owner_id)
+    task.refresh_from_db()
+    task._counted_state = task.get_counted_state()
+    return task
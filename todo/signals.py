@@ -0,0 +1,35 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .cache import invalidate_tree
+from .models import Todo, Task, SubTask
+
+
+def invalidate_task_tree(task):
+    """
+    Invalidates tree of owner of task without querying it, its owner is fetched once per transaction
+    if its todo is not loaded.
+    :param task: Task object
+    """
+    if Task.todo.is_cached(task):
+        invalidate_tree(task.todo.owner_id)
+    else:
+        invalidate_tree(todo_id=task.todo_id)
+
+
+@receiver([post_save, post_delete], sender=Todo)
+def todo_changed(sender, instance, **kwargs):
+    invalidate_tree(instance.owner_id)
+
+
+@receiver([post_save, post_delete], sender=Task)
+def task_changed(sender, instance, **kwargs):
+    invalidate_task_tree(instance)
+
+
+@receiver([post_save, post_delete], sender=SubTask)
+def sub_task_changed(sender, instance, **kwargs):
+    if SubTask.task.is_cached(instance):
+        invalidate_task_tree(instance.task)
+    else:
+        invalidate_tree(task_id=instance.task_id)
@@ -1,24 +1,28 @@
 # todo/tasks.py
-from datetime import datetime
-
 from celery import shared_task
 
-from django.utils.translation import gettext_lazy as _
-
-from accounts.utils import send_mail
-from .models import Task
+from .deletion import delete_todo_rows
+from .trash import purge_trash
+from .positions import rebalance_positions
+from .reminders import send_hourly_reminder_digests
 
 
 @shared_task
 def send_reminder_mail():
-    queryset = Task.objects.filter(completion_date=datetime.today().date())
-    for obj in queryset:
-        context = {
-            'subject': _('Task reminder'),
-            'task_content': obj.content,
-            'task_completion_date': obj.completion_date,
-            'task_todo_title': obj.todo.title,
-        }
-        send_mail(obj.todo.owner.email, 'task_reminder', context)
+    # one digest mail per user of time zones in reminder hour, see todo.reminders
+    return send_hourly_reminder_digests()
+
+
+@shared_task
+def delete_todo_task(todo_id):
+    return delete_todo_rows(todo_id)
 
 
+@shared_task
+def purge_trash_task():
+    return purge_trash()
+
+
+@shared_task
+def rebalance_positions_task(todo_id):
+    return rebalance_positions(todo_id)
@@ -0,0 +1,37 @@
+"""
+Shared fixtures of tests of todo and todo_in_drf apps.
+"""
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from .models import Todo, Task, SubTask
+
+
+def create_tree(owner, todos=1, tasks=1, sub_tasks=1):
+    """
+    Creates todos of owner, each with main tasks having sub-tasks of their own.
+    :param owner: User
+    :param todos: number of todos
+    :param tasks: number of main tasks per todo
+    :param sub_tasks: number of sub-tasks per main task
+    """
+    for i in range(todos):
+        todo = Todo.objects.create(title=f'todo {i}', owner=owner)
+        for j in range(tasks):
+            task = Task.objects.create(content=f'task {j}', todo=todo)
+            for k in range(sub_tasks):
+                sub_task = Task.objects.create(content=f'sub-task {k}', todo=todo, is_subtask=True)
+                SubTask.objects.create(task=task, sub_task=sub_task)
+
+
+class AuthenticatedAPITestCase(TestCase):
+    """
+    Test case with empty cache and APIClient authenticated as self.user.
+    """
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='user@example.com', password='password')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
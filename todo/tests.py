@@ -1,3 +1,440 @@
+import json
+from datetime import date, datetime, timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection
+from django.db.models.query import QuerySet
+from django.http import Http404
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User
+from .deletion import delete_todo_rows
+from .trash import trash_todo, trash_task, restore_task, purge_trash, RestoreError
+from .forms import CreateUpdateTaskForm
+from .models import Todo, Task, SubTask, TaskClosure
+from .services import move_task, update_task
+from .positions import reorder_task
+from .search import search_tasks
+from .testing import create_tree
+from .reminders import send_hourly_reminder_digests, send_reminder_digests
+
+
+class TodoTreeTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='user@example.com', password='password')
+
+    def create_tree(self, todos=1, tasks=1, sub_tasks=1):
+        create_tree(self.user, todos=todos, tasks=tasks, sub_tasks=sub_tasks)
+
+    def test_tree_shape(self):
+        self.create_tree()
+        todo = Todo.objects.get()
+        task, sub_task = todo.tasks.order_by('id')
+
+        data = Todo.queryset_to_list_of_dict(queryset=Todo.objects.filter(owner=self.user))
+
+        self.assertEqual(data, [{
+            'id': todo.id,
+            'title': todo.title,
+            'owner': self.user.email,
+            'task_count': 2,
+            'completed_count': 0,
+            'subtask_count': 1,
+            'version': 1,
+            'tasks': [
+                {
+                    'id': task.id,
+                    'content': task.content,
+                    'details': None,
+                    'is_completed': False,
+                    'is_subtask': False,
+                    'completion_date': None,
+                    'todo': todo.id,
+                    'version': 1,
+                    'sub-tasks': [sub_task.id],
+                },
+                {
+                    'id': sub_task.id,
+                    'content': sub_task.content,
+                    'details': None,
+                    'is_completed': False,
+                    'is_subtask': True,
+                    'completion_date': None,
+                    'todo': todo.id,
+                    'version': 1,
+                    'parent': task.id,
+                },
+            ],
+        }])
+
+    def test_sub_task_with_sub_tasks_has_them(self):
+        todo = Todo.objects.create(title='todo', owner=self.user)
+        a = Task.objects.create(content='a', todo=todo)
+        b, c = [Task.objects.create(content=content, todo=todo, is_subtask=True) for content in 'bc']
+        SubTask.objects.create(task=a, sub_task=b)
+        SubTask.objects.create(task=b, sub_task=c)
+
+        data = Todo.queryset_to_list_of_dict(queryset=Todo.objects.filter(owner=self.user))
+
+        tasks = {task['id']: task for task in data[0]['tasks']}
+        self.assertEqual(tasks[a.id]['sub-tasks'], [b.id])
+        self.assertEqual((tasks[b.id]['parent'], tasks[b.id]['sub-tasks']), (a.id, [c.id]))
+        self.assertNotIn('sub-tasks', tasks[c.id])
+        self.assertEqual(Task.objects.get(id=b.id).to_dict()['sub-tasks'], [c.id])
+
+    def test_tree_query_count_does_not_depend_on_data_size(self):
+        queryset = Todo.objects.filter(owner=self.user)
+        self.create_tree()
+        with self.assertNumQueries(3):
+            Todo.queryset_to_list_of_dict(queryset=queryset)
+
+        self.create_tree(todos=5, tasks=4, sub_tasks=3)
+        with self.assertNumQueries(3):
+            Todo.queryset_to_list_of_dict(queryset=queryset)
+
+
+class TodoTaskCountersTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='user@example.com', password='password')
+        self.todo = Todo.objects.create(title='todo', owner=self.user)
+        self.other_todo = Todo.objects.create(title='other todo', owner=self.user)
+
+    def assertCounters(self, todo, tasks, completed, sub_tasks):
+        todo.refresh_from_db()
+        self.assertEqual((todo.task_count, todo.completed_count, todo.subtask_count), (tasks, completed, sub_tasks))
+
+    def test_counters_follow_task_changes(self):
+        task = Task.objects.create(content='task', todo=self.todo)
+        Task.objects.create(content='sub-task', todo=self.todo, is_subtask=True, is_completed=True)
+        self.assertCounters(self.todo, 2, 1, 1)
+
+        task = Task.objects.get(id=task.id)
+        task.is_completed = True
+        task.todo = self.other_todo
+        task.save()
+        self.assertCounters(self.todo, 1, 1, 1)
+        self.assertCounters(self.other_todo, 1, 1, 0)
+
+        task.delete()
+        self.assertCounters(self.other_todo, 0, 0, 0)
+
+    def test_recount(self):
+        Task.objects.create(content='task', todo=self.todo)
+        Todo.objects.update(task_count=10, completed_count=10, subtask_count=10)
+
+        with self.assertNumQueries(1):
+            Todo.recount()
+        self.assertCounters(self.todo, 1, 0, 0)
+        self.assertCounters(self.other_todo, 0, 0, 0)
+
+
+class UpdateTaskTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='user@example.com', password='password')
+        self.todo = Todo.objects.create(title='todo', owner=self.user)
+        self.other_todo = Todo.objects.create(title='other todo', owner=self.user)
+
+    def create_task(self, sub_tasks):
+        task = Task.objects.create(content='task', todo=self.todo)
+        for i in range(sub_tasks):
+            sub_task = Task.objects.create(content=f'sub-task {i}', todo=self.todo, is_subtask=True)
+            SubTask.objects.create(task=task, sub_task=sub_task)
+        return Task.objects.get(id=task.id)
+
+    def update_task(self, task, data):
+        form = CreateUpdateTaskForm(Task.fill_data_from_instance(data, instance_id=task.id)[0], instance=task)
+        self.assertTrue(form.is_valid(), form.errors)
+        with CaptureQueriesContext(connection) as queries:
+            form.save()
+        return len(queries)
+
+    def test_complete_and_move_cascades_to_sub_tasks(self):
+        task = self.create_task(sub_tasks=2)
+
+        self.update_task(task, {'is_completed': True, 'todo': self.other_todo.id})
+
+        self.assertEqual(
+            list(Task.objects.filter(parent_task__task=task).values_list('todo_id', 'is_completed')),
+            [(self.other_todo.id, True)] * 2
+        )
+        self.other_todo.refresh_from_db()
+        self.assertEqual((self.other_todo.task_count, self.other_todo.completed_count), (3, 3))
+
+    def test_moved_tasks_are_appended_to_todo(self):
+        existing = [Task.objects.create(content=f'existing {i}', todo=self.other_todo) for i in range(2)]
+        task = self.create_task(sub_tasks=2)
+        sub_tasks = Task.objects.filter(parent_task__task=task).order_by('position')
+        sub_task_ids = list(sub_tasks.values_list('id', flat=True))
+
+        self.update_task(task, {'todo': self.other_todo.id})
+
+        ordered = list(Task.objects.filter(todo=self.other_todo).order_by('position').values_list('id', flat=True))
+        self.assertEqual(ordered, [existing[0].id, existing[1].id, task.id] + sub_task_ids)
+
+        parent = Task.objects.create(content='parent', todo=self.todo)
+        move_task(Task.objects.get(id=existing[0].id), parent)
+        ordered = list(Task.objects.filter(todo=self.todo).order_by('position').values_list('id', flat=True))
+        self.assertEqual(ordered, [parent.id, existing[0].id])
+
+    def test_query_count_does_not_depend_on_number_of_sub_tasks(self):
+        data = {'is_completed': True, 'todo': self.other_todo.id}
+        self.assertEqual(
+            self.update_task(self.create_task(sub_tasks=1), data),
+            self.update_task(self.create_task(sub_tasks=10), data)
+        )
+
+
+class TaskHierarchyTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='user@example.com', password='password')
+        self.todo = Todo.objects.create(title='todo', owner=self.user)
+        # chain of tasks[0] -> tasks[1] -> tasks[2] -> tasks[3], and other main task
+        self.tasks = [Task.objects.create(content='task 0', todo=self.todo)]
+        for i in range(1, 4):
+            task = Task.objects.create(content=f'task {i}', todo=self.todo, is_subtask=True)
+            SubTask.objects.create(task=self.tasks[-1], sub_task=task)
+            self.tasks.append(task)
+        self.other = Task.objects.create(content='other', todo=self.todo)
+
+    def ids(self, tasks):
+        return [task['id'] for task in tasks]
+
+    def test_subtree_and_ancestors(self):
+        with self.assertNumQueries(1):
+            subtree = TaskClosure.get_subtree(self.tasks[0].id)
+        self.assertEqual(self.ids(subtree), [task.id for task in self.tasks[1:]])
+        self.assertEqual([task['depth'] for task in subtree], [1, 2, 3])
+        self.assertEqual(subtree[-1]['parent'], self.tasks[2].id)
+
+        with self.assertNumQueries(1):
+            ancestors = TaskClosure.get_ancestors(self.tasks[3].id)
+        self.assertEqual(self.ids(ancestors), [task.id for task in self.tasks[:3]])
+
+    def test_cascade_complete_from_sub_task(self):
+        task = Task.objects.get(id=self.tasks[1].id)
+        task.is_completed = True
+        update_task(task, old_todo_id=task.todo_id, was_completed=False)
+
+        self.assertEqual(
+            list(Task.objects.filter(is_completed=True).order_by('id').values_list('id', flat=True)),
+            [task.id for task in self.tasks[1:]]
+        )
+
+    def test_move_subtree(self):
+        move_task(Task.objects.get(id=self.tasks[1].id), self.other)
+
+        self.assertEqual(self.ids(TaskClosure.get_subtree(self.tasks[0].id)), [])
+        self.assertEqual(self.ids(TaskClosure.get_ancestors(self.tasks[3].id)), [
+            self.other.id, self.tasks[1].id, self.tasks[2].id
+        ])
+        self.assertEqual(SubTask.objects.get(sub_task=self.tasks[1]).task_id, self.other.id)
+
+
+class TaskPositionTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='user@example.com', password='password')
+        self.todo = Todo.objects.create(title='todo', owner=self.user)
+        self.tasks = [Task.objects.create(content=f'task {i}', todo=self.todo) for i in range(4)]
+
+    def get_order(self):
+        return list(Task.objects.filter(todo=self.todo).order_by('position').values_list('id', flat=True))
+
+    @mock.patch('todo.positions.MAX_POSITION_LENGTH', 4)
+    def test_too_long_position_is_rebalanced_at_once(self):
+        first, moved = self.tasks[0], self.tasks[1:]
+        for i in range(30):
+            reorder_task(Task.objects.get(id=moved[i % 3].id), first)
+
+        self.assertLessEqual(max(len(position) for position in Task.objects.values_list('position', flat=True)), 4)
+        self.assertEqual(self.get_order(), [first.id, moved[2].id, moved[1].id, moved[0].id])
+
+    def test_reorder_among_tasks_without_position(self):
+        Task.objects.filter(id__in=[self.tasks[0].id, self.tasks[1].id]).update(position='')
+
+        reorder_task(Task.objects.get(id=self.tasks[3].id), Task.objects.get(id=self.tasks[0].id))
+
+        self.assertEqual(self.get_order(), [self.tasks[0].id, self.tasks[3].id, self.tasks[1].id, self.tasks[2].id])
+
+
+class SearchTaskTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='user@example.com', password='password')
+        self.todo = Todo.objects.create(title='groceries', owner=self.user)
+        self.in_content = Task.objects.create(content='buy milk', todo=self.todo)
+        self.in_details = Task.objects.create(content='call plumber', details='sink leaking milk', todo=self.todo)
+        self.other = Task.objects.create(content='milk', todo=Todo.objects.create(
+            title='other', owner=User.objects.create_user(email='other@example.com', password='password')
+        ))
+
+    def search(self, query):
+        return list(search_tasks(self.user, query).values_list('id', flat=True))
+
+    def test_search_is_owner_scoped_and_ranked(self):
+        self.assertEqual(self.search('milk'), [self.in_content.id, self.in_details.id])
+        self.assertEqual(self.search('milk plumber'), [self.in_details.id])
+
+    def test_search_follows_changes_of_tasks_and_todo(self):
+        self.todo.title = 'weekend'
+        self.todo.save()
+        self.in_content.content = 'buy bread'
+        self.in_content.save()
+
+        self.assertEqual(self.search('weekend bread'), [self.in_content.id])
+        self.assertEqual(self.search('groceries'), [])
+
+    def test_words_split_between_title_and_content_match(self):
+        self.assertEqual(self.search('groceries milk'), [self.in_content.id, self.in_details.id])
+        self.assertEqual(self.search('groceries milk dentist'), [])
+
+
+class ReminderDigestTestCase(TestCase):
+    def setUp(self):
+        self.today = timezone.localdate()
+        self.mails = []
+
+    def create_due_tasks(self, users, tasks):
+        for i in range(users):
+            user = User.objects.create_user(email=f'user{i}@example.com', password='password')
+            todo = Todo.objects.create(title='todo', owner=user)
+            for j in range(tasks):
+                Task.objects.create(content=f'task {j}', todo=todo, completion_date=self.today)
+            Task.objects.create(content='done', todo=todo, completion_date=self.today, is_completed=True)
+
+    def send(self, mails, batch_size=None):
+        self.mails = list(mails)
+        return len(self.mails)
+
+    def test_one_digest_per_user(self):
+        self.create_due_tasks(users=2, tasks=3)
+
+        with CaptureQueriesContext(connection) as queries:
+            stats = send_reminder_digests(day=self.today, send=self.send)
+
+        self.assertEqual(stats, {'users': 2, 'tasks': 6, 'batches': 2})
+        self.assertEqual(len(queries), 1)
+        template, context, to = self.mails[0]
+        self.assertEqual(to, 'user0@example.com')
+        self.assertEqual([task['content'] for task in context['tasks']], ['task 0', 'task 1', 'task 2'])
+
+    def test_hourly_shard_of_local_morning(self):
+        self.create_due_tasks(users=2, tasks=1)
+        User.objects.filter(email='user0@example.com').update(timezone='Pacific/Kiritimati')  # UTC+14
+        User.objects.filter(email='user1@example.com').update(timezone='Pacific/Honolulu')  # UTC-10
+        Task.objects.update(completion_date=date(2024, 1, 2))
+        # 8 o'clock of 2 January in Kiritimati and of 1 January in Honolulu
+        now = datetime(2024, 1, 1, 18, tzinfo=timezone.utc)
+
+        with self.settings(REMINDER_HOUR=8):
+            stats = send_hourly_reminder_digests(now=now, send=self.send)
+            self.assertEqual(stats, {'timezones': 2, 'users': 1, 'tasks': 1, 'batches': 1})
+            self.assertEqual(self.mails[0][2], 'user0@example.com')
+            stats = send_hourly_reminder_digests(now=now + timedelta(hours=1), send=self.send)
+            self.assertEqual(stats, {'timezones': 0, 'users': 0, 'tasks': 0, 'batches': 0})
+
+
+class DeleteTodoTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='user@example.com', password='password')
+        self.todo = Todo.objects.create(title='todo', owner=self.user)
+        self.other_todo = Todo.objects.create(title='other todo', owner=self.user)
+        self.other_task = Task.objects.create(content='other task', todo=self.other_todo)
+
+    def test_delete_todo_rows_by_chunks(self):
+        for i in range(3):
+            task = Task.objects.create(content=f'task {i}', todo=self.todo)
+            sub_task = Task.objects.create(content=f'sub-task {i}', todo=self.todo, is_subtask=True)
+            SubTask.objects.create(task=task, sub_task=sub_task)
+
+        deleted = delete_todo_rows(self.todo.id, chunk_size=2)
+
+        self.assertEqual(deleted, {'todos': 1, 'tasks': 6, 'sub_tasks': 3})
+        self.assertFalse(Todo.objects.filter(id=self.todo.id).exists())
+        self.assertEqual(list(Task.objects.values_list('id', flat=True)), [self.other_task.id])
+        self.assertFalse(SubTask.objects.exists())
+
+
+class TrashTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='user@example.com', password='password')
+        self.todo = Todo.objects.create(title='todo', owner=self.user)
+        self.task = Task.objects.create(content='task', todo=self.todo)
+        self.sub_task = Task.objects.create(content='sub-task', todo=self.todo, is_subtask=True)
+        SubTask.objects.create(task=self.task, sub_task=self.sub_task)
+
+    def test_trash_and_restore_task_with_sub_tasks(self):
+        trash_task(self.task)
+        self.assertFalse(Task.objects.exists())
+        self.todo.refresh_from_db()
+        self.assertEqual(self.todo.task_count, 0)
+
+        with self.assertRaises(RestoreError):
+            restore_task(Task.all_objects.get(id=self.sub_task.id))
+        restore_task(Task.all_objects.get(id=self.task.id))
+        self.assertEqual(Task.objects.count(), 2)
+        # trashing and restoring are changes, so clients holding old version get a conflict.
+        self.assertEqual(Task.objects.get(id=self.sub_task.id).version, 3)
+        self.todo.refresh_from_db()
+        self.assertEqual(self.todo.task_count, 2)
+
+    def test_tasks_of_trashed_todo_are_not_found(self):
+        trash_todo(self.todo)
+        self.assertEqual(Todo.all_objects.get(id=self.todo.id).version, 2)
+
+        with self.assertRaises(Http404):
+            Task.fill_data_from_instance({'content': 'changed'}, instance_id=self.task.id)
+        with self.assertRaises(Http404):
+            Task.delete_task(task_id=self.task.id)
+
+    def test_purge_trash(self):
+        trash_task(self.task)
+        self.assertEqual(purge_trash(before=timezone.now() + timedelta(seconds=1)), {
+            'todos': 0, 'tasks': 2, 'sub_tasks': 1
+        })
+        self.assertFalse(Task.all_objects.exists())
+
+
+class ExportTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='user@example.com', password='password')
+        self.todo = Todo.objects.create(title='todo', owner=self.user)
+        self.task = Task.objects.create(content='task', todo=self.todo, completion_date=date(2022, 1, 10))
+        self.sub_task = Task.objects.create(content='sub-task', todo=self.todo, is_subtask=True)
+        SubTask.objects.create(task=self.task, sub_task=self.sub_task)
+        other_user = User.objects.create_user(email='other@example.com', password='password')
+        Task.objects.create(content='not mine', todo=Todo.objects.create(title='todo', owner=other_user))
+        self.client.force_login(self.user)
+
+    def assert_records(self, records):
+        self.assertEqual(records, [
+            {'type': 'todo', 'id': self.todo.id, 'title': 'todo', 'owner': 'user@example.com'},
+            {
+                'type': 'task', 'id': self.task.id, 'content': 'task', 'details': None, 'is_completed': False,
+                'is_subtask': False, 'completion_date': '2022-01-10', 'todo': self.todo.id, 'parent': None,
+            },
+            {
+                'type': 'task', 'id': self.sub_task.id, 'content': 'sub-task', 'details': None, 'is_completed': False,
+                'is_subtask': True, 'completion_date': None, 'todo': self.todo.id, 'parent': self.task.id,
+            },
+        ])
+
+    def test_streamed_ndjson_and_json(self):
+        with mock.patch.object(QuerySet, 'iterator', autospec=True, side_effect=QuerySet.iterator) as iterator:
+            response = self.client.get(reverse('todo-export-api'))
+            content = b''.join(response.streaming_content).decode()
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assert_records([json.loads(line) for line in content.splitlines()])
+        # todos and tasks are read with server-side cursors.
+        self.assertEqual(iterator.call_count, 2)
+
+        response = self.client.get(reverse('todo-export-api'), {'format': 'json'})
+        self.assert_records(json.loads(b''.join(response.streaming_content)))
 
-# Create your tests here.
+    def test_export_command(self):
+        out = StringIO()
+        call_command('export_todos', 'user@example.com', '--format', 'json', '--chunk-size', '1', stdout=out)
+        self.assert_records(json.loads(out.getvalue()))
@@ -0,0 +1,113 @@
+"""
+Soft deletion of todos and tasks.
+Deleting todo or task only sets its 'deleted_at' and bumps its 'version' with one UPDATE query, default managers and
+filter backends hide it from then on, and it can be restored till purge_trash() deletes it for good.
+Tasks of todo in trash keep their 'deleted_at', so they are hidden by their todo instead.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .cache import invalidate_tree
+from .deletion import delete_todo_rows, purge_deleted_tasks
+from .models import Todo, Task
+
+
+class RestoreError(ValueError):
+    pass
+
+
+def get_trashed_todos(owner):
+    """
+    :param owner: User
+    :return: queryset of todos of owner in trash, latest deleted first
+    """
+    return Todo.all_objects.filter(owner=owner, deleted_at__isnull=False).order_by('-deleted_at', '-id')
+
+
+def get_trashed_tasks(owner):
+    """
+    Tasks of owner in trash, excluding tasks of todos in trash which are restored or purged with their todo.
+    :param owner: User
+    :return: queryset of tasks, latest deleted first
+    """
+    return Task.all_objects.filter(
+        todo__owner=owner, todo__deleted_at__isnull=True, deleted_at__isnull=False
+    ).order_by('-deleted_at', '-id')
+
+
+def trash_todo(todo):
+    """
+    Moves todo to trash, its tasks are hidden along with it.
+    :param todo: Todo object
+    """
+    Todo.objects.filter(id=todo.id).update(deleted_at=timezone.now(), version=F('version') + 1)
+    invalidate_tree(todo.owner_id)
+
+
+def trash_task(task):
+    """
+    Moves task to trash along with its descendants. They get same 'deleted_at',
+    so that restoring task restores only descendants deleted with it.
+    :param task: Task object
+    """
+    with transaction.atomic():
+        Task.objects.filter(Q(id=task.id) | Q(ancestor_links__ancestor_id=task.id)).update(
+            deleted_at=timezone.now(), version=F('version') + 1
+        )
+        Todo.recount(todo_ids=[task.todo_id])
+        invalidate_tree(task.todo.owner_id)
+
+
+def restore_todo(todo):
+    """
+    :param todo: Todo object in trash
+    """
+    Todo.all_objects.filter(id=todo.id).update(deleted_at=None, version=F('version') + 1)
+    invalidate_tree(todo.owner_id)
+
+
+def restore_task(task):
+    """
+    Restores task and descendants deleted with it.
+    :param task: Task object in trash, whose todo is not in trash
+    :raise RestoreError: if task is sub-task and its parent task is in trash
+    """
+    parent = Task.all_objects.filter(sub_tasks__sub_task_id=task.id).values_list('deleted_at', flat=True)
+    if task.is_subtask and parent.first() is not None:
+        raise RestoreError('Restore parent task of this sub-task first.')
+
+    with transaction.atomic():
+        Task.all_objects.filter(
+            Q(id=task.id) | Q(ancestor_links__ancestor_id=task.id, deleted_at=task.deleted_at)
+        ).update(deleted_at=None, version=F('version') + 1)
+        Todo.recount(todo_ids=[task.todo_id])
+        invalidate_tree(task.todo.owner_id)
+
+
+def purge_trash(before=None, chunk_size=None):
+    """
+    Deletes todos and tasks which are in trash since before given time, by chunks.
+    :param before: datetime, settings.TODO_TRASH_RETENTION_DAYS ago by default
+    :param chunk_size: rows deleted per transaction, settings.TODO_DELETE_CHUNK_SIZE by default
+    :return: dict of number of deleted 'todos', 'tasks' and 'sub_tasks' links
+    """
+    before = before or timezone.now() - timedelta(days=settings.TODO_TRASH_RETENTION_DAYS)
+    chunk_size = chunk_size or settings.TODO_DELETE_CHUNK_SIZE
+    purged = {'todos': 0, 'tasks': 0, 'sub_tasks': 0}
+
+    todos = Todo.all_objects.filter(deleted_at__lt=before).order_by('id').values_list('id', flat=True)
+    while True:
+        todo_ids = list(todos[:chunk_size])
+        if not todo_ids:
+            break
+        for todo_id in todo_ids:
+            for key, count in delete_todo_rows(todo_id, chunk_size=chunk_size).items():
+                purged[key] += count
+
+    for key, count in purge_deleted_tasks(before, chunk_size=chunk_size).items():
+        purged[key] += count
+    return purged
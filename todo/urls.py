@@ -2,21 +2,34 @@ from django.urls import path
 from .views import (
     home,
     CreateTodoAPI,
+    ExportTodoAPI,
     UpdateDeleteTodoAPI,
+    DeleteJobStatusAPI,
     CreateTaskAPI,
     UpdateDeleteTaskAPI,
+    SearchTaskAPI,
     CreateSubTaskUsingIdsAPI,
     CreateSubTaskUsingDataAPI,
+    TrashAPI,
+    TrashTodoAPI,
+    TrashTaskAPI,
 )
 
 urlpatterns = [
     path('', home, name='home'),
     path('todo/', CreateTodoAPI.as_view(), name='todo-create-api'),
+    path('todo/export/', ExportTodoAPI.as_view(), name='todo-export-api'),
     path('todo/<id>/', UpdateDeleteTodoAPI.as_view(), name='todo-update-delete-api'),
+    path('todo/delete-job/<job_id>/', DeleteJobStatusAPI.as_view(), name='todo-delete-job-api'),
 
     path('task/', CreateTaskAPI.as_view(), name='task-create-api'),
+    path('task/search/', SearchTaskAPI.as_view(), name='task-search-api'),
     path('task/<id>/', UpdateDeleteTaskAPI.as_view(), name='task-update-delete-api'),
 
     path('sub-task-ids/', CreateSubTaskUsingIdsAPI.as_view(), name='sub-task-create-ids-api'),
     path('sub-task-data/', CreateSubTaskUsingDataAPI.as_view(), name='sub-task-create-data-api'),
+
+    path('trash/', TrashAPI.as_view(), name='trash-api'),
+    path('trash/todo/<id>/', TrashTodoAPI.as_view(), name='trash-todo-api'),
+    path('trash/task/<id>/', TrashTaskAPI.as_view(), name='trash-task-api'),
 ]
@@ -0,0 +1,105 @@
+"""
+ETag and If-Match of todo and task detail APIs, based on 'version' of VersionedModel.
+ETag of task is its version, followed by hash of todo tree version of user when task is fetched
+with its subtree or ancestors. Response of todo has its tasks too, so ETag of todo is its version
+followed by hash of todo tree version of user, and If-Match of todo is checked against its version only.
+"""
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .cache import get_tree_etag
+from .models import Todo, Task, VersionConflict
+
+IF_MATCH_HEADER = 'HTTP_IF_MATCH'
+PRECONDITION_FAILED_MESSAGE = 'The object is changed by another request, fetch it again and retry.'
+
+
+class InvalidIfMatch(ValueError):
+    pass
+
+
+class PreconditionFailed(APIException):
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = PRECONDITION_FAILED_MESSAGE
+    default_code = 'precondition_failed'
+
+
+def parse_if_match(request):
+    """
+    :param request: Django or DRF request
+    :return: integer version from 'If-Match' header, or None if header is not given or is '*'
+    :raise InvalidIfMatch: if header does not have version
+    """
+    value = request.META.get(IF_MATCH_HEADER, '').strip()
+    if not value or value == '*':
+        return None
+    etag = value.split(',')[0].strip()
+    if etag.startswith('W/'):
+        etag = etag[2:]
+    version = etag.strip('"').split('-')[0]
+    if not version.isdigit():
+        raise InvalidIfMatch(f'If-Match header "{value}" is not valid.')
+    return int(version)
+
+
+def is_version_matching(request, instance):
+    """
+    :param request: Django or DRF request
+    :param instance: VersionedModel object
+    :return: False if 'If-Match' header is given and is not valid or not matching version of instance
+    """
+    try:
+        version = parse_if_match(request)
+    except InvalidIfMatch:
+        return False
+    return version is None or version == instance.version
+
+
+def get_task_etag(request, *args, **kwargs):
+    """
+    ETag of task detail, to be used as 'etag_func' of django.views.decorators.http.condition.
+    :param request: request with logged-in user
+    :param kwargs: 'id' of task
+    :return: string or None if task is not found
+    """
+    if not request.user.is_authenticated:
+        return None
+    version = Task.objects.filter(
+        id=kwargs.get('id'), todo__owner=request.user, todo__deleted_at__isnull=True
+    ).values_list('version', flat=True).first()
+    if version is None:
+        return None
+    if request.GET.get('expand'):
+        return f'{version}-{get_tree_etag(request, *args, **kwargs)}'
+    return str(version)
+
+
+def get_todo_etag(request, *args, **kwargs):
+    """
+    ETag of todo detail, to be used as 'etag_func' of django.views.decorators.http.condition.
+    :param request: request with logged-in user
+    :param kwargs: 'id' of todo
+    :return: string or None if todo is not found
+    """
+    if not request.user.is_authenticated:
+        return None
+    version = Todo.objects.filter(id=kwargs.get('id'), owner=request.user).values_list('version', flat=True).first()
+    return None if version is None else f'{version}-{get_tree_etag(request, *args, **kwargs)}'
+
+
+class IfMatchVersionMixin:
+    """
+    Checks 'If-Match' header of PUT, PATCH and DELETE requests of DRF detail view against version of object,
+    and responds 412 if object is changed, before or while it is updated.
+    """
+    def get_object(self):
+        instance = super(IfMatchVersionMixin, self).get_object()
+        if self.request.method in ('PUT', 'PATCH', 'DELETE') and not is_version_matching(self.request, instance):
+            raise PreconditionFailed()
+        return instance
+
+    def perform_update(self, serializer):
+        try:
+            super(IfMatchVersionMixin, self).perform_update(serializer)
+        except VersionConflict:
+            raise PreconditionFailed()
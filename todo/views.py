@@ -1,9 +1,32 @@
-from django.shortcuts import render
+from django.shortcuts import render, get_object_or_404
+from django.utils.decorators import method_decorator
 from django.views import View
-from django.http import JsonResponse
+from django.views.decorators.http import condition
+from django.db.models import F
+from django.http import JsonResponse, StreamingHttpResponse
 
 from .forms import CreateUpdateTodoForm, CreateUpdateTaskForm, CreateSubTaskUsingIdsForm, CreateSubTaskUsingDataForm
-from .models import Todo, Task
+from .cache import get_or_build_tree, get_tree_etag
+from .deletion import delete_todo, get_delete_job_status
+from .trash import get_trashed_todos, get_trashed_tasks, restore_todo, restore_task, RestoreError
+from .idempotency import IdempotencyMixin
+from .versioning import is_version_matching, PRECONDITION_FAILED_MESSAGE
+from .export import iter_export, EXPORT_FORMATS, NDJSON
+from .models import Todo, Task, VersionConflict
+from .search import search_tasks, SEARCH_QUERY_PARAM
+from .pagination import (
+    paginate_todos,
+    paginate_by_offset,
+    get_page_size,
+    get_page_number,
+    get_next_link,
+    get_next_page_link,
+    InvalidCursor,
+    InvalidPage,
+    CURSOR_QUERY_PARAM,
+    PAGE_QUERY_PARAM,
+    PAGE_SIZE_QUERY_PARAM,
+)
 
 from accounts.mixin import LoginRequiredForApiMixin
 from .utils import get_dic, check_and_get_todo
@@ -13,15 +36,35 @@ def home(request):
     return render(request, template_name='todo/home.html')
 
 
-class CreateTodoAPI(LoginRequiredForApiMixin, View):
+class CreateTodoAPI(LoginRequiredForApiMixin, IdempotencyMixin, View):
+    @method_decorator(condition(etag_func=get_tree_etag))
     def get(self, request):
         """
-        Lists all Todo with necessary data.
-        :param request:
-        :return:
+        Lists Todo with necessary data, page by page.
+        Responds 304 if 'If-None-Match' header matches ETag of user's todo tree.
+        :param request: 'cursor' and 'page_size' in GET params, both optional
+        :return: {'next': url of next page or null, 'results': list of todo}
         """
-        data = Todo.queryset_to_list_of_dict(queryset=Todo.objects.filter(owner=request.user))
-        return JsonResponse(data, safe=False)
+        cursor = request.GET.get(CURSOR_QUERY_PARAM)
+        page_size = get_page_size(request.GET.get(PAGE_SIZE_QUERY_PARAM))
+
+        def build():
+            todos, next_cursor = paginate_todos(
+                Todo.objects.filter(owner=request.user).select_related('owner'),
+                cursor=cursor,
+                page_size=page_size,
+            )
+            return {'next_cursor': next_cursor, 'results': Todo.queryset_to_list_of_dict(queryset=todos)}
+
+        try:
+            data = get_or_build_tree(request.user.id, f'classic:{cursor}:{page_size}', build)
+        except InvalidCursor as e:
+            return JsonResponse({'error': str(e)})
+
+        return JsonResponse({
+            'next': get_next_link(request, data['next_cursor']),
+            'results': data['results'],
+        })
 
     def post(self, request):
         """
@@ -36,10 +79,29 @@ class CreateTodoAPI(LoginRequiredForApiMixin, View):
         return JsonResponse(form.errors)
 
 
-class UpdateDeleteTodoAPI(LoginRequiredForApiMixin, View):
+class ExportTodoAPI(LoginRequiredForApiMixin, View):
+    def get(self, request):
+        """
+        Downloads all Todo, Task and sub-task of user, streamed as it is read from database.
+        :param request: 'format' in GET params, 'ndjson' (default) or 'json'
+        :return: streaming response of todo records followed by task records
+        """
+        export_format = request.GET.get('format', NDJSON)
+        if export_format not in EXPORT_FORMATS:
+            return JsonResponse({'error': 'format must be one of: ' + ', '.join(EXPORT_FORMATS)})
+
+        response = StreamingHttpResponse(
+            iter_export(request.user, export_format=export_format),
+            content_type=EXPORT_FORMATS[export_format],
+        )
+        response['Content-Disposition'] = f'attachment; filename="todos.{export_format}"'
+        return response
+
+
+class UpdateDeleteTodoAPI(LoginRequiredForApiMixin, IdempotencyMixin, View):
     def get(self, request, **kwargs):
         """
-        Deleting Todo.
+        Deleting Todo, it is moved to trash.
         :param request:
         :param kwargs: 'id' for Todo
         :return: success message
@@ -50,21 +112,41 @@ class UpdateDeleteTodoAPI(LoginRequiredForApiMixin, View):
     def post(self, request, **kwargs):
         """
         Updates Todo.
-        :param request: request with logged-in user, POST data [title]
+        :param request: request with logged-in user, POST data [title], optional 'If-Match' header with version
         :param kwargs: 'id' for Todo
-        :return: if POST data is correct then instance data or else form errors
+        :return: if POST data is correct then instance data or else form errors,
+        error if todo is changed by another request
         """
         form = CreateUpdateTodoForm(
             get_dic(data=request.POST, owner=request.user),
             instance_id=int(kwargs['id'])
         )
+        if not is_version_matching(request, form.instance):
+            return JsonResponse({'error': PRECONDITION_FAILED_MESSAGE}, status=412)
         if form.is_valid():
-            todo = form.save()
+            try:
+                todo = form.save()
+            except VersionConflict:
+                return JsonResponse({'error': PRECONDITION_FAILED_MESSAGE}, status=412)
             return JsonResponse(todo.to_dict())
         return JsonResponse(form.errors)
 
 
-class CreateTaskAPI(LoginRequiredForApiMixin, View):
+class DeleteJobStatusAPI(LoginRequiredForApiMixin, View):
+    def get(self, request, **kwargs):
+        """
+        Status of background deletion of todo.
+        :param request: request with logged-in user
+        :param kwargs: 'job_id' returned by deleting todo
+        :return: job status or error if job is not found
+        """
+        data = get_delete_job_status(kwargs['job_id'], owner_id=request.user.id)
+        if data is None:
+            return JsonResponse({'error': 'Job not found.'})
+        return JsonResponse(data)
+
+
+class CreateTaskAPI(LoginRequiredForApiMixin, IdempotencyMixin, View):
     def post(self, request):
         """
         Creating Task.
@@ -83,10 +165,10 @@ class CreateTaskAPI(LoginRequiredForApiMixin, View):
         return JsonResponse(form.errors)
 
 
-class UpdateDeleteTaskAPI(LoginRequiredForApiMixin, View):
+class UpdateDeleteTaskAPI(LoginRequiredForApiMixin, IdempotencyMixin, View):
     def get(self, request, **kwargs):
         """
-        Deleting Task.
+        Deleting Task, it is moved to trash along with its sub-tasks.
         :param request: request with logged-in user
         :param kwargs: 'id' for Task
         :return: success message
@@ -102,20 +184,25 @@ class UpdateDeleteTaskAPI(LoginRequiredForApiMixin, View):
         3. user can change todo of task, it will change todo for all its sub-tasks too.
 
         :param request: request with logged-in user, and POST data
-        [title, details, is_completed, completion_date, todo]
+        [title, details, is_completed, completion_date, todo], optional 'If-Match' header with version
         :param kwargs: 'id' in GET params. POST data
-        :return: if POST data is correct then instance data or else form errors
+        :return: if POST data is correct then instance data or else form errors,
+        error if task is changed by another request
         """
         data, task = Task.fill_data_from_instance(request.POST, instance_id=int(kwargs['id']))
-        old_todo = task.todo
+        if not is_version_matching(request, task):
+            return JsonResponse({'error': PRECONDITION_FAILED_MESSAGE}, status=412)
         form = CreateUpdateTaskForm(data, instance=task)
         if form.is_valid():
-            task = form.save(todo=old_todo, is_subtask=request.POST.get('is_subtask', None))
+            try:
+                task = form.save(is_subtask=request.POST.get('is_subtask', None))
+            except VersionConflict:
+                return JsonResponse({'error': PRECONDITION_FAILED_MESSAGE}, status=412)
             return JsonResponse(task.to_dict())
         return JsonResponse(form.errors)
 
 
-class CreateSubTaskUsingIdsAPI(LoginRequiredForApiMixin, View):
+class CreateSubTaskUsingIdsAPI(LoginRequiredForApiMixin, IdempotencyMixin, View):
     def post(self, request):
         """
         Creating sub-task using id's of two main-tasks.
@@ -123,13 +210,12 @@ class CreateSubTaskUsingIdsAPI(LoginRequiredForApiMixin, View):
         :return: if POST data is correct then instance data or else form errors
         """
         form = CreateSubTaskUsingIdsForm(request.POST)
-        if form.is_valid():
-            form.save()
+        if form.is_valid() and form.save() is not None:
             return JsonResponse({'message': 'Created sub-task successfully.'})
         return JsonResponse(form.errors)
 
 
-class CreateSubTaskUsingDataAPI(LoginRequiredForApiMixin, View):
+class CreateSubTaskUsingDataAPI(LoginRequiredForApiMixin, IdempotencyMixin, View):
     def post(self, request):
         """
         Creating sub-task using id of main-task and data for sub-task.
@@ -146,3 +232,83 @@ class CreateSubTaskUsingDataAPI(LoginRequiredForApiMixin, View):
             sub_task_obj = form.save()
             return JsonResponse(sub_task_obj.sub_task.to_dict())
         return JsonResponse(form.errors)
+
+
+class SearchTaskAPI(LoginRequiredForApiMixin, View):
+    def get(self, request):
+        """
+        Searches tasks by words in their content, details and title of their todo, best match first.
+        :param request: 'q' in GET params, and optional 'page' and 'page_size'
+        :return: {'next': url of next page or null, 'results': list of task with 'todo_title' and 'rank'}
+        """
+        query = request.GET.get(SEARCH_QUERY_PARAM, '').strip()
+        if not query:
+            return JsonResponse({'error': 'Search query is required.'})
+        try:
+            tasks, next_page = paginate_by_offset(
+                search_tasks(request.user, query).values(
+                    'id', 'content', 'details', 'is_completed', 'is_subtask', 'completion_date', 'todo',
+                    'rank', todo_title=F('todo__title')
+                ),
+                page=get_page_number(request.GET.get(PAGE_QUERY_PARAM)),
+                page_size=get_page_size(request.GET.get(PAGE_SIZE_QUERY_PARAM)),
+            )
+        except InvalidPage as e:
+            return JsonResponse({'error': str(e)})
+
+        return JsonResponse({
+            'next': get_next_page_link(request, next_page),
+            'results': tasks,
+        })
+
+
+class TrashAPI(LoginRequiredForApiMixin, View):
+    def get(self, request):
+        """
+        Lists todos and tasks in trash, tasks of todos in trash are listed with their todo only.
+        :param request: request with logged-in user
+        :return: todos and tasks in trash, latest deleted first
+        """
+        return JsonResponse({
+            'todos': list(get_trashed_todos(request.user).values('id', 'title', 'task_count', 'deleted_at')),
+            'tasks': list(get_trashed_tasks(request.user).values('id', 'content', 'todo', 'is_subtask', 'deleted_at')),
+        })
+
+
+class TrashTodoAPI(LoginRequiredForApiMixin, IdempotencyMixin, View):
+    def get(self, request, **kwargs):
+        """
+        Deleting Todo in trash forever.
+        :param request: request with logged-in user
+        :param kwargs: 'id' for Todo in trash
+        :return: success message, or job id if todo is large and deleted in background
+        """
+        job_id = delete_todo(get_object_or_404(get_trashed_todos(request.user), id=int(kwargs['id'])))
+        if job_id:
+            return JsonResponse({'message': 'Todo deletion started.', 'job_id': job_id})
+        return JsonResponse({'message': 'Todo deleted successfully.'})
+
+    def post(self, request, **kwargs):
+        """
+        Restoring Todo from trash along with its tasks.
+        :param request: request with logged-in user
+        :param kwargs: 'id' for Todo in trash
+        :return: success message
+        """
+        restore_todo(get_object_or_404(get_trashed_todos(request.user), id=int(kwargs['id'])))
+        return JsonResponse({'message': 'Todo restored successfully.'})
+
+
+class TrashTaskAPI(LoginRequiredForApiMixin, IdempotencyMixin, View):
+    def post(self, request, **kwargs):
+        """
+        Restoring Task from trash along with sub-tasks deleted with it.
+        :param request: request with logged-in user
+        :param kwargs: 'id' for Task in trash
+        :return: success message or error if parent task of sub-task is in trash
+        """
+        try:
+            restore_task(get_object_or_404(get_trashed_tasks(request.user), id=int(kwargs['id'])))
+        except RestoreError as e:
+            return JsonResponse({'error': str(e)})
+        return JsonResponse({'message': 'Task restored successfully.'})
@@ -1,5 +1,9 @@
+from django.db import transaction
+from django.db.models import F
 from rest_framework import serializers
 from todo.models import Todo, Task, SubTask
+from todo.services import bulk_create_tasks, bulk_update_tasks, update_task, link_sub_tasks, get_move_error, \
+    move_task, SubTaskLinkError
 
 
 class CreateUpdateTaskSerializer(serializers.ModelSerializer):
@@ -12,6 +16,7 @@ class CreateUpdateTaskSerializer(serializers.ModelSerializer):
         error_messages={'invalid': 'Date is invalid or does not match format DD-MM-YYYY'}
     )
     content = serializers.CharField(max_length=500, required=False, allow_null=True)
+    parent = serializers.IntegerField(required=False, allow_null=True, write_only=True)
 
     def validate_todo(self, todo):
         is_updating = self.context.get('is_updating')
@@ -20,72 +25,200 @@ class CreateUpdateTaskSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError('Todo is invalid.')
         return todo
 
+    def validate_parent(self, parent_id):
+        if parent_id is None:
+            return None
+        try:
+            return Task.objects.get(id=parent_id, todo__owner=self.context.get('user'), todo__deleted_at__isnull=True)
+        except Task.DoesNotExist:
+            raise serializers.ValidationError('This task id is not valid.')
+
     def validate(self, attrs):
         """
         This method validates that is this serializer is used for create query
-        then 'content' is required else its optional.
+        then 'content' is required else its optional, and that task can be moved under given 'parent'.
         :param attrs: dictionary of given data
         :return: if data is correct then dictionary of data else if error then raises Validation error.
         """
         is_updating = self.context.get('is_updating')
         if not is_updating and not attrs.get('content'):
             raise serializers.ValidationError({'content': 'This Field is required.'})
+        if 'parent' in attrs and not is_updating:
+            raise serializers.ValidationError({'parent': 'Parent can be changed only while updating task.'})
+        if attrs.get('parent') is not None:
+            error = get_move_error(self.instance, attrs['parent'])
+            if error:
+                raise serializers.ValidationError({'parent': error})
         return attrs
 
     def update(self, instance, validated_data):
         # check if is_subtask parameter is False or not
         is_subtask = str(self.context.get('is_subtask')) != 'False'
 
-        # If task updated is main task and its is_complete status is changed to true
-        main_task_is_completed_status = False
-        if not self.instance.is_subtask and \
-                not self.instance.is_completed and \
-                self.validated_data.get('is_completed'):
-            main_task_is_completed_status = True
-
-        # while updating, if task is subtask and changed to main task
-        # or todo of task(is_subtask=True) is changed
-        if (self.instance.is_subtask and not is_subtask) or \
-                (self.instance.todo.id != self.validated_data['todo'] and self.instance.is_subtask):
-            self.instance.is_subtask = False
-            self.instance.parent_task.delete()
-
-        obj = super(CreateUpdateTaskSerializer, self).update(instance, validated_data)
-
-        # while updating, if task is subtask and changed to main task then 0 times loop
-        # and when task is main task and its todo is changed then todos of all its sub-task is changed if any.
-        if self.instance is not None:
-            for sub_task_obj in self.instance.sub_tasks.all():
-                sub_task = sub_task_obj.sub_task
-                sub_task.todo = obj.todo
-                if main_task_is_completed_status:
-                    sub_task.is_completed = True
-                sub_task.save()
-        return obj
+        old_todo_id, was_completed = instance.todo_id, instance.is_completed
+        moving = 'parent' in validated_data
+        parent = validated_data.pop('parent', None)
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+
+        # sub-task can become main task, and changes of task are applied to its descendants.
+        with transaction.atomic():
+            instance = update_task(
+                instance,
+                old_todo_id=old_todo_id,
+                was_completed=was_completed,
+                make_main_task=not is_subtask,
+            )
+            # task along with its descendants is moved under 'parent', or becomes main task if it is null.
+            if moving:
+                instance = move_task(instance, parent)
+        return instance
 
     class Meta:
         model = Task
-        fields = ('id', 'content', 'details', 'is_completed', 'completion_date', 'todo', 'is_subtask')
+        fields = (
+            'id', 'content', 'details', 'is_completed', 'completion_date', 'todo', 'is_subtask', 'version', 'parent'
+        )
         optional_fields = ['details', 'completion_date', 'content']
 
 
+class ReorderTaskSerializer(serializers.Serializer):
+    after = serializers.IntegerField(allow_null=True)
+
+    def validate_after(self, after_id):
+        # task is moved after another task of its todo, or to top of todo if 'after' is null.
+        if after_id is None:
+            return None
+        task = self.context['task']
+        try:
+            return Task.objects.exclude(id=task.id).get(id=after_id, todo_id=task.todo_id)
+        except Task.DoesNotExist:
+            raise serializers.ValidationError('This task id is not valid.')
+
+
+class BulkTodoField(serializers.PrimaryKeyRelatedField):
+    """
+    Todo field which looks up todo in 'todos' of serializer context, fetched once for all items
+    by the view, instead of querying todo for each item.
+    """
+    def to_internal_value(self, data):
+        try:
+            return self.context['todos'][int(data)]
+        except (KeyError, TypeError, ValueError):
+            self.fail('does_not_exist', pk_value=data)
+
+
+class BulkCreateSubTaskSerializer(CreateUpdateTaskSerializer):
+    class Meta(CreateUpdateTaskSerializer.Meta):
+        fields = ('id', 'content', 'details', 'is_completed', 'completion_date', 'is_subtask')
+
+
+class BulkCreateTaskListSerializer(serializers.ListSerializer):
+    def create(self, validated_data):
+        items = [dict(item, sub_tasks=item.pop('created_sub_tasks', [])) for item in validated_data]
+        created = bulk_create_tasks(items, owner_id=self.context['request'].user.id)
+        for task, sub_tasks in created:
+            task.created_sub_tasks = sub_tasks
+        return [task for task, sub_tasks in created]
+
+
+class BulkCreateTaskSerializer(CreateUpdateTaskSerializer):
+    todo = BulkTodoField(queryset=Todo.objects.all())
+    sub_tasks = BulkCreateSubTaskSerializer(many=True, required=False, source='created_sub_tasks')
+
+    class Meta(CreateUpdateTaskSerializer.Meta):
+        fields = CreateUpdateTaskSerializer.Meta.fields + ('sub_tasks',)
+        list_serializer_class = BulkCreateTaskListSerializer
+
+
+class BulkUpdateTaskFilterSerializer(serializers.Serializer):
+    todo = serializers.IntegerField(required=False)
+    is_completed = serializers.BooleanField(required=False)
+    is_subtask = serializers.BooleanField(required=False)
+    completion_date = serializers.DateField(
+        required=False,
+        input_formats=['%d-%m-%Y'],
+        error_messages={'invalid': 'Date is invalid or does not match format DD-MM-YYYY'}
+    )
+
+    def validate(self, attrs):
+        if not attrs:
+            raise serializers.ValidationError('At least one filter is required.')
+        if 'todo' in attrs:
+            attrs['todo_id'] = attrs.pop('todo')
+        return attrs
+
+
+class BulkUpdateTaskPatchSerializer(serializers.Serializer):
+    is_completed = serializers.BooleanField(required=False)
+    completion_date = serializers.DateField(
+        allow_null=True,
+        required=False,
+        input_formats=['%d-%m-%Y'],
+        error_messages={'invalid': 'Date is invalid or does not match format DD-MM-YYYY'}
+    )
+    todo = serializers.PrimaryKeyRelatedField(queryset=Todo.objects.all(), required=False)
+
+    def validate_todo(self, todo):
+        if todo.owner != self.context['request'].user:
+            raise serializers.ValidationError('Todo is invalid.')
+        return todo
+
+    def validate(self, attrs):
+        if not attrs:
+            raise serializers.ValidationError('At least one field to update is required.')
+        return attrs
+
+
+class BulkUpdateTaskSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False)
+    filter = BulkUpdateTaskFilterSerializer(required=False)
+    patch = BulkUpdateTaskPatchSerializer()
+
+    def validate_ids(self, ids):
+        max_items = self.context['max_items']
+        if len(ids) > max_items:
+            raise serializers.ValidationError(f'Ensure this field has no more than {max_items} elements.')
+        return ids
+
+    def validate(self, attrs):
+        if 'ids' not in attrs and 'filter' not in attrs:
+            raise serializers.ValidationError('Either ids or filter is required.')
+        return attrs
+
+    def save(self, **kwargs):
+        return bulk_update_tasks(
+            owner=self.context['request'].user,
+            patch=self.validated_data['patch'],
+            task_ids=self.validated_data.get('ids'),
+            filters=self.validated_data.get('filter'),
+        )
+
+
 class TaskForTodoListSerializer(serializers.ModelSerializer):
     sub_tasks = serializers.SerializerMethodField(source='sub_tasks', read_only=True)
 
     def to_representation(self, obj):
         """
-        If this serializer is user for task object(which is subtask) then remove 'sub_tasks' attribute.
+        If this serializer is user for task object(which is subtask) without sub-tasks
+        then remove 'sub_tasks' attribute.
         :param obj: Task object
         :return: representation of each field as dictionary
         """
         ret = super(TaskForTodoListSerializer, self).to_representation(obj)
-        if obj.is_subtask:
+        if obj.is_subtask and not ret['sub_tasks']:
             ret.pop('sub_tasks')
         return ret
 
     def get_sub_tasks(self, obj):
-        sub_tasks = [i.sub_task for i in obj.sub_tasks.all()]
-        return TaskForTodoListSerializer(sub_tasks, many=True).data
+        # uses 'children' map of parent id to tasks given in context by CreateUpdateTodoSerializer,
+        # else queries sub-tasks of task.
+        children = self.context.get('children')
+        if children is not None:
+            sub_tasks = children.get(obj.id, [])
+        else:
+            sub_tasks = [i.sub_task for i in obj.sub_tasks.select_related('sub_task') if i.sub_task.deleted_at is None]
+        return TaskForTodoListSerializer(sub_tasks, many=True, context=self.context).data
 
     class Meta:
         model = Task
@@ -109,7 +242,14 @@ class CreateUpdateTodoSerializer(serializers.ModelSerializer):
     tasks = serializers.SerializerMethodField(source='tasks', read_only=True)
 
     def get_tasks(self, obj):
-        return TaskForTodoListSerializer(obj.tasks.filter(is_subtask=False), many=True).data
+        # uses 'tree_tasks' prefetched by view's queryset, else queries tasks of todo.
+        tasks = getattr(obj, 'tree_tasks', None)
+        if tasks is None:
+            tasks = obj.tasks.annotate(parent_id=F('parent_task__task_id')).order_by('position', 'id')
+        children = {}
+        for task in tasks:
+            children.setdefault(task.parent_id, []).append(task)
+        return TaskForTodoListSerializer(children.get(None, []), many=True, context={'children': children}).data
 
     def save(self, **kwargs):
         # add 'owner' to validated data as current user.
@@ -120,73 +260,48 @@ class CreateUpdateTodoSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Todo
-        fields = ['id', 'title', 'owner', 'tasks']
+        fields = ['id', 'title', 'owner', 'task_count', 'completed_count', 'subtask_count', 'version', 'tasks']
 
 
-class CreateSubTaskUsingIdsSerializer(serializers.Serializer):
+class SubTaskIdsSerializer(serializers.Serializer):
     task = serializers.IntegerField()
     sub_task = serializers.IntegerField()
 
-    def validate_task(self, task_id):
-        request = self.context['request']
-        try:
-            task = Task.objects.get(id=task_id, todo__owner=request.user)
-        except Task.DoesNotExist:
-            raise serializers.ValidationError('This task id is not valid.')
-
-        if task and task.is_subtask:
-            raise serializers.ValidationError('This task already sub-task.')
-
-        return task_id
-
-    def validate_sub_task(self, sub_task_id):
-        task_id = self.initial_data['task']
-        request = self.context['request']
-        task, sub_task = None, None
-
-        try:
-            sub_task = Task.objects.get(id=sub_task_id, todo__owner=request.user)
-        except Task.DoesNotExist:
-            raise serializers.ValidationError('This sub-task id is not valid.')
-
-        try:
-            task = Task.objects.get(id=task_id)
-        except Task.DoesNotExist:
-            pass
-
-        if sub_task and sub_task.sub_tasks and sub_task.sub_tasks.count() > 0:
-            raise serializers.ValidationError('The sub-task is parent task, so cannot become sub-task.')
-        try:
-            if sub_task and sub_task.parent_task and sub_task.parent_task.task == task:
-                raise serializers.ValidationError('The sub-task is already sub-task of the task.')
-            elif sub_task and sub_task.is_subtask:
-                raise serializers.ValidationError('This sub-task is already sub-task of another task.')
-        except Task.parent_task.RelatedObjectDoesNotExist:
-            if sub_task and sub_task.is_subtask:
-                raise serializers.ValidationError('This sub-task is already sub-task of another task.')
-
-        if sub_task and sub_task.todo != task.todo:
-            raise serializers.ValidationError('The todo of task and sub-task is not matching.')
-
-        if task and sub_task and task == sub_task:
-            raise serializers.ValidationError('The task and sub-task cannot be same.')
-
-        return sub_task_id
 
+class CreateSubTaskUsingIdsSerializer(SubTaskIdsSerializer):
     def save(self):
         if self.errors:
             raise ValueError(
                 "The SubTask could not be created because the data didn't validate."
             )
 
-        sub_task_id = self.validated_data['sub_task']
-        task = self.validated_data['task']
+        pair = (self.validated_data['task'], self.validated_data['sub_task'])
+        try:
+            return link_sub_tasks([pair], owner=self.context['request'].user)[0]
+        except SubTaskLinkError as e:
+            # pair is validated by link_sub_tasks() while its tasks are locked.
+            raise serializers.ValidationError(e.errors[0])
 
-        sub_task_obj = Task.objects.get(id=sub_task_id)
-        sub_task_obj.is_subtask = True
-        sub_task_obj.save()
 
-        return SubTask.objects.create(task_id=task, sub_task_id=sub_task_id)
+class BulkCreateSubTaskUsingIdsListSerializer(serializers.ListSerializer):
+    def create(self, validated_data):
+        """
+        Links all pairs of task and sub_task, validating them with fixed number of queries while they are locked.
+        :raise: ValidationError with list of errors in same order as given pairs.
+        """
+        try:
+            link_sub_tasks(
+                [(pair['task'], pair['sub_task']) for pair in validated_data],
+                owner=self.context['request'].user
+            )
+        except SubTaskLinkError as e:
+            raise serializers.ValidationError(e.errors)
+        return validated_data
+
+
+class BulkCreateSubTaskUsingIdsSerializer(SubTaskIdsSerializer):
+    class Meta:
+        list_serializer_class = BulkCreateSubTaskUsingIdsListSerializer
 
 
 class CreateSubTaskUsingDataSerializer(serializers.ModelSerializer):
@@ -209,9 +324,6 @@ class CreateSubTaskUsingDataSerializer(serializers.ModelSerializer):
         except Task.DoesNotExist:
             raise serializers.ValidationError('This task id is not valid.')
 
-        if task and task.is_subtask:
-            raise serializers.ValidationError('This task is sub task of another task so it is invalid.')
-
         if task and todo.exists() and task.todo.id != todo.first().id:
             raise serializers.ValidationError('Todo for task and sub task does not match.')
 
@@ -225,3 +337,24 @@ class CreateSubTaskUsingDataSerializer(serializers.ModelSerializer):
     class Meta:
         model = Task
         fields = ('id', 'content', 'details', 'is_completed', 'completion_date', 'todo', 'task', 'is_subtask')
+
+
+class TrashTodoSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Todo
+        fields = ('id', 'title', 'task_count', 'deleted_at')
+
+
+class TrashTaskSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Task
+        fields = ('id', 'content', 'todo', 'is_subtask', 'deleted_at')
+
+
+class SearchTaskSerializer(serializers.ModelSerializer):
+    todo_title = serializers.CharField(source='todo.title', read_only=True)
+    rank = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = Task
+        fields = ('id', 'content', 'details', 'is_completed', 'is_subtask', 'completion_date', 'todo', 'todo_title', 'rank')
@@ -1,3 +1,483 @@
-from django.test import TestCase
+from datetime import date
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection
+from django.http import HttpResponse
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from accounts.models import User
+from todo.cache import TreeInvalidation, get_tree_version
+from todo.idempotency import IdempotentRequest
+from todo.models import Todo, Task, SubTask, TaskClosure, VersionConflict
+from todo.services import link_sub_tasks, validate_sub_task_links, SubTaskLinkError
+from todo.testing import AuthenticatedAPITestCase, create_tree
+
+
+class TodoListQueryCountTestCase(AuthenticatedAPITestCase):
+    # select todos, select tasks with their parent ids
+    query_budget = 2
+
+    def create_tree(self, todos=1, tasks=1, sub_tasks=1):
+        with self.captureOnCommitCallbacks(execute=True):
+            create_tree(self.user, todos=todos, tasks=tasks, sub_tasks=sub_tasks)
+
+    def test_list_response(self):
+        self.create_tree()
+        todo = Todo.objects.get()
+        task, sub_task = todo.tasks.order_by('id')
+
+        response = self.client.get(reverse('todo-create-drf-api'))
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()['results']
+        self.assertEqual(len(data), 1)
+        self.assertEqual(data[0]['owner'], self.user.email)
+        self.assertEqual([i['id'] for i in data[0]['tasks']], [task.id])
+        self.assertEqual(data[0]['tasks'][0]['sub_tasks'][0]['id'], sub_task.id)
+        self.assertNotIn('sub_tasks', data[0]['tasks'][0]['sub_tasks'][0])
+
+    def test_list_query_count_does_not_depend_on_data_size(self):
+        url = reverse('todo-create-drf-api')
+        self.create_tree()
+        with self.assertNumQueries(self.query_budget):
+            self.client.get(url)
+
+        self.create_tree(todos=5, tasks=4, sub_tasks=3)
+        with self.assertNumQueries(self.query_budget):
+            self.client.get(url)
+
+    def test_detail_query_count_does_not_depend_on_data_size(self):
+        self.create_tree(todos=1, tasks=5, sub_tasks=3)
+        todo = Todo.objects.get()
+        url = reverse('todo-update-delete-drf-api', kwargs={'id': todo.id})
+        # budget for listing + update of todo title
+        with self.assertNumQueries(self.query_budget + 1):
+            response = self.client.put(url, {'title': 'updated'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['tasks']), 5)
+
+    def test_list_is_paginated_by_cursor(self):
+        self.create_tree(todos=5, tasks=1, sub_tasks=0)
+        url = reverse('todo-create-drf-api') + '?page_size=2'
+
+        ids = []
+        while url:
+            with self.assertNumQueries(self.query_budget):
+                data = self.client.get(url).json()
+            self.assertLessEqual(len(data['results']), 2)
+            ids.extend(i['id'] for i in data['results'])
+            url = data['next']
+
+        self.assertEqual(ids, list(Todo.objects.order_by('id').values_list('id', flat=True)))
+
+    def test_list_with_invalid_cursor(self):
+        response = self.client.get(reverse('todo-create-drf-api') + '?cursor=invalid')
+        self.assertEqual(response.status_code, 404)
+
+    def test_list_is_served_from_cache_until_tree_changes(self):
+        url = reverse('todo-create-drf-api')
+        self.create_tree()
+        first = self.client.get(url).json()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).json(), first)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Task.objects.filter(todo__owner=self.user, is_subtask=True).first().delete()
+        with self.assertNumQueries(self.query_budget):
+            second = self.client.get(url).json()
+        self.assertNotEqual(second, first)
+
+    def test_list_responds_not_modified_for_matching_etag(self):
+        url = reverse('todo-create-drf-api')
+        self.create_tree()
+        etag = self.client.get(url)['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Todo.objects.create(title='new', owner=self.user)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_tree_is_invalidated_once_per_transaction(self):
+        version = get_tree_version(self.user.id)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            todo = Todo.objects.create(title='todo', owner=self.user)
+            tasks = [Task.objects.create(content=f'task {i}', todo_id=todo.id) for i in range(3)]
+            SubTask.objects.create(task_id=tasks[0].id, sub_task_id=tasks[1].id)
+
+        self.assertEqual(len([callback for callback in callbacks if isinstance(callback, TreeInvalidation)]), 1)
+        self.assertNotEqual(get_tree_version(self.user.id), version)
+
+    def test_etag_depends_on_negotiated_media_type(self):
+        url = reverse('todo-create-drf-api')
+        self.create_tree()
+        json_response = self.client.get(url, HTTP_ACCEPT='application/json')
+        html_response = self.client.get(url, HTTP_ACCEPT='text/html')
+
+        self.assertNotEqual(json_response['ETag'], html_response['ETag'])
+        self.assertIn('Accept', json_response['Vary'])
+        response = self.client.get(url, HTTP_ACCEPT='text/html', HTTP_IF_NONE_MATCH=json_response['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+
+class IdempotencyKeyTestCase(AuthenticatedAPITestCase):
+    def test_repeated_request_gets_stored_response(self):
+        url = reverse('todo-create-drf-api')
+        first = self.client.post(url, {'title': 'todo'}, HTTP_IDEMPOTENCY_KEY='key-1')
+        second = self.client.post(url, {'title': 'todo'}, HTTP_IDEMPOTENCY_KEY='key-1')
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual((second.status_code, second.content), (201, first.content))
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(Todo.objects.count(), 1)
+
+        response = self.client.post(url, {'title': 'other todo'}, HTTP_IDEMPOTENCY_KEY='key-1')
+        self.assertEqual(response.status_code, 422)
+        self.client.post(url, {'title': 'todo'}, HTTP_IDEMPOTENCY_KEY='key-2')
+        self.assertEqual(Todo.objects.count(), 2)
+
+    def test_reused_key_keeps_stored_response(self):
+        url = reverse('todo-create-drf-api')
+        first = self.client.post(url, {'title': 'todo'}, HTTP_IDEMPOTENCY_KEY='key-1')
+        reused = self.client.post(url, {'title': 'other todo'}, HTTP_IDEMPOTENCY_KEY='key-1')
+        retry = self.client.post(url, {'title': 'todo'}, HTTP_IDEMPOTENCY_KEY='key-1')
+
+        self.assertEqual(reused.status_code, 422)
+        self.assertEqual((retry.status_code, retry.content), (201, first.content))
+        self.assertEqual(Todo.objects.count(), 1)
+
+    def test_expired_lock_taken_by_other_request_is_not_released(self):
+        first = IdempotentRequest(self.user.id, 'key-1', 'fingerprint')
+        second = IdempotentRequest(self.user.id, 'key-1', 'fingerprint')
+        self.assertTrue(first.acquire())
+        # lock of first request expires while it is still running
+        cache.delete(first.lock_key)
+        self.assertTrue(second.acquire())
+
+        first.release()
+
+        self.assertEqual(cache.get(second.lock_key), second.lock_token)
+        second.release()
+        self.assertIsNone(cache.get(second.lock_key))
+
+    def test_etag_and_location_are_replayed(self):
+        idempotent = IdempotentRequest(self.user.id, 'key-1', 'fingerprint')
+        response = HttpResponse('created', status=201)
+        response['ETag'] = '"1"'
+        response['Location'] = '/todo/1/'
+        idempotent.store(response)
+
+        replayed = idempotent.get_stored_response()
+
+        self.assertEqual((replayed['ETag'], replayed['Location']), ('"1"', '/todo/1/'))
+
+
+class TaskVersionTestCase(AuthenticatedAPITestCase):
+    def setUp(self):
+        super(TaskVersionTestCase, self).setUp()
+        self.todo = Todo.objects.create(title='todo', owner=self.user)
+        self.task = Task.objects.create(content='task', todo=self.todo)
+        self.url = reverse('task-update-delete-drf-api', kwargs={'id': self.task.id})
+
+    def test_update_with_stale_if_match_fails(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.put(self.url, {'content': 'first', 'todo': self.todo.id}, HTTP_IF_MATCH=etag)
+        self.assertEqual((response.status_code, response.data['version']), (200, 2))
+
+        response = self.client.put(self.url, {'content': 'second', 'todo': self.todo.id}, HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 412)
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.content, 'first')
+
+    def test_concurrent_save_of_stale_instance_fails(self):
+        stale = Task.objects.get(id=self.task.id)
+        Task.objects.get(id=self.task.id).save()
+        with self.assertRaises(VersionConflict):
+            stale.save()
+
+    def test_save_is_one_conditional_update(self):
+        todo = Todo.objects.get(id=self.todo.id)
+        todo.title = 'changed'
+        with self.assertNumQueries(1):
+            todo.save(update_fields=['title'])
+
+        self.assertEqual(Todo.objects.values_list('title', 'version').get(id=self.todo.id), ('changed', 2))
+        with self.assertRaises(VersionConflict):
+            self.todo.save()
+
+
+class ReorderTaskTestCase(AuthenticatedAPITestCase):
+    def setUp(self):
+        super(ReorderTaskTestCase, self).setUp()
+        self.todo = Todo.objects.create(title='todo', owner=self.user)
+        self.tasks = [Task.objects.create(content=f'task {i}', todo=self.todo) for i in range(4)]
+
+    def reorder(self, task, after):
+        url = reverse('task-reorder-drf-api', kwargs={'id': task.id})
+        return self.client.post(url, {'after': after and after.id}, format='json')
+
+    def get_order(self):
+        response = self.client.get(reverse('todo-update-delete-drf-api', kwargs={'id': self.todo.id}))
+        return [task['id'] for task in response.data['tasks']]
+
+    def test_reorder_updates_only_moved_task(self):
+        first, second, third, fourth = self.tasks
+        positions = dict(Task.objects.values_list('id', 'position'))
+
+        self.assertEqual(self.reorder(first, third).status_code, 200)
+        self.assertEqual(self.reorder(fourth, None).status_code, 200)
+
+        self.assertEqual(self.get_order(), [fourth.id, second.id, third.id, first.id])
+        changed = {
+            task_id for task_id, position in Task.objects.values_list('id', 'position')
+            if positions[task_id] != position
+        }
+        self.assertEqual(changed, {first.id, fourth.id})
+
+    def test_reorder_after_task_of_other_todo_fails(self):
+        other = Task.objects.create(content='other', todo=Todo.objects.create(title='other', owner=self.user))
+        self.assertEqual(self.reorder(self.tasks[0], other).status_code, 400)
+
+
+class TaskListTestCase(AuthenticatedAPITestCase):
+    def setUp(self):
+        super(TaskListTestCase, self).setUp()
+        self.todo = Todo.objects.create(title='todo', owner=self.user)
+        self.other_todo = Todo.objects.create(title='other todo', owner=self.user)
+        self.done = Task.objects.create(
+            content='done', todo=self.todo, is_completed=True, completion_date=date(2022, 1, 10)
+        )
+        self.pending = Task.objects.create(content='pending', todo=self.todo, completion_date=date(2022, 1, 20))
+        self.other = Task.objects.create(content='other', todo=self.other_todo, completion_date=date(2022, 1, 15))
+        other_user = User.objects.create_user(email='other@example.com', password='password')
+        Task.objects.create(content='not mine', todo=Todo.objects.create(title='todo', owner=other_user))
+
+    def list_tasks(self, **params):
+        response = self.client.get(reverse('task-create-drf-api'), params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return [task['id'] for task in response.data['results']]
+
+    def test_filters_are_combined(self):
+        self.assertEqual(self.list_tasks(), [self.done.id, self.pending.id, self.other.id])
+        self.assertEqual(self.list_tasks(todo=self.todo.id, is_completed='false'), [self.pending.id])
+        self.assertEqual(
+            self.list_tasks(completion_date_after='12-01-2022', completion_date_before='20-01-2022'),
+            [self.pending.id, self.other.id]
+        )
+
+    def test_ordering_and_pages(self):
+        self.assertEqual(
+            self.list_tasks(ordering='-completion_date'), [self.pending.id, self.other.id, self.done.id]
+        )
+        response = self.client.get(reverse('task-create-drf-api'), {'ordering': 'completion_date', 'page_size': 2})
+        self.assertEqual([task['id'] for task in response.data['results']], [self.done.id, self.other.id])
+        self.assertEqual([task['id'] for task in self.client.get(response.data['next']).data['results']], [
+            self.pending.id
+        ])
+
+    def test_keyset_pages_in_default_order(self):
+        later = Task.objects.create(content='later', todo=self.todo)
+        ids = []
+        response = self.client.get(reverse('task-create-drf-api'), {'page_size': 2})
+        while True:
+            self.assertEqual(response.status_code, 200, response.data)
+            ids.extend(task['id'] for task in response.data['results'])
+            if response.data['next'] is None:
+                break
+            self.assertIn('cursor=', response.data['next'])
+            response = self.client.get(response.data['next'])
+
+        self.assertEqual(ids, [self.done.id, self.pending.id, later.id, self.other.id])
+        response = self.client.get(reverse('task-create-drf-api'), {'cursor': 'invalid'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_invalid_filter(self):
+        response = self.client.get(reverse('task-create-drf-api'), {'completion_date_after': '2022-01-01'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('completion_date_after', response.data)
+
+
+class BulkCreateTaskTestCase(AuthenticatedAPITestCase):
+    def setUp(self):
+        super(BulkCreateTaskTestCase, self).setUp()
+        self.todo = Todo.objects.create(title='todo', owner=self.user)
+        self.existing = Task.objects.create(content='existing', todo=self.todo)
+
+    def create_tasks(self, items):
+        return self.client.post(reverse('task-bulk-create-drf-api'), items, format='json')
+
+    def get_items(self, count, sub_tasks=2):
+        return [{
+            'content': f'task {i}',
+            'todo': self.todo.id,
+            'sub_tasks': [{'content': f'sub-task {i}.{j}', 'is_completed': True} for j in range(sub_tasks)],
+        } for i in range(count)]
+
+    def test_tasks_with_sub_tasks_are_appended_and_counted(self):
+        response = self.create_tasks(self.get_items(2))
+
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual([len(task['sub_tasks']) for task in response.data], [2, 2])
+        first = response.data[0]
+        self.assertEqual(
+            set(SubTask.objects.filter(task_id=first['id']).values_list('sub_task_id', flat=True)),
+            {sub_task['id'] for sub_task in first['sub_tasks']}
+        )
+        ordered = list(Task.objects.filter(todo=self.todo).order_by('position').values_list('content', flat=True))
+        self.assertEqual(ordered, [
+            'existing', 'task 0', 'sub-task 0.0', 'sub-task 0.1', 'task 1', 'sub-task 1.0', 'sub-task 1.1'
+        ])
+        self.todo.refresh_from_db()
+        self.assertEqual((self.todo.task_count, self.todo.completed_count, self.todo.subtask_count), (7, 4, 4))
+
+    def test_invalid_item_creates_nothing(self):
+        items = self.get_items(2)
+        items[1]['sub_tasks'][0]['content'] = ''
+        other_todo = Todo.objects.create(title='other', owner=User.objects.create_user(email='other@example.com'))
+        items.append({'content': 'task', 'todo': other_todo.id})
+
+        response = self.create_tasks(items)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data[0], {})
+        self.assertIn('content', response.data[1]['sub_tasks'][0])
+        self.assertIn('todo', response.data[2])
+        self.assertEqual(Task.objects.count(), 1)
+
+    def test_query_count_does_not_depend_on_number_of_tasks(self):
+        def count_queries(items):
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.create_tasks(items).status_code, 201)
+            return len(queries)
+
+        self.assertEqual(count_queries(self.get_items(1, sub_tasks=1)), count_queries(self.get_items(10, sub_tasks=5)))
+
+
+class BulkUpdateTaskTestCase(AuthenticatedAPITestCase):
+    def setUp(self):
+        super(BulkUpdateTaskTestCase, self).setUp()
+        self.todo = Todo.objects.create(title='todo', owner=self.user)
+        self.other_todo = Todo.objects.create(title='other todo', owner=self.user)
+        Task.objects.create(content='existing', todo=self.other_todo)
+
+    def create_task(self, sub_tasks):
+        # task with chain of sub-tasks
+        tasks = [Task.objects.create(content='task', todo=self.todo)]
+        for i in range(sub_tasks):
+            tasks.append(Task.objects.create(content=f'sub-task {i}', todo=self.todo, is_subtask=True))
+            SubTask.objects.create(task=tasks[-2], sub_task=tasks[-1])
+        return tasks
+
+    def update_tasks(self, data):
+        response = self.client.post(reverse('task-bulk-update-drf-api'), data, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def test_only_tasks_of_user_are_updated(self):
+        other_user = User.objects.create_user(email='other@example.com', password='password')
+        not_mine = Task.objects.create(content='not mine', todo=Todo.objects.create(title='todo', owner=other_user))
+        task = self.create_task(sub_tasks=0)[0]
+
+        data = self.update_tasks({'ids': [task.id, not_mine.id], 'patch': {'is_completed': True}})
+
+        self.assertEqual(data['updated'], 1)
+        self.assertFalse(Task.objects.get(id=not_mine.id).is_completed)
+        response = self.client.post(reverse('task-bulk-update-drf-api'), {
+            'ids': [task.id], 'patch': {'todo': not_mine.todo_id}
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_complete_and_move_cascade_to_descendants(self):
+        tasks = self.create_task(sub_tasks=2)
+
+        data = self.update_tasks({'ids': [tasks[0].id], 'patch': {'is_completed': True, 'todo': self.other_todo.id}})
+
+        self.assertEqual((data['updated'], data['sub_tasks_updated'], data['detached']), (1, 2, 0))
+        self.assertEqual(
+            list(Task.objects.filter(id__in=[task.id for task in tasks]).values_list('todo_id', 'is_completed')),
+            [(self.other_todo.id, True)] * 3
+        )
+        self.other_todo.refresh_from_db()
+        self.assertEqual((self.other_todo.task_count, self.other_todo.completed_count), (4, 3))
+
+    def test_moved_sub_task_is_detached_from_parent(self):
+        tasks = self.create_task(sub_tasks=2)
+
+        data = self.update_tasks({'ids': [tasks[1].id], 'patch': {'todo': self.other_todo.id}})
+
+        self.assertEqual((data['updated'], data['sub_tasks_updated'], data['detached']), (1, 1, 1))
+        self.assertFalse(Task.objects.get(id=tasks[1].id).is_subtask)
+        self.assertFalse(SubTask.objects.filter(sub_task=tasks[1]).exists())
+        self.assertEqual(SubTask.objects.get(sub_task=tasks[2]).task_id, tasks[1].id)
+        self.assertEqual(Task.objects.get(id=tasks[2].id).todo_id, self.other_todo.id)
+
+    def test_query_count_does_not_depend_on_number_of_tasks(self):
+        def count_queries(count):
+            ids = [task.id for _ in range(count) for task in self.create_task(sub_tasks=2)[:1]]
+            with CaptureQueriesContext(connection) as queries:
+                self.update_tasks({'ids': ids, 'patch': {'is_completed': True, 'todo': self.other_todo.id}})
+            return len(queries)
+
+        self.assertEqual(count_queries(1), count_queries(10))
+
+
+class BulkCreateSubTaskUsingIdsTestCase(AuthenticatedAPITestCase):
+    def setUp(self):
+        super(BulkCreateSubTaskUsingIdsTestCase, self).setUp()
+        self.todo = Todo.objects.create(title='todo', owner=self.user)
+        self.tasks = [Task.objects.create(content=f'task {i}', todo=self.todo) for i in range(4)]
+
+    def link(self, pairs):
+        data = [{'task': task.id, 'sub_task': sub_task.id} for task, sub_task in pairs]
+        return self.client.post(reverse('sub-task-bulk-create-ids-drf-api'), data, format='json')
+
+    def test_tasks_are_nested_at_any_depth(self):
+        first, second, third, fourth = self.tasks
+
+        self.assertEqual(self.link([(first, second), (third, fourth)]).status_code, 201)
+        self.assertEqual(self.link([(second, third)]).status_code, 201)
+
+        self.assertEqual(
+            [task['id'] for task in TaskClosure.get_subtree(first.id)], [second.id, third.id, fourth.id]
+        )
+        self.assertEqual(TaskClosure.get_subtree(first.id)[-1]['depth'], 3)
+
+    def test_cycle_is_rejected(self):
+        first, second, third, fourth = self.tasks
+        self.link([(first, second)])
+        self.link([(second, third)])
+
+        response = self.link([(third, first)])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('sub_task', response.data[0])
+        response = self.link([(fourth, third), (third, fourth)])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(SubTask.objects.count(), 2)
+
+    def test_pairs_are_validated_while_locked(self):
+        first, second = self.tasks[:2]
+        # pair is valid when request validates it, but another request links tasks the other way before it.
+        self.assertEqual(validate_sub_task_links([(first.id, second.id)]), [{}])
+        link_sub_tasks([(second.id, first.id)])
+
+        with self.assertRaises(SubTaskLinkError) as e:
+            link_sub_tasks([(first.id, second.id)])
+        self.assertIn('sub_task', e.exception.errors[0])
+        self.assertEqual(SubTask.objects.count(), 1)
+
+    def test_query_count_does_not_depend_on_number_of_pairs(self):
+        tasks = [Task.objects.create(content=f'task {i}', todo=self.todo) for i in range(22)]
+
+        def count_queries(pairs):
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.link(pairs).status_code, 201)
+            return len(queries)
+
+        self.assertEqual(count_queries([(tasks[0], tasks[1])]), count_queries(list(zip(tasks[2:12], tasks[12:]))))
@@ -2,10 +2,20 @@ from django.urls import path
 from .views import (
     CreateTodoAPI,
     UpdateDeleteTodoAPI,
+    DeleteJobStatusAPI,
     CreateTaskAPI,
+    BulkCreateTaskAPI,
+    BulkUpdateTaskAPI,
     UpdateDeleteTaskAPI,
+    SearchTaskAPI,
+    ReorderTaskAPI,
     CreateSubTaskUsingIdsAPI,
+    BulkCreateSubTaskUsingIdsAPI,
     CreateSubTaskUsingDataAPI,
+    TrashTodoListAPI,
+    TrashTodoAPI,
+    TrashTaskListAPI,
+    TrashTaskAPI,
 )
 from rest_framework import permissions
 from drf_yasg.views import get_schema_view
@@ -28,10 +38,21 @@ urlpatterns = [
 
     path('todo/', CreateTodoAPI.as_view(), name='todo-create-drf-api'),
     path('todo/<id>/', UpdateDeleteTodoAPI.as_view(), name='todo-update-delete-drf-api'),
+    path('todo/delete-job/<job_id>/', DeleteJobStatusAPI.as_view(), name='todo-delete-job-drf-api'),
 
     path('task/', CreateTaskAPI.as_view(), name='task-create-drf-api'),
+    path('task/bulk/', BulkCreateTaskAPI.as_view(), name='task-bulk-create-drf-api'),
+    path('task/bulk-update/', BulkUpdateTaskAPI.as_view(), name='task-bulk-update-drf-api'),
+    path('task/search/', SearchTaskAPI.as_view(), name='task-search-drf-api'),
     path('task/<id>/', UpdateDeleteTaskAPI.as_view(), name='task-update-delete-drf-api'),
+    path('task/<id>/reorder/', ReorderTaskAPI.as_view(), name='task-reorder-drf-api'),
 
     path('sub-task-ids/', CreateSubTaskUsingIdsAPI.as_view(), name='sub-task-create-ids-drf-api'),
+    path('sub-task-ids/bulk/', BulkCreateSubTaskUsingIdsAPI.as_view(), name='sub-task-bulk-create-ids-drf-api'),
     path('sub-task-data/', CreateSubTaskUsingDataAPI.as_view(), name='sub-task-create-data-drf-api'),
+
+    path('trash/todo/', TrashTodoListAPI.as_view(), name='trash-todo-list-drf-api'),
+    path('trash/todo/<id>/', TrashTodoAPI.as_view(), name='trash-todo-drf-api'),
+    path('trash/task/', TrashTaskListAPI.as_view(), name='trash-task-list-drf-api'),
+    path('trash/task/<id>/', TrashTaskAPI.as_view(), name='trash-task-drf-api'),
 ]
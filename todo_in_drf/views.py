@@ -1,26 +1,73 @@
-from rest_framework import mixins
-from rest_framework.generics import GenericAPIView, ListCreateAPIView, CreateAPIView
+from django.conf import settings
+from django.db.models import F, Prefetch
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from django.views.decorators.vary import vary_on_headers
+from rest_framework import mixins, status
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.response import Response
+from rest_framework.generics import GenericAPIView, ListAPIView, ListCreateAPIView, CreateAPIView
 
-from todo.filter_backends import CurrentUserForTodoFilterBackend, CurrentUserForTaskFilterBackend
-from todo.models import Todo, Task
-from todo_in_drf.serializers import CreateUpdateTodoSerializer, CreateUpdateTaskSerializer, \
-    CreateSubTaskUsingIdsSerializer, CreateSubTaskUsingDataSerializer
+from todo.filter_backends import CurrentUserForTodoFilterBackend, CurrentUserForTaskFilterBackend, \
+    TaskTodoFilterBackend, TaskCompletedFilterBackend, TaskSubtaskFilterBackend, TaskCompletionDateFilterBackend, \
+    TaskOrderingFilterBackend
+from todo.models import Todo, Task, TaskClosure
+from todo.cache import get_or_build_tree, get_tree_etag
+from todo.idempotency import IdempotentAPIMixin
+from todo.versioning import IfMatchVersionMixin, get_todo_etag, get_task_etag
+from todo.deletion import delete_todo, get_delete_job_status
+from todo.positions import reorder_task
+from todo.search import search_tasks, SEARCH_QUERY_PARAM
+from todo.trash import get_trashed_todos, get_trashed_tasks, trash_todo, trash_task, restore_todo, restore_task, \
+    RestoreError
+from todo.pagination import TodoKeysetPagination, OffsetPagination, TaskPagination, get_next_link, get_page_size, \
+    CURSOR_QUERY_PARAM, PAGE_SIZE_QUERY_PARAM
+from todo_in_drf.serializers import CreateUpdateTodoSerializer, CreateUpdateTaskSerializer, BulkCreateTaskSerializer, \
+    BulkUpdateTaskSerializer, CreateSubTaskUsingIdsSerializer, BulkCreateSubTaskUsingIdsSerializer, \
+    CreateSubTaskUsingDataSerializer, TrashTodoSerializer, TrashTaskSerializer, ReorderTaskSerializer, \
+    SearchTaskSerializer
 
 
-class CreateTodoAPI(ListCreateAPIView):
+class TodoTreeQuerysetMixin:
+    """
+    Prefetches all tasks of todos along with id of their parent task, so that serializing todo
+    with nested tasks of any depth takes fixed number of queries.
+    """
+    def get_queryset(self):
+        if self.request.method == 'DELETE':
+            return Todo.objects.all()
+        return Todo.objects.select_related('owner').prefetch_related(
+            Prefetch(
+                'tasks',
+                queryset=Task.objects.annotate(parent_id=F('parent_task__task_id')).order_by('position', 'id'),
+                to_attr='tree_tasks'
+            )
+        )
+
+
+class CreateTodoAPI(IdempotentAPIMixin, TodoTreeQuerysetMixin, ListCreateAPIView):
     """
     description: This View Creates Todo and Lists all Todos of current user.
     with proper format along with tasks.
+    request: For listing todo, optional 'cursor' and 'page_size' GET parameters.
     data: For creating todo
     {
         [required] title : string
     }
     response:
-    List of todo with following attributes
+    For listing todo
+    {
+        next: string [url of next page] or null,
+        results: list of todo
+    }
     todo -> {
         id: integer [id of todo object],
         title: string,
         owner: email of owner in string,
+        task_count: integer [number of tasks including sub tasks],
+        completed_count: integer [number of completed tasks],
+        subtask_count: integer [number of sub tasks],
+        version: integer [incremented on every update of todo]
         tasks: [
             {
                 id: integer [id of main task of current todo],
@@ -47,14 +94,49 @@ class CreateTodoAPI(ListCreateAPIView):
     permission: IsAuthenticated
     """
     serializer_class = CreateUpdateTodoSerializer
-    queryset = Todo.objects.all()
     filter_backends = [CurrentUserForTodoFilterBackend]
+    pagination_class = TodoKeysetPagination
+
+    @method_decorator(vary_on_headers('Accept'))
+    @method_decorator(condition(etag_func=get_tree_etag))
+    def get(self, request, *args, **kwargs):
+        return self.list(request, *args, **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        """
+        Lists page of todos from cache of user's todo tree, builds it from database on cache miss.
+        """
+        cursor = request.query_params.get(CURSOR_QUERY_PARAM)
+        page_size = get_page_size(request.query_params.get(PAGE_SIZE_QUERY_PARAM))
 
+        def build():
+            page = self.paginate_queryset(self.filter_queryset(self.get_queryset()))
+            serializer = self.get_serializer(page, many=True)
+            return {'next_cursor': self.paginator.next_cursor, 'results': serializer.data}
 
-class UpdateDeleteTodoAPI(GenericAPIView, mixins.DestroyModelMixin, mixins.UpdateModelMixin):
+        data = get_or_build_tree(request.user.id, f'drf:{cursor}:{page_size}', build)
+        return Response({
+            'next': get_next_link(request, data['next_cursor']),
+            'results': data['results'],
+        })
+
+
+class UpdateDeleteTodoAPI(
+    IdempotentAPIMixin,
+    IfMatchVersionMixin,
+    TodoTreeQuerysetMixin,
+    GenericAPIView,
+    mixins.RetrieveModelMixin,
+    mixins.DestroyModelMixin,
+    mixins.UpdateModelMixin
+):
     """
-    description: This View Deletes Todo and Update Todo of current user.
+    description: This View Retrieves Todo, Deletes Todo and Update Todo of current user.
     request: requires 'id' parameter, where id is id of todo object.
+    GET request responds 304 if 'If-None-Match' header matches ETag of todo, which changes with its version
+    and user's todo tree. PUT and DELETE requests respond 412 if 'If-Match' header is given and todo is
+    changed since that ETag, or if todo is changed by another request while updating it.
+    DELETE request moves todo to trash, see TrashTodoAPI.
     data: For updating todo
     {
         [required] title : string
@@ -64,6 +146,10 @@ class UpdateDeleteTodoAPI(GenericAPIView, mixins.DestroyModelMixin, mixins.Updat
         id: integer [id of todo object],
         title: string,
         owner: email of owner in string,
+        task_count: integer [number of tasks including sub tasks],
+        completed_count: integer [number of completed tasks],
+        subtask_count: integer [number of sub tasks],
+        version: integer [incremented on every update of todo]
         tasks: [
             {
                 id: integer [id of main task of current todo],
@@ -90,20 +176,60 @@ class UpdateDeleteTodoAPI(GenericAPIView, mixins.DestroyModelMixin, mixins.Updat
     permission: IsAuthenticated
     """
     serializer_class = CreateUpdateTodoSerializer
-    queryset = Todo.objects.all()
     filter_backends = [CurrentUserForTodoFilterBackend]
     lookup_field = 'id'
 
+    @method_decorator(condition(etag_func=get_todo_etag))
+    def get(self, request, *args, **kwargs):
+        return self.retrieve(request, *args, **kwargs)
+
     def delete(self, request, *args, **kwargs):
         return self.destroy(request, *args, **kwargs)
 
+    def perform_destroy(self, instance):
+        trash_todo(instance)
+
     def put(self, request, **kwargs):
         return self.update(request, **kwargs)
 
 
-class CreateTaskAPI(CreateAPIView):
+class DeleteJobStatusAPI(GenericAPIView):
+    """
+    description: This View Retrieves status of background deletion of todo of current user.
+    request: requires 'job_id' parameter, returned by DELETE request of TrashTodoAPI.
+    response:
+    {
+        job_id: string,
+        todo: integer [id of deleted todo],
+        status: string [pending, running, done or failed],
+        result: {todos: integer, tasks: integer, sub_tasks: integer} [number of deleted rows, when done]
+    }
+    permission: IsAuthenticated
     """
-    description: This View Creates Tasks.
+    def get(self, request, *args, **kwargs):
+        data = get_delete_job_status(kwargs['job_id'], owner_id=request.user.id)
+        if data is None:
+            raise NotFound('Job not found.')
+        return Response(data)
+
+
+class CreateTaskAPI(IdempotentAPIMixin, ListCreateAPIView):
+    """
+    description: This View Creates Tasks and Lists Tasks of current user page by page.
+    request: For listing tasks, optional GET parameters, which can be combined
+    {
+        todo : integer [id of todo]
+        is_completed : boolean
+        is_subtask : boolean
+        completion_date_after : string [dd-mm-yyyy, inclusive]
+        completion_date_before : string [dd-mm-yyyy, inclusive]
+        ordering : string [comma separated 'id', 'todo', 'position', 'completion_date', '-' prefix for descending]
+        cursor : string [from 'next' link, for tasks in default order]
+        page : integer [for tasks in other orders]
+        page_size : integer
+    }
+    Tasks are in manual order of their todo by default, paginated by keyset so that deep pages cost as much
+    as first page. Other orders are paginated by offset.
     data: For creating task
     {
         [required] content : string
@@ -120,17 +246,154 @@ class CreateTaskAPI(CreateAPIView):
         is_completed: boolean,
         completion_date: date[yyyy-mm-dd],
         todo: integer [current todo id],
-        is_subtask: boolean
+        is_subtask: boolean,
+        version: integer [incremented on every update]
+    }
+    listed tasks -> {
+        next: string [url of next page] or null,
+        results: list of task as above
     }
     permission: IsAuthenticated
     """
     serializer_class = CreateUpdateTaskSerializer
+    queryset = Task.objects.all()
+    filter_backends = [
+        CurrentUserForTaskFilterBackend,
+        TaskTodoFilterBackend,
+        TaskCompletedFilterBackend,
+        TaskSubtaskFilterBackend,
+        TaskCompletionDateFilterBackend,
+        TaskOrderingFilterBackend,
+    ]
+    pagination_class = TaskPagination
 
 
-class UpdateDeleteTaskAPI(GenericAPIView, mixins.DestroyModelMixin, mixins.UpdateModelMixin):
+class BulkCreateTaskAPI(IdempotentAPIMixin, CreateAPIView):
+    """
+    description: This View Creates many Tasks, optionally with their sub-tasks, in one request.
+    All tasks are validated first and then inserted with bulk_create() in one transaction,
+    if any task is invalid then nothing is created.
+    data: list of tasks, at most TODO_BULK_MAX_ITEMS
+    [
+        {
+            [required] content : string
+            [optional] details : string
+            [optional] is_completed : boolean
+            [optional] completion_date : string [dd-mm-yyyy]
+            [required] todo : integer [id of todo created by current user]
+            [optional] sub_tasks : [
+                {
+                    [required] content : string
+                    [optional] details : string
+                    [optional] is_completed : boolean
+                    [optional] completion_date : string [dd-mm-yyyy]
+                }
+            ]
+        }
+    ]
+    response:
+    list of created task -> {
+        id: integer [id of task created],
+        content: string,
+        details: string,
+        is_completed: boolean,
+        completion_date: date[yyyy-mm-dd],
+        todo: integer [current todo id],
+        is_subtask: boolean,
+        sub_tasks: list of created sub tasks with same attributes except todo
+    }
+    On invalid data, list of errors in same order as given tasks.
+    permission: IsAuthenticated
     """
-    description: This View Deletes Task and Update Task of current user.
+    serializer_class = BulkCreateTaskSerializer
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.update({'many': True, 'max_length': settings.TODO_BULK_MAX_ITEMS})
+        return super(BulkCreateTaskAPI, self).get_serializer(*args, **kwargs)
+
+    def get_serializer_context(self):
+        """
+        Adds todos of current user given in data, fetched with one query, to serializer context.
+        :return: Updated context for serializer.
+        """
+        context = super(BulkCreateTaskAPI, self).get_serializer_context()
+        context.update({'todos': self.get_todos()})
+        return context
+
+    def get_todos(self):
+        """
+        :return: dict of todo id -> Todo, for todos in data which are owned by current user
+        """
+        data = self.request.data if isinstance(self.request.data, list) else []
+        todo_ids = set()
+        for item in data[:settings.TODO_BULK_MAX_ITEMS]:
+            try:
+                todo_ids.add(int(item.get('todo')))
+            except (AttributeError, TypeError, ValueError):
+                pass
+        return Todo.objects.filter(owner=self.request.user).in_bulk(todo_ids)
+
+
+class BulkUpdateTaskAPI(IdempotentAPIMixin, GenericAPIView):
+    """
+    description: This View Updates many Tasks of current user at once, with few UPDATE queries.
+    Tasks are selected by ids, or by filter, or by both.
+    1. If is_completed is set to true then sub-tasks of selected tasks are completed too.
+    2. If todo is changed then sub-tasks of selected tasks are moved to it too, and selected sub-tasks
+    whose main task is not moved become main tasks.
+    data:
+    {
+        [optional] ids : list of integer [ids of tasks, at most TODO_BULK_MAX_ITEMS]
+        [optional] filter : {
+            [optional] todo : integer [id of todo]
+            [optional] is_completed : boolean
+            [optional] is_subtask : boolean
+            [optional] completion_date : string [dd-mm-yyyy]
+        }
+        [required] patch : {
+            [optional] is_completed : boolean
+            [optional] completion_date : string [dd-mm-yyyy]
+            [optional] todo : integer [id of todo created by current user]
+        }
+    }
+    response:
+    {
+        updated: integer [number of selected tasks updated],
+        sub_tasks_updated: integer [number of sub-tasks updated with their main task],
+        detached: integer [number of sub-tasks which became main task]
+    }
+    permission: IsAuthenticated
+    """
+    serializer_class = BulkUpdateTaskSerializer
+
+    def get_serializer_context(self):
+        context = super(BulkUpdateTaskAPI, self).get_serializer_context()
+        context.update({'max_items': settings.TODO_BULK_MAX_ITEMS})
+        return context
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(serializer.save())
+
+
+class UpdateDeleteTaskAPI(
+    IdempotentAPIMixin,
+    IfMatchVersionMixin,
+    GenericAPIView,
+    mixins.RetrieveModelMixin,
+    mixins.DestroyModelMixin,
+    mixins.UpdateModelMixin
+):
+    """
+    description: This View Retrieves Task, Deletes Task and Update Task of current user.
     request: requires 'id' parameter, where id is id of task object.
+    optional 'expand' GET parameter, comma separated 'subtree' and/or 'ancestors' to add all descendants
+    and ancestors of task to response, each fetched with one query.
+    GET request responds 304 if 'If-None-Match' header matches ETag of task, which is its version.
+    PUT and DELETE requests respond 412 if 'If-Match' header is given and task is changed since that ETag,
+    or if task is changed by another request while updating it.
+    DELETE request moves task to trash along with its descendants, see TrashTaskAPI.
     data: For updating todo
     1. Normal Task attribute Update
     {
@@ -147,6 +410,11 @@ class UpdateDeleteTaskAPI(GenericAPIView, mixins.DestroyModelMixin, mixins.Updat
     {
         [optional] todo : integer [id of new todo]
     }
+    4. Move task along with its descendants under another task of current user, or make it main task if null.
+    If parent task is in another todo then they are moved to that todo too.
+    {
+        [optional] parent : integer [id of new parent task] or null
+    }
     response:
     updated task -> {
         id: integer [id of task updated],
@@ -155,7 +423,10 @@ class UpdateDeleteTaskAPI(GenericAPIView, mixins.DestroyModelMixin, mixins.Updat
         is_completed: boolean,
         completion_date: date[yyyy-mm-dd],
         todo: integer [current todo id],
-        is_subtask: boolean
+        is_subtask: boolean,
+        version: integer [incremented on every update],
+        [expand=subtree] subtree: list [{id, content, is_completed, parent, depth}, ...],
+        [expand=ancestors] ancestors: list [{id, content, is_completed, depth}, ...] from main task to parent
     }
     permission: IsAuthenticated
     """
@@ -179,14 +450,100 @@ class UpdateDeleteTaskAPI(GenericAPIView, mixins.DestroyModelMixin, mixins.Updat
         context.update({'user': self.request.user})
         return context
 
+    @method_decorator(condition(etag_func=get_task_etag))
+    def get(self, request, *args, **kwargs):
+        return self.retrieve(request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        response = super(UpdateDeleteTaskAPI, self).retrieve(request, *args, **kwargs)
+        expand = request.GET.get('expand', '').split(',')
+        if 'subtree' in expand:
+            response.data['subtree'] = TaskClosure.get_subtree(response.data['id'])
+        if 'ancestors' in expand:
+            response.data['ancestors'] = TaskClosure.get_ancestors(response.data['id'])
+        return response
+
     def delete(self, request, *args, **kwargs):
         return self.destroy(request, *args, **kwargs)
 
+    def perform_destroy(self, instance):
+        trash_task(instance)
+
     def put(self, request, *args, **kwargs):
         return self.update(request, *args, **kwargs)
 
 
-class CreateSubTaskUsingIdsAPI(CreateAPIView):
+class SearchTaskAPI(ListAPIView):
+    """
+    description: This View searches tasks of current user by words in their content, details
+    and title of their todo, best match first.
+    request: requires 'q' GET parameter, all of its words must match. Optional 'page' and 'page_size'
+    GET parameters.
+    response:
+    {
+        next: string [url of next page] or null,
+        results: [
+            {
+                id: integer,
+                content: string,
+                details: string,
+                is_completed: boolean,
+                is_subtask: boolean,
+                completion_date: date[yyyy-mm-dd],
+                todo: integer [id of todo of task],
+                todo_title: string,
+                rank: float [higher for better match]
+            }
+        ]
+    }
+    permission: IsAuthenticated
+    """
+    serializer_class = SearchTaskSerializer
+    pagination_class = OffsetPagination
+
+    def get_queryset(self):
+        query = self.request.query_params.get(SEARCH_QUERY_PARAM, '').strip()
+        if not query:
+            raise ValidationError({SEARCH_QUERY_PARAM: ['This field is required.']})
+        return search_tasks(self.request.user, query)
+
+
+class ReorderTaskAPI(IdempotentAPIMixin, GenericAPIView):
+    """
+    description: This View moves task of current user right after another task of same todo,
+    or to top of todo. Tasks of todo are listed in this order, and only moved task is updated.
+    request: requires 'id' parameter, where id is id of task object.
+    data:
+    {
+        after : integer [id of task of same todo] or null [to move task to top]
+    }
+    response:
+    moved task -> {
+        id: integer,
+        content: string,
+        details: string,
+        is_completed: boolean,
+        completion_date: date[yyyy-mm-dd],
+        todo: integer,
+        is_subtask: boolean,
+        version: integer
+    }
+    permission: IsAuthenticated
+    """
+    serializer_class = ReorderTaskSerializer
+    queryset = Task.objects.all()
+    filter_backends = [CurrentUserForTaskFilterBackend]
+    lookup_field = 'id'
+
+    def post(self, request, *args, **kwargs):
+        task = self.get_object()
+        serializer = self.get_serializer(data=request.data, context=dict(self.get_serializer_context(), task=task))
+        serializer.is_valid(raise_exception=True)
+        task = reorder_task(task, serializer.validated_data['after'])
+        return Response(CreateUpdateTaskSerializer(task).data)
+
+
+class CreateSubTaskUsingIdsAPI(IdempotentAPIMixin, CreateAPIView):
     """
     description: This View makes any task (which is already created) to sub-task.
     data: For creating sub-task
@@ -213,7 +570,34 @@ class CreateSubTaskUsingIdsAPI(CreateAPIView):
         return context
 
 
-class CreateSubTaskUsingDataAPI(CreateAPIView):
+class BulkCreateSubTaskUsingIdsAPI(IdempotentAPIMixin, CreateAPIView):
+    """
+    description: This View makes many tasks (which are already created) sub-tasks, in one request.
+    All pairs are validated with one query and linked with bulk_create(), if any pair is invalid
+    then nothing is linked.
+    data: list of pairs, at most TODO_BULK_MAX_ITEMS
+    [
+        {
+            [required] task : integer [id of task to become as main task]
+            [required] sub_task : integer [id of task to become sub-task]
+        }
+    ]
+    response:
+    list of created pairs -> {
+        task: integer [id of main-task],
+        sub_task: integer [id of sub-task],
+    }
+    On invalid data, list of errors in same order as given pairs.
+    permission: IsAuthenticated
+    """
+    serializer_class = BulkCreateSubTaskUsingIdsSerializer
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.update({'many': True, 'max_length': settings.TODO_BULK_MAX_ITEMS})
+        return super(BulkCreateSubTaskUsingIdsAPI, self).get_serializer(*args, **kwargs)
+
+
+class CreateSubTaskUsingDataAPI(IdempotentAPIMixin, CreateAPIView):
     """
     description: This View creates subtask from task (which is already created).
     data: For creating sub-task
@@ -248,3 +632,98 @@ class CreateSubTaskUsingDataAPI(CreateAPIView):
         context = super(CreateSubTaskUsingDataAPI, self).get_serializer_context()
         context.update({'request': self.request})
         return context
+
+
+class TrashTodoListAPI(ListAPIView):
+    """
+    description: This View Lists todos of current user which are in trash, latest deleted first.
+    Todos are purged after TODO_TRASH_RETENTION_DAYS days in trash.
+    response:
+    [
+        {
+            id: integer [id of todo object],
+            title: string,
+            task_count: integer [number of tasks including sub tasks],
+            deleted_at: string [datetime when todo is moved to trash]
+        }
+    ]
+    permission: IsAuthenticated
+    """
+    serializer_class = TrashTodoSerializer
+
+    def get_queryset(self):
+        return get_trashed_todos(self.request.user)
+
+
+class TrashTodoAPI(IdempotentAPIMixin, GenericAPIView):
+    """
+    description: This View Restores or Deletes forever todo of current user which is in trash.
+    request: requires 'id' parameter, where id is id of todo object in trash.
+    POST request restores todo along with its tasks, and responds with restored todo.
+    DELETE request deletes todo forever, and responds 204, or 202 with {job_id: string} if todo has
+    more tasks than TODO_ASYNC_DELETE_THRESHOLD and is deleted in background, see DeleteJobStatusAPI.
+    permission: IsAuthenticated
+    """
+    serializer_class = TrashTodoSerializer
+    lookup_field = 'id'
+
+    def get_queryset(self):
+        return get_trashed_todos(self.request.user)
+
+    def post(self, request, *args, **kwargs):
+        todo = self.get_object()
+        restore_todo(todo)
+        todo.deleted_at = None
+        return Response(self.get_serializer(todo).data)
+
+    def delete(self, request, *args, **kwargs):
+        job_id = delete_todo(self.get_object())
+        if job_id:
+            return Response({'job_id': job_id}, status=status.HTTP_202_ACCEPTED)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class TrashTaskListAPI(ListAPIView):
+    """
+    description: This View Lists tasks of current user which are in trash, latest deleted first.
+    Tasks of todos in trash are not listed, they are restored along with their todo.
+    response:
+    [
+        {
+            id: integer [id of task object],
+            content: string,
+            todo: integer [id of todo of task],
+            is_subtask: boolean,
+            deleted_at: string [datetime when task is moved to trash]
+        }
+    ]
+    permission: IsAuthenticated
+    """
+    serializer_class = TrashTaskSerializer
+
+    def get_queryset(self):
+        return get_trashed_tasks(self.request.user)
+
+
+class TrashTaskAPI(IdempotentAPIMixin, GenericAPIView):
+    """
+    description: This View Restores task of current user which is in trash.
+    request: requires 'id' parameter, where id is id of task object in trash.
+    POST request restores task along with sub-tasks deleted with it, and responds with restored task.
+    Sub-task can not be restored while its parent task is in trash.
+    permission: IsAuthenticated
+    """
+    serializer_class = TrashTaskSerializer
+    lookup_field = 'id'
+
+    def get_queryset(self):
+        return get_trashed_tasks(self.request.user)
+
+    def post(self, request, *args, **kwargs):
+        task = self.get_object()
+        try:
+            restore_task(task)
+        except RestoreError as e:
+            raise ValidationError({'id': [str(e)]})
+        task.deleted_at = None
+        return Response(self.get_serializer(task).data)